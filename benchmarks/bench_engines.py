@@ -0,0 +1,252 @@
+"""
+End-to-end throughput benchmark: every entry point against the local fake Yellow Pages.
+
+    python -m benchmarks.bench_engines                                   # every entry point
+    python -m benchmarks.bench_engines main_simple main_requests --latency-ms 200 --rate-429 0.02
+    python -m benchmarks.bench_engines --input '{"maxConcurrency": 40}'  # extra Actor input
+
+Starts benchmarks/fake_server.py, then runs each engine as its own process with a fresh
+local storage directory, YELLOWPAGES_BASE_URL pointed at the server and proxies off.
+Reports per engine:
+- pages/sec: pages served cleanly over the engine's wall time, start-up included
+- p50/p95 page latency: from a page's first request to its first clean response, as the
+  server saw it, so retries and backoff count
+- CPU seconds and peak RSS of the engine's Python process (browsers run in their own
+  processes and are not included)
+- listings in the run's dataset, against what the searches hold
+
+Engine logs go to <storage dir>/engine.log; pass --keep to keep the directories. A run that
+exits non-zero, times out or pushes no listings is reported as failed (its directory is
+kept for the log) and the benchmark exits with status 1.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from benchmarks.fixtures import RESULTS_PER_PAGE
+
+ENGINES = ['main', 'main_hybrid', 'main_simple', 'main_requests', 'main_http_crawler', 'main_crawlee']
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def server_call(base_url, path, method='GET'):
+    request = urllib.request.Request(f"{base_url}{path}", method=method)
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def start_server(args):
+    command = [
+        sys.executable, '-m', 'benchmarks.fake_server', '--port', str(args.port),
+        '--results', str(args.results), '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+        '--rate-429', str(args.rate_429), '--rate-403', str(args.rate_403),
+        '--challenge-rate', str(args.challenge_rate), '--truncate-rate', str(args.truncate_rate),
+    ]
+    if args.seed is not None:
+        command += ['--seed', str(args.seed)]
+    server = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{args.port}"
+    for _ in range(100):
+        try:
+            server_call(base_url, '/__stats')
+            return server, base_url
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"Fake server did not come up on {base_url}")
+
+
+def engine_input(args):
+    actor_input = {
+        'keywords': args.keywords,
+        'locations': args.locations,
+        'maxPages': args.max_pages,
+        'maxConcurrency': args.concurrency,
+        'residentialProxy': False,
+        'proxyConfiguration': {'useApifyProxy': False},
+        # The local server has no rate limits to respect
+        'maxRequestsPerMinute': 0,
+        'maxRequestsPerMinutePerProxy': 0,
+        'usePageCountCache': False,
+        'retryBackoffSecs': 0.2,
+        'retryBackoffMaxSecs': 2,
+    }
+    actor_input.update(json.loads(args.input))
+    return actor_input
+
+
+def dataset_items(storage_dir):
+    dataset = storage_dir / 'datasets' / 'default'
+    if not dataset.is_dir():
+        return 0
+    return sum(1 for path in dataset.glob('*.json') if not path.name.startswith('__'))
+
+
+def run_engine(engine, args, base_url):
+    storage_dir = Path(tempfile.mkdtemp(prefix=f"yp-bench-{engine}-"))
+    input_dir = storage_dir / 'key_value_stores' / 'default'
+    input_dir.mkdir(parents=True)
+    (input_dir / 'INPUT.json').write_text(json.dumps(engine_input(args)))
+
+    env = {
+        **os.environ,
+        'YELLOWPAGES_BASE_URL': base_url,
+        'CRAWLEE_STORAGE_DIR': str(storage_dir),
+        'APIFY_LOCAL_STORAGE_DIR': str(storage_dir),
+        'CRAWLEE_PURGE_ON_START': '0',
+    }
+    server_call(base_url, '/__reset', method='POST')
+
+    started = time.monotonic()
+    with open(storage_dir / 'engine.log', 'wb') as log:
+        process = subprocess.Popen([sys.executable, f"{engine}.py"], cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        status, usage, timed_out = wait_with_usage(process, args.timeout)
+    wall = time.monotonic() - started
+
+    stats = server_call(base_url, '/__stats')
+    latencies = stats['pageLatencySecs']
+    result = {
+        'engine': engine,
+        'exit': 'timeout' if timed_out else status,
+        'wallSecs': wall,
+        'pages': stats['pagesServed'],
+        'requests': stats['requests'],
+        'outcomes': stats['outcomes'],
+        'pagesPerSec': stats['pagesServed'] / wall if wall else 0.0,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'cpuSecs': usage.ru_utime + usage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux
+        'peakRssMb': usage.ru_maxrss / 1024,
+        'listings': dataset_items(storage_dir),
+        'storage': str(storage_dir),
+    }
+    result['failure'] = run_failure(result)
+    if not args.keep and result['failure'] is None:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+    return result
+
+
+def run_failure(result):
+    """Why an engine run counts as failed, or None - an empty dataset is as broken as a crash"""
+    if result['exit'] == 'timeout':
+        return 'timed out'
+    if result['exit'] != 0:
+        return f"exited with status {result['exit']}"
+    if not result['listings']:
+        return 'pushed no listings'
+    return None
+
+
+def wait_with_usage(process, timeout, grace=10):
+    """Wait for an engine process, stopping it after timeout (killed grace seconds later).
+
+    Returns (exit code, resource usage, timed out). os.wait4 hands back this child's own
+    usage, where RUSAGE_CHILDREN would sum every engine run so far.
+    """
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    while True:
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            break
+        if time.monotonic() > deadline:
+            if timed_out:
+                process.kill()
+                _, status, usage = os.wait4(process.pid, 0)
+                break
+            # SIGTERM first, so the engine can flush what it has
+            timed_out = True
+            process.terminate()
+            deadline = time.monotonic() + grace
+        time.sleep(0.05)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, usage, timed_out
+
+
+def format_secs(value):
+    return f"{value * 1000:.0f}ms" if value is not None else '-'
+
+
+def print_table(results, args, expected_pages, expected_listings):
+    print(f"\n{len(args.keywords) * len(args.locations)} searches, {expected_pages} pages, "
+          f"{expected_listings} listings expected; latency {args.latency_ms:.0f}±{args.jitter_ms:.0f}ms\n")
+    print(f"{'engine':<18} {'exit':>7} {'pages':>6} {'pages/s':>8} {'p50':>7} {'p95':>7} {'CPU s':>7} {'RSS MB':>7} {'listings':>9}")
+    for r in results:
+        print(
+            f"{r['engine']:<18} {str(r['exit']):>7} {r['pages']:>6} {r['pagesPerSec']:>8.1f} "
+            f"{format_secs(r['p50']):>7} {format_secs(r['p95']):>7} {r['cpuSecs']:>7.1f} {r['peakRssMb']:>7.0f} {r['listings']:>9}"
+        )
+        if args.keep:
+            print(f"{'':<18} log: {r['storage']}/engine.log")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('engines', nargs='*', default=ENGINES, help=f"Entry points to run (default: {' '.join(ENGINES)})")
+    parser.add_argument('--keywords', nargs='+', default=['Plumbers', 'Dentists'])
+    parser.add_argument('--locations', nargs='+', default=['CA', 'TX'])
+    parser.add_argument('--max-pages', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=10, help='maxConcurrency for every engine')
+    parser.add_argument('--input', default='{}', help='JSON merged into every engine\'s Actor input')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds before an engine run is stopped')
+    parser.add_argument('--keep', action='store_true', help='Keep each run\'s storage directory and log')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    server_group = parser.add_argument_group('fake server')
+    server_group.add_argument('--port', type=int, default=8765)
+    server_group.add_argument('--results', type=int, default=300, help='Results per search (30 per page)')
+    server_group.add_argument('--latency-ms', type=float, default=100)
+    server_group.add_argument('--jitter-ms', type=float, default=50)
+    server_group.add_argument('--rate-429', type=float, default=0.0)
+    server_group.add_argument('--rate-403', type=float, default=0.0)
+    server_group.add_argument('--challenge-rate', type=float, default=0.0)
+    server_group.add_argument('--truncate-rate', type=float, default=0.0)
+    server_group.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    unknown = [engine for engine in args.engines if engine not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(unknown)}")
+
+    pages_per_search = min(args.max_pages, -(-args.results // RESULTS_PER_PAGE))
+    expected_pages = pages_per_search * len(args.keywords) * len(args.locations)
+    expected_listings = min(args.results, args.max_pages * RESULTS_PER_PAGE) * len(args.keywords) * len(args.locations)
+
+    server, base_url = start_server(args)
+    results = []
+    try:
+        for engine in args.engines:
+            print(f"Running {engine}...", file=sys.stderr, flush=True)
+            results.append(run_engine(engine, args, base_url))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results, args, expected_pages, expected_listings)
+
+    failed = [r for r in results if r['failure'] is not None]
+    for r in failed:
+        print(f"FAILED: {r['engine']} {r['failure']} - log: {r['storage']}/engine.log", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Microbenchmark: lxml listing extraction vs the old BeautifulSoup html.parser loop.
+
+    python -m benchmarks.bench_extraction                           # generated fixture pages
+    python -m benchmarks.bench_extraction benchmarks/pages/*.html   # saved results pages
+
+Reports pages/sec and the peak Python heap allocated per page (tracemalloc) for both, and
+checks that they extract identical listings. libxml2 allocates its tree in C, outside
+tracemalloc's view, so the lxml figure covers only the Python objects it creates.
+"""
+
+import argparse
+import re
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import render_results_page
+from yellowpages.parsing import parse_listings
+
+
+def legacy_parse_listings(html, keyword, location, timezone):
+    """The extraction loop previously copy-pasted in main_simple.py, main_requests.py and main_http_crawler.py"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    results = soup.find_all('div', class_='result')
+    if not results:
+        results = soup.find_all('div', {'class': re.compile(r'.*result.*')})
+
+    listings = []
+    for result in results[:40]:
+        name_elem = result.find('a', class_='business-name') or result.find('h2')
+        name = name_elem.get_text(strip=True) if name_elem else ''
+        if not name:
+            continue
+
+        phone = ''
+        phone_elem = result.find('div', class_='phones')
+        if phone_elem:
+            phone = re.sub(r'\D', '', phone_elem.get_text(strip=True))
+
+        address = ''
+        addr_elem = result.find('div', class_='street-address')
+        if addr_elem:
+            address = addr_elem.get_text(strip=True)
+
+        website = ''
+        for link in result.find_all('a', href=True):
+            href = link['href']
+            if 'http' in href and 'yellowpages.com' not in href:
+                website = href
+                break
+
+        category = ''
+        cat_elem = result.find('div', class_='categories')
+        if cat_elem:
+            category = cat_elem.get_text(strip=True)
+
+        listings.append({
+            'name': name,
+            'phone': phone if len(phone) >= 10 else '',
+            'address': address,
+            'website': website,
+            'category': category,
+            'keyword': keyword,
+            'location': location,
+            'timezone': timezone,
+            'status': 'Lead',
+        })
+
+    return listings
+
+
+def load_pages(paths, count):
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+        return pages
+    return [render_results_page('Real Estate', 'CA', page, 30 * count) for page in range(1, count + 1)]
+
+
+def bench(name, parse, pages, rounds):
+    # Throughput
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            parse(html, 'Real Estate', 'CA', 'PST')
+    elapsed = time.perf_counter() - started
+    pages_per_sec = rounds * len(pages) / elapsed
+
+    # Memory (separate pass - tracemalloc slows everything down)
+    tracemalloc.start()
+    peaks = []
+    for html in pages:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        parse(html, 'Real Estate', 'CA', 'PST')
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - base)
+    tracemalloc.stop()
+
+    avg_peak_kb = sum(peaks) / len(peaks) / 1024
+    print(f"{name:<22} {pages_per_sec:>9.1f} pages/sec   {avg_peak_kb:>9.0f} KB Python heap peak/page")
+    return pages_per_sec
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='Saved results pages (defaults to generated fixtures)')
+    parser.add_argument('--fixtures', type=int, default=10, help='Number of generated pages')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, args.fixtures)
+    avg_kb = sum(len(p) for p in pages) / len(pages) / 1024
+    print(f"{len(pages)} pages, {avg_kb:.0f} KB average, {args.rounds} rounds\n")
+
+    mismatches = sum(
+        legacy_parse_listings(html, 'k', 'l', 't') != parse_listings(html, 'k', 'l', 't') for html in pages
+    )
+    print(f"Output check: {'identical' if not mismatches else f'{mismatches} page(s) differ'}\n")
+
+    legacy = bench('bs4 html.parser', legacy_parse_listings, pages, args.rounds)
+    fast = bench('lxml + XPath', parse_listings, pages, args.rounds)
+    print(f"\nSpeed-up: {fast / legacy:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Local stand-in for yellowpages.com, serving the fixture results pages.
+
+    python -m benchmarks.fake_server --port 8765 --latency-ms 150 --rate-429 0.02 --challenge-rate 0.01
+    YELLOWPAGES_BASE_URL=http://127.0.0.1:8765 python main_simple.py
+
+/search serves paginated results ("Showing X-Y of N", data-page links, "no results" past the
+end) for any search_terms/geo_location_terms, with optional latency and injected failures:
+429s (with Retry-After), 403s, Cloudflare "Just a moment..." interstitials that reload into
+the real page after a second (like a cleared challenge), and truncated bodies where the
+connection drops partway through. Failures are drawn per request, so a retry can succeed.
+
+Asset URLs in the fixtures are rewritten to this server, so browsers never leave localhost.
+GET /__stats reports what was served, including each page's latency from its first request
+to its first clean response; POST /__reset clears it. The harness in bench_engines.py
+drives both.
+"""
+
+import argparse
+import asyncio
+import functools
+import random
+import time
+
+from aiohttp import web
+
+from benchmarks.fixtures import render_results_page
+
+EXTERNAL_ORIGINS = ('https://www.yellowpages.com', 'https://www.googletagmanager.com', 'https://i1.ypcdn.com')
+
+CHALLENGE_PAGE = """<!DOCTYPE html>
+<html lang="en-US"><head><title>Just a moment...</title>
+<meta http-equiv="refresh" content="1">
+<script>window._cf_chl_opt = {cType: 'managed', cRay: '%s'};</script>
+</head><body><div id="challenge-platform"><h1>www.yellowpages.com</h1>
+<p>Verifying you are human. This may take a few seconds.</p><div class="cf-chl-widget"></div></div>
+%s
+</body></html>"""
+
+
+class FakeYellowPages:
+    def __init__(self, results=600, latency_ms=0, jitter_ms=0, rate_429=0.0, rate_403=0.0,
+                 challenge_rate=0.0, truncate_rate=0.0, chrome_bytes=250_000, seed=None):
+        self.results = results
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rates = [('429', rate_429), ('403', rate_403), ('challenge', challenge_rate), ('truncated', truncate_rate)]
+        self.chrome_bytes = chrome_bytes
+        self.rng = random.Random(seed)
+        self.origin = ''
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.outcomes = {}
+        self.bytes_sent = 0
+        # page key -> [first request time, first clean response time or None, requests]
+        self.pages = {}
+
+    @functools.lru_cache(maxsize=512)
+    def page_html(self, keyword, location, page):
+        html = render_results_page(keyword, location, page, self.results, self.chrome_bytes)
+        for origin in EXTERNAL_ORIGINS:
+            html = html.replace(origin, self.origin)
+        return html.encode('utf-8')
+
+    def _draw(self):
+        roll = self.rng.random()
+        for outcome, rate in self.rates:
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return 'ok'
+
+    def _count(self, outcome, size=0):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.bytes_sent += size
+
+    async def search(self, request):
+        keyword = request.query.get('search_terms', '')
+        location = request.query.get('geo_location_terms', '')
+        try:
+            page = max(1, int(request.query.get('page', 1)))
+        except ValueError:
+            page = 1
+        key = (keyword, location, page)
+        now = time.monotonic()
+        record = self.pages.setdefault(key, [now, None, 0])
+        record[2] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+        outcome = self._draw()
+        if outcome == '429':
+            self._count(outcome)
+            return web.Response(status=429, text='Too Many Requests', headers={'Retry-After': '1'})
+        if outcome == '403':
+            self._count(outcome)
+            return web.Response(status=403, text='Forbidden')
+        if outcome == 'challenge':
+            # Padded past the scrapers' "response too small" check, as real interstitials are
+            body = (CHALLENGE_PAGE % (f"{self.rng.getrandbits(64):016x}", '<!-- cf -->' * 200)).encode('utf-8')
+            self._count(outcome, len(body))
+            return web.Response(status=403, body=body, content_type='text/html')
+
+        body = self.page_html(keyword, location, page)
+        if outcome == 'truncated':
+            # Promise the full length, send part of it and drop the connection
+            response = web.StreamResponse(headers={'Content-Type': 'text/html; charset=utf-8'})
+            response.content_length = len(body)
+            await response.prepare(request)
+            cut = self.rng.randrange(len(body) // 10, len(body) // 2)
+            await response.write(body[:cut])
+            self._count(outcome, cut)
+            request.transport.close()
+            return response
+
+        self._count(outcome, len(body))
+        if record[1] is None:
+            record[1] = time.monotonic()
+        return web.Response(body=body, content_type='text/html', charset='utf-8')
+
+    async def asset(self, request):
+        # Stylesheets, scripts and images the fixtures reference: empty, so they cost nothing
+        return web.Response(status=204)
+
+    async def stats(self, request):
+        latencies = sorted(done - first for first, done, _ in self.pages.values() if done is not None)
+        return web.json_response({
+            'elapsedSecs': round(time.monotonic() - self.started, 3),
+            'requests': sum(self.outcomes.values()),
+            'outcomes': self.outcomes,
+            'bytesSent': self.bytes_sent,
+            'pagesRequested': len(self.pages),
+            'pagesServed': len(latencies),
+            'pageLatencySecs': latencies,
+            'firstRequestAt': min((first for first, _, _ in self.pages.values()), default=None),
+            'lastServedAt': max((done for _, done, _ in self.pages.values() if done is not None), default=None),
+        })
+
+    async def reset_stats(self, request):
+        self.reset()
+        return web.json_response({'reset': True})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/search', self.search)
+        app.router.add_get('/__stats', self.stats)
+        app.router.add_post('/__reset', self.reset_stats)
+        app.router.add_route('*', '/{tail:.*}', self.asset)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--results', type=int, default=600, help='Results per search (30 per page)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Added to every /search response')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Random +/- spread around the latency')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Share of requests answered 429')
+    parser.add_argument('--rate-403', type=float, default=0.0, help='Share of requests answered 403')
+    parser.add_argument('--challenge-rate', type=float, default=0.0, help='Share of requests answered with a Cloudflare interstitial')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='Share of responses cut off mid-body')
+    parser.add_argument('--chrome-kb', type=int, default=250, help='Page filler per results page')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeYellowPages(
+        results=args.results, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429, rate_403=args.rate_403, challenge_rate=args.challenge_rate,
+        truncate_rate=args.truncate_rate, chrome_bytes=args.chrome_kb * 1024, seed=args.seed,
+    )
+    server.origin = f"http://{args.host}:{args.port}"
+    print(f"Serving fake Yellow Pages on {server.origin}", flush=True)
+    web.run_app(server.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
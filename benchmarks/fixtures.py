@@ -0,0 +1,132 @@
+"""
+Realistic Yellow Pages results pages for offline benchmarks.
+
+Pages mirror the markup the scrapers read (div.result cards, .pagination .showing-count,
+data-page links) plus the page chrome that makes a real results page 300-500KB: inline
+scripts, tracking snippets, navigation and footer links. Output is deterministic for a
+given (keyword, location, page, total_results). Being generated, they can't catch markup
+the generator doesn't produce; tests/test_parsing.py checks both parsers on the results
+pages saved under benchmarks/pages/ instead.
+"""
+
+import hashlib
+import html
+import math
+import random
+
+RESULTS_PER_PAGE = 30
+
+STREETS = ['Main St', 'Oak Ave', 'Maple Dr', 'Cedar Ln', 'Pine St', 'Elm St', 'Sunset Blvd', 'Broadway', 'Market St', '1st Ave']
+CITIES = [('Los Angeles', 'CA', '900'), ('San Diego', 'CA', '921'), ('Seattle', 'WA', '981'), ('New York', 'NY', '100'), ('Austin', 'TX', '787')]
+NAME_PARTS = ['Acme', 'Premier', 'Golden State', 'Pacific', 'Summit', 'Blue Sky', 'Reliable', 'Evergreen', 'Metro', 'First Choice', 'Coastal', 'Pioneer']
+SUFFIXES = ['Group', 'Services', '& Sons', 'Co', 'Associates', 'Partners', 'Inc', 'LLC']
+CATEGORIES = ['Real Estate Agents', 'Real Estate Consultants', 'Property Management', 'Plumbers', 'Water Heaters', 'Lawyers', 'Attorneys', 'Dentists', 'Electricians']
+
+
+def _rng(*parts):
+    seed = hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def listing_for(keyword, location, index):
+    """The business shown at a given absolute position of a search (stable across pages)"""
+    rng = _rng(keyword, location, index)
+    city, state, zip_prefix = rng.choice(CITIES)
+    name = f"{rng.choice(NAME_PARTS)} {keyword} {rng.choice(SUFFIXES)} #{index + 1}"
+    return {
+        'id': 100000 + index,
+        'name': name,
+        'phone': f"({rng.randint(200, 989)}) {rng.randint(200, 989)}-{rng.randint(1000, 9999)}",
+        'street': f"{rng.randint(10, 9999)} {rng.choice(STREETS)}",
+        'locality': f"{city}, {state} {zip_prefix}{rng.randint(10, 99)}",
+        'website': f"https://www.{name.split(' #')[0].lower().replace(' ', '').replace('&', 'and')}{index}.com" if rng.random() < 0.7 else '',
+        'categories': rng.sample(CATEGORIES, 2),
+    }
+
+
+def _render_listing(listing, position):
+    e = html.escape
+    website = (
+        f'<a class="track-visit-website" href="{e(listing["website"])}" rel="nofollow" target="_blank">Website</a>'
+        if listing['website'] else ''
+    )
+    categories = ''.join(f'<a href="/search?search_terms={e(c)}">{e(c)}</a>' for c in listing['categories'])
+    return f'''
+<div class="result" id="lid-{listing['id']}">
+  <div class="srp-listing clickable-area mdm">
+    <div class="v-card">
+      <div class="media-thumbnail"><a class="media-thumbnail-wrapper chain-img" href="/mip/{listing['id']}"><img alt="{e(listing['name'])}" src="https://i1.ypcdn.com/blob/{listing['id']}_thumb.png" width="70" height="70"></a></div>
+      <div class="info">
+        <div class="info-section info-primary">
+          <h2 class="n">{position}.<a class="business-name" href="/mip/{listing['id']}" data-analytics='{{"target":"name","feature_click":""}}'><span>{e(listing['name'])}</span></a></h2>
+          <div class="categories">{categories}</div>
+          <div class="ratings" data-israteable="true"><a class="rating hasExtraRating" href="/mip/{listing['id']}#yp-rating"><div class="result-rating four half "></div><span class="count">(12)</span></a></div>
+          <div class="amenities-info"><span class="amenities-title">Amenities:</span> Free Estimates, Licensed, Insured</div>
+        </div>
+        <div class="info-section info-secondary">
+          <div class="phones phone primary">{e(listing['phone'])}</div>
+          <div class="adr"><div class="street-address">{e(listing['street'])}</div><div class="locality">{e(listing['locality'])}</div></div>
+          <div class="links">{website}<a class="track-map-it directions small-btn" href="/mip/{listing['id']}#directions">Directions</a><a class="menu" href="/mip/{listing['id']}#more-info">More Info</a></div>
+          <div class="snippet"><p class="body"><span>From Business: Family owned and operated since {1950 + listing['id'] % 70}. Serving the greater area with honest, reliable service. Call today for a free quote on all residential and commercial work.</span></p></div>
+        </div>
+      </div>
+    </div>
+  </div>
+</div>'''
+
+
+def _render_pagination(keyword, location, page, total_results):
+    total_pages = max(1, math.ceil(total_results / RESULTS_PER_PAGE))
+    first = (page - 1) * RESULTS_PER_PAGE + 1
+    last = min(page * RESULTS_PER_PAGE, total_results)
+    links = ''.join(
+        f'<li><a data-page="{n}" href="/search?search_terms={html.escape(keyword)}&amp;geo_location_terms={html.escape(location)}&amp;page={n}">{n}</a></li>'
+        for n in range(max(1, page - 4), min(total_pages, page + 5) + 1) if n != page
+    )
+    next_link = f'<a class="next ajax-page" data-page="{page + 1}" href="#">Next</a>' if page < total_pages else ''
+    return f'''
+<div class="pagination">
+  <span class="showing-count">Showing {first}-{last} of {total_results}</span>
+  <ul><li><span class="disabled">{page}</span></li>{links}</ul>
+  {next_link}
+</div>'''
+
+
+def _render_chrome(page_seed, target_bytes):
+    """Scripts, nav and footer filler, sized to make the page realistically heavy"""
+    rng = _rng('chrome', page_seed)
+    parts = []
+    size = 0
+    while size < target_bytes:
+        blob = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(400))
+        chunk = (
+            f'<script>window.__yp_ads = window.__yp_ads || []; window.__yp_ads.push({{"slot":"{blob[:12]}","targeting":"{blob}"}});</script>\n'
+            f'<ul class="footer-links">' + ''.join(f'<li><a href="/{blob[i:i + 8]}">{blob[i:i + 8]}</a></li>' for i in range(0, 120, 8)) + '</ul>\n'
+        )
+        parts.append(chunk)
+        size += len(chunk)
+    return ''.join(parts)
+
+
+def render_results_page(keyword, location, page, total_results, chrome_bytes=250_000):
+    """A full results page for one search page. Pages past the end render "no results"."""
+    first_index = (page - 1) * RESULTS_PER_PAGE
+    count = max(0, min(RESULTS_PER_PAGE, total_results - first_index))
+    listings = ''.join(
+        _render_listing(listing_for(keyword, location, first_index + i), first_index + i + 1)
+        for i in range(count)
+    )
+    body = (
+        f'<div class="search-results organic">{listings}</div>{_render_pagination(keyword, location, page, total_results)}'
+        if count else '<div class="no-results"><h2>No results found for your search</h2></div>'
+    )
+    title = f"{html.escape(keyword)} in {html.escape(location)} | Yellow Pages"
+    return f'''<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="https://www.yellowpages.com/assets/application.css">
+<script src="https://www.googletagmanager.com/gtm.js?id=GTM-XXXX" async></script>
+</head><body class="search-page">
+<header id="header"><a class="logo" href="/">yellowpages</a><form class="search-form"><input name="search_terms" value="{html.escape(keyword)}"><input name="geo_location_terms" value="{html.escape(location)}"></form></header>
+<div id="content-container"><div class="scrollable-pane">{body}</div></div>
+<footer>{_render_chrome((keyword, location, page), chrome_bytes)}</footer>
+</body></html>'''
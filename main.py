@@ -8,281 +8,333 @@ Scrapes business listings from Yellow Pages with smart page detection
 from apify import Actor
 from playwright.async_api import async_playwright
 import asyncio
-import random
 import logging
-from urllib.parse import urlencode
-from datetime import datetime
+import math
+
+from yellowpages import metrics
+from yellowpages.challenge import solve_cloudflare
+from yellowpages.concurrency import AdaptiveConcurrency
+from yellowpages.jitter import JitterPolicy
+from yellowpages.metrics import RunMetrics
+from yellowpages.rate_limit import RateLimiter
+from yellowpages.readiness import wait_until_ready
+from yellowpages.request_filter import RequestFilter
+from yellowpages.runner import SearchRunner
+from yellowpages.session_pool import SessionPool
+from yellowpages.sharding import coordinate
+from yellowpages.urls import build_search_url
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class YellowPagesScraper:
-    def __init__(self, actor):
-        self.actor = actor
-        self.all_results = []
-
-    async def scrape_single_page(self, context, keyword, place, page_num, timezone):
-        """Scrape a single page using Apify's browser pool"""
-        page = None
-        try:
-            # Use Apify's browser pool (much faster than creating new browsers)
-            page = await context.new_page()
-
-            # Stealth
-            await page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined});")
-
-            # Build URL
-            url = f"https://www.yellowpages.com/search?{urlencode({'search_terms': keyword, 'geo_location_terms': place, 'page': page_num})}"
-
-            logging.info(f"Page {page_num}: {url}")
-
-            # Navigate with increased timeout
-            await page.goto(url, wait_until='networkidle', timeout=60000)
-
-            # Handle Cloudflare
-            title = await page.title()
-            if 'just a moment' in title.lower():
-                logging.info(f"Page {page_num}: Cloudflare detected, waiting...")
-                await page.mouse.move(random.randint(200, 600), random.randint(200, 400))
-                await asyncio.sleep(random.uniform(1, 2))
-
-                try:
-                    await page.wait_for_function(
-                        "document.title !== 'Just a moment...'",
-                        timeout=30000
-                    )
-                    logging.info(f"Page {page_num}: Cloudflare bypassed")
-                except:
-                    logging.error(f"Page {page_num}: Cloudflare timeout")
-                    return []
-
-            # Wait for content to load
-            await asyncio.sleep(random.uniform(2, 4))
+# Listing extraction, run inside the page. Search metadata is passed in as an argument.
+EXTRACT_LISTINGS_JS = """
+    (meta) => {
+        const selectors = ['.result', '[data-testid="organic-listing"]', '.search-results .result'];
+        let results = [];
+
+        for (const selector of selectors) {
+            results = document.querySelectorAll(selector);
+            console.log(`Trying selector: ${selector}, found: ${results.length}`);
+            if (results.length > 0) break;
+        }
+
+        if (results.length === 0) {
+            console.log('No results found with any selector');
+            console.log('Body length:', document.body.innerText.length);
+            console.log('Title:', document.title);
+            return [];
+        }
+
+        const listings = [];
+
+        for (let i = 0; i < results.length && i < 40; i++) {
+            const result = results[i];
+            try {
+                // Name
+                let name = '';
+                const nameSelectors = ['.business-name span', '.business-name', 'h3 a', 'h2 a'];
+                for (const sel of nameSelectors) {
+                    const elem = result.querySelector(sel);
+                    if (elem && elem.textContent.trim()) {
+                        name = elem.textContent.trim();
+                        break;
+                    }
+                }
+                if (!name) continue;
+
+                // Phone
+                let phone = '';
+                const phoneSelectors = ['.phone', '.phones', 'a[href*="tel:"]'];
+                for (const sel of phoneSelectors) {
+                    const elem = result.querySelector(sel);
+                    if (elem) {
+                        const phoneText = elem.textContent.replace(/\\D/g, '');
+                        if (phoneText.length >= 10) {
+                            phone = phoneText;
+                            break;
+                        }
+                    }
+                }
 
-            # Try to wait for results to appear
-            try:
-                await page.wait_for_selector('.result, [data-testid="organic-listing"]', timeout=10000)
-            except:
-                logging.warning(f"Page {page_num}: Timeout waiting for results selector")
-                # Debug: Log what we got (no screenshot to avoid timeout)
-                html_content = await page.content()
-                page_title = await page.title()
-                logging.error(f"Page {page_num} title: '{page_title}'")
-                logging.error(f"Page {page_num} HTML preview: {html_content[:300]}")
-                if page_num == 1:
-                    await Actor.set_value('page-1-html', html_content[:3000], content_type='text/plain')
-
-            # Extract listings
-            listings = await page.evaluate(f"""
-                () => {{
-                    const selectors = ['.result', '[data-testid="organic-listing"]', '.search-results .result'];
-                    let results = [];
-
-                    for (const selector of selectors) {{
-                        results = document.querySelectorAll(selector);
-                        console.log(`Trying selector: ${{selector}}, found: ${{results.length}}`);
-                        if (results.length > 0) break;
-                    }}
-
-                    if (results.length === 0) {{
-                        console.log('No results found with any selector');
-                        console.log('Body length:', document.body.innerText.length);
-                        console.log('Title:', document.title);
-                        return [];
-                    }}
-
-                    const listings = [];
-
-                    for (let i = 0; i < results.length && i < 40; i++) {{
-                        const result = results[i];
-                        try {{
-                            // Name
-                            let name = '';
-                            const nameSelectors = ['.business-name span', '.business-name', 'h3 a', 'h2 a'];
-                            for (const sel of nameSelectors) {{
-                                const elem = result.querySelector(sel);
-                                if (elem && elem.textContent.trim()) {{
-                                    name = elem.textContent.trim();
-                                    break;
-                                }}
-                            }}
-                            if (!name) continue;
-
-                            // Phone
-                            let phone = '';
-                            const phoneSelectors = ['.phone', '.phones', 'a[href*="tel:"]'];
-                            for (const sel of phoneSelectors) {{
-                                const elem = result.querySelector(sel);
-                                if (elem) {{
-                                    const phoneText = elem.textContent.replace(/\\D/g, '');
-                                    if (phoneText.length >= 10) {{
-                                        phone = phoneText;
-                                        break;
-                                    }}
-                                }}
-                            }}
-
-                            // Address
-                            let address = '';
-                            const addrElem = result.querySelector('.adr, .address');
-                            if (addrElem) address = addrElem.textContent.trim();
-
-                            // Website
-                            let website = '';
-                            const webElem = result.querySelector('a[href*="http"]:not([href*="yellowpages.com"])');
-                            if (webElem) website = webElem.href;
-
-                            // Categories
-                            let categories = '';
-                            const catElems = result.querySelectorAll('.categories a, .category');
-                            if (catElems.length > 0) {{
-                                categories = Array.from(catElems)
-                                    .map(e => e.textContent.trim())
-                                    .filter(c => c)
-                                    .slice(0, 2)
-                                    .join(', ');
-                            }}
-
-                            listings.push({{
-                                name: name,
-                                phone: phone,
-                                address: address,
-                                website: website,
-                                category: categories,
-                                keyword: '{keyword}',
-                                location: '{place}',
-                                timezone: '{timezone}',
-                                status: 'Lead',
-                            }});
-
-                        }} catch (error) {{
-                            console.error('Extraction error:', error);
-                        }}
-                    }}
-
-                    return listings;
-                }}
-            """)
-
-            if listings:
-                logging.info(f"Page {page_num}: SUCCESS - {len(listings)} listings extracted")
-            else:
-                logging.warning(f"Page {page_num}: No listings found")
+                // Address
+                let address = '';
+                const addrElem = result.querySelector('.adr, .address');
+                if (addrElem) address = addrElem.textContent.trim();
+
+                // Website
+                let website = '';
+                const webElem = result.querySelector('a[href*="http"]:not([href*="yellowpages.com"])');
+                if (webElem) website = webElem.href;
+
+                // Categories
+                let categories = '';
+                const catElems = result.querySelectorAll('.categories a, .category');
+                if (catElems.length > 0) {
+                    categories = Array.from(catElems)
+                        .map(e => e.textContent.trim())
+                        .filter(c => c)
+                        .slice(0, 2)
+                        .join(', ');
+                }
 
-            return listings
+                listings.push({
+                    name: name,
+                    phone: phone,
+                    address: address,
+                    website: website,
+                    category: categories,
+                    keyword: meta.keyword,
+                    location: meta.location,
+                    timezone: meta.timezone,
+                    status: 'Lead',
+                });
+
+            } catch (error) {
+                console.error('Extraction error:', error);
+            }
+        }
+
+        return listings;
+    }
+"""
 
-        except Exception as e:
-            logging.error(f"Page {page_num} error: {e}")
-            return []
-        finally:
-            if page:
-                await page.close()
+# Page count detection, run inside the page
+COUNT_PAGES_JS = """
+    () => {
+        // Method 1: Yellow Pages specific - "Showing 1-30 of 103"
+        const showingCount = document.querySelector('.pagination .showing-count');
+        if (showingCount) {
+            const text = showingCount.textContent;
+            const match = text.match(/Showing\\s+\\d+-\\d+\\s+of\\s+([\\d,]+)/i);
+            if (match) {
+                const totalResults = parseInt(match[1].replace(/,/g, ''));
+                const pages = Math.ceil(totalResults / 30);
+                return pages;
+            }
+        }
+
+        // Method 2: Count actual pagination numbers
+        const pageNumbers = document.querySelectorAll('.pagination ul li a[data-page]');
+        if (pageNumbers.length > 0) {
+            const maxPage = Math.max(...Array.from(pageNumbers)
+                .map(a => parseInt(a.getAttribute('data-page')))
+                .filter(num => !isNaN(num)));
+            return maxPage;
+        }
+
+        // Method 3: Check if single page
+        const nextButton = document.querySelector('.pagination .next');
+        if (!nextButton) {
+            const results = document.querySelectorAll('.result, [data-testid="organic-listing"]');
+            if (results.length > 0) return 1;
+        }
+
+        // Method 4: No results
+        const results = document.querySelectorAll('.result, [data-testid="organic-listing"]');
+        if (results.length === 0) return 0;
+
+        return 10;
+    }
+"""
 
-    async def detect_total_pages(self, context, keyword, place):
-        """Detect how many real pages exist for this search"""
-        page = None
+class YellowPagesScraper:
+    def __init__(self, actor, jitter=None, rate_limiter=None, cache=None):
+        self.actor = actor
+        self.jitter = jitter or JitterPolicy()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache
+
+    async def open_search_page(self, session, page, keyword, place, page_num):
+        """Load a results page into a leased page and wait for it. Returns False if Cloudflare didn't clear"""
+        url = build_search_url(keyword, place, page_num)
+        logging.info(f"Page {page_num}: {url}")
+
+        if self.cache is not None:
+            cached = await self.cache.get(url)
+            if cached is not None:
+                await self.load_cached_page(page, cached)
+                return True
+
+        # Don't start new navigations while another page on this context is solving a challenge
+        gate = session.challenge_gate
+        await gate.wait_clear()
+
+        # Navigate and return as soon as listings (or a pagination marker) are in the DOM
+        state = await self.navigate(session, page, url)
+
+        # Handle Cloudflare - one page per context solves it, the others wait
+        if state == 'challenge':
+            metrics.count('challenges')
+            with metrics.stage('challenge'):
+                cleared, solved_here = await gate.handle(lambda: solve_cloudflare(page, f"Page {page_num}"))
+            if not cleared:
+                return False
+
+            if not solved_here:
+                # Clearance cookies live in the shared context - reload to use them
+                logging.info(f"Page {page_num}: Reloading with shared clearance cookies")
+                state = await self.navigate(session, page, url)
+            else:
+                state = await wait_until_ready(page)
+            if state == 'challenge':
+                logging.error(f"Page {page_num}: Still challenged after clearance")
+                return False
+
+        if state == 'timeout':
+            logging.warning(f"Page {page_num}: Timeout waiting for results selector")
+            # Debug: Log what we got (no screenshot to avoid timeout)
+            html_content = await page.content()
+            page_title = await page.title()
+            logging.error(f"Page {page_num} title: '{page_title}'")
+            logging.error(f"Page {page_num} HTML preview: {html_content[:300]}")
+            if page_num == 1:
+                await Actor.set_value('page-1-html', html_content[:3000], content_type='text/plain')
+        elif self.cache is not None:
+            await self.cache.put(url, await page.content())
+
+        # Optional human-like pause (off unless configured)
+        with metrics.stage('jitter'):
+            await self.jitter.sleep()
+
+        return True
+
+    async def navigate(self, session, page, url):
+        """Rate-limited page.goto plus the readiness wait. Returns the readiness state"""
+        with metrics.stage('rateLimit'):
+            # Per-proxy limit only for sticky proxy sessions, not direct connections
+            await self.rate_limiter.wait(url, session.session_id if session.proxy_url else None)
+        metrics.count('fetches')
+        with metrics.stage('navigate'):
+            response = await page.goto(url, wait_until='domcontentloaded', timeout=60000)
+            state = await wait_until_ready(page)
+        if response is not None:
+            try:
+                metrics.add_bytes((await response.request.sizes())['responseBodySize'])
+            except Exception as e:
+                logging.debug(f"No response size for {url}: {e}")
+        return state
+
+    async def load_cached_page(self, page, html):
+        """Render a cached results page without touching the network (extraction only needs the DOM)"""
+        await page.route('**/*', lambda route: route.abort())
         try:
-            page = await context.new_page()
-            await page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined});")
-
-            url = f"https://www.yellowpages.com/search?{urlencode({'search_terms': keyword, 'geo_location_terms': place, 'page': 1})}"
-            logging.info(f"Detection: Loading {url}")
-            await page.goto(url, wait_until='networkidle', timeout=60000)
-            await asyncio.sleep(random.uniform(2, 4))
-
-            # Debug: Check what we got
-            title = await page.title()
-            html = await page.content()
-            logging.info(f"Detection: Page title: '{title}'")
-            logging.info(f"Detection: HTML length: {len(html)}")
-
-            # Check for blocking
-            if 'cloudflare' in html.lower() or 'blocked' in html.lower() or not title or title == '':
-                logging.error(f"Detection: PAGE BLOCKED OR EMPTY!")
-                await Actor.set_value('blocked-html', html[:5000], content_type='text/plain')
-                # Try to take screenshot anyway (with short timeout)
-                try:
-                    screenshot = await page.screenshot(timeout=5000)
-                    await Actor.set_value('blocked-screenshot', screenshot, content_type='image/png')
-                except:
-                    pass
-                return 0
-
-            # Extract total results and calculate pages
-            total_pages = await page.evaluate("""
-                () => {
-                    // Method 1: Yellow Pages specific - "Showing 1-30 of 103"
-                    const showingCount = document.querySelector('.pagination .showing-count');
-                    if (showingCount) {
-                        const text = showingCount.textContent;
-                        const match = text.match(/Showing\\s+\\d+-\\d+\\s+of\\s+(\\d+)/i);
-                        if (match) {
-                            const totalResults = parseInt(match[1]);
-                            const pages = Math.ceil(totalResults / 30);
-                            return pages;
-                        }
-                    }
+            await page.set_content(html.decode('utf-8', 'replace'), wait_until='domcontentloaded')
+        finally:
+            await page.unroute('**/*')
+
+    async def extract_listings(self, page, keyword, place, page_num, timezone):
+        """Extract listings from a loaded results page"""
+        with metrics.stage('extract'):
+            listings = await page.evaluate(
+                EXTRACT_LISTINGS_JS,
+                {'keyword': keyword, 'location': place, 'timezone': timezone},
+            )
+        metrics.count('pages')
 
-                    // Method 2: Count actual pagination numbers
-                    const pageNumbers = document.querySelectorAll('.pagination ul li a[data-page]');
-                    if (pageNumbers.length > 0) {
-                        const maxPage = Math.max(...Array.from(pageNumbers)
-                            .map(a => parseInt(a.getAttribute('data-page')))
-                            .filter(num => !isNaN(num)));
-                        return maxPage;
-                    }
+        if listings:
+            logging.info(f"Page {page_num}: SUCCESS - {len(listings)} listings extracted")
+        else:
+            logging.warning(f"Page {page_num}: No listings found")
 
-                    // Method 3: Check if single page
-                    const nextButton = document.querySelector('.pagination .next');
-                    if (!nextButton) {
-                        const results = document.querySelectorAll('.result, [data-testid="organic-listing"]');
-                        if (results.length > 0) return 1;
-                    }
+        return listings
 
-                    // Method 4: No results
-                    const results = document.querySelectorAll('.result, [data-testid="organic-listing"]');
-                    if (results.length === 0) return 0;
+    async def scrape_page(self, sessions, job, timezone):
+        """Fetch callable for the search runner: load and extract one page (listings None if it failed)"""
+        if job.page_num == 1:
+            return await self.scrape_first_page(sessions, job, timezone), None
+        return await self.scrape_single_page(sessions, job, timezone), None
 
-                    return 10;
-                }
-            """)
+    async def scrape_single_page(self, sessions, job, timezone):
+        """Scrape a single page using a page leased from one of the proxy sessions (None if it failed)"""
+        try:
+            async with sessions.lease(avoid=job.failed_on) as (session, page):
+                job.identity = session.session_id
+                cleared = await self.open_search_page(session, page, job.keyword, job.location, job.page_num)
+                session.record(blocked=not cleared)
+                if not cleared:
+                    return None
 
-            logging.info(f"Detected {total_pages} pages for '{keyword}' in {place}")
-            return min(total_pages, 100)  # Cap at 100 pages
+                return await self.extract_listings(page, job.keyword, job.location, job.page_num, timezone)
 
         except Exception as e:
-            logging.error(f"Error detecting pages: {e}")
-            return 10
-        finally:
-            if page:
-                await page.close()
-
-    async def scrape_multiple_pages_parallel(self, context, keyword, place, pages_to_scrape, timezone, max_concurrency):
-        """Scrape multiple pages in parallel"""
-        logging.info(f"Scraping {len(pages_to_scrape)} pages in parallel for '{keyword}' in {place}")
-
-        semaphore = asyncio.Semaphore(max_concurrency)
+            logging.error(f"Page {job.page_num} error: {e}")
+            return None
 
-        async def scrape_with_semaphore(page_num):
-            async with semaphore:
-                await asyncio.sleep(random.uniform(0, 1))
-                return await self.scrape_single_page(context, keyword, place, page_num, timezone)
+    async def scrape_first_page(self, sessions, job, timezone):
+        """Load page 1 once: detect how many pages exist, fan out the rest, then extract page 1.
 
-        tasks = [scrape_with_semaphore(page_num) for page_num in pages_to_scrape]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        job.found_pages() is called as soon as the page count is known so the remaining
+        pages (and, past YP's 100-page cap, one sub-search per city) start loading while
+        page 1 is still being extracted. Returns None if page 1 could not be loaded.
+        """
+        keyword, place = job.keyword, job.location
+        try:
+            async with sessions.lease(avoid=job.failed_on) as (session, page):
+                job.identity = session.session_id
+                cleared = await self.open_search_page(session, page, keyword, place, 1)
+
+                # Debug: Check what we got
+                title = await page.title()
+                html = await page.content()
+                logging.info(f"Detection: Page title: '{title}'")
+                logging.info(f"Detection: HTML length: {len(html)}")
+
+                # Check for blocking
+                blocked = not cleared or 'cloudflare' in html.lower() or 'blocked' in html.lower() or not title
+                session.record(blocked=blocked)
+                if blocked:
+                    logging.error(f"Detection: PAGE BLOCKED OR EMPTY!")
+                    await Actor.set_value('blocked-html', html[:5000], content_type='text/plain')
+                    # Try to take screenshot anyway (with short timeout)
+                    try:
+                        screenshot = await page.screenshot(timeout=5000)
+                        await Actor.set_value('blocked-screenshot', screenshot, content_type='image/png')
+                    except:
+                        pass
+                    return None
+
+                # Extract total results and fan out pages 2..N before extracting page 1
+                with metrics.stage('countPages'):
+                    reported_pages = await page.evaluate(COUNT_PAGES_JS)
+                job.found_pages(reported_pages)
+                if reported_pages == 0:
+                    return []
 
-        all_listings = []
-        for i, result in enumerate(results):
-            if isinstance(result, list):
-                all_listings.extend(result)
+                return await self.extract_listings(page, keyword, place, 1, timezone)
 
-        logging.info(f"PARALLEL SCRAPING COMPLETE: {len(all_listings)} total listings")
-        return all_listings
+        except Exception as e:
+            logging.error(f"Error on first page for '{keyword}' in {place}: {e}")
+            return None
 
 async def main():
     async with Actor:
         # Get input from Apify
         actor_input = await Actor.get_input() or {}
 
+        # Coordinator and merge-only runs don't scrape themselves
+        if await coordinate(actor_input):
+            return
+
         keywords = actor_input.get('keywords', ['Real Estate'])
         locations = actor_input.get('locations', ['CA'])
         timezone = actor_input.get('timezone', 'PST')
@@ -297,7 +349,17 @@ async def main():
 
         Actor.log.info(f"Starting scraper: {len(keywords)} keywords, {len(locations)} locations")
 
-        scraper = YellowPagesScraper(Actor)
+        # maxConcurrency is the ceiling; the limiter finds the operating point
+        limiter = AdaptiveConcurrency(max_concurrency)
+        rate_limiter = RateLimiter.from_input(actor_input)
+        # Planner, pagination, checkpoint, retries and the dataset writer
+        runner = await SearchRunner.load(actor_input, max_pages, max_concurrency)
+        scraper = YellowPagesScraper(
+            Actor,
+            jitter=JitterPolicy.from_input(actor_input),
+            rate_limiter=rate_limiter,
+            cache=runner.cache,
+        )
 
         # Use Apify's browser pool (much faster than creating browsers)
         async with async_playwright() as playwright:
@@ -314,50 +376,71 @@ async def main():
             # Use Apify's residential proxies to bypass Cloudflare
             proxy_config = await Actor.create_proxy_configuration(
                 groups=['RESIDENTIAL']  # Use residential proxies instead of datacenter
-            )
-
-            # Create new proxy URL for Playwright
-            proxy_url = await proxy_config.new_url() if proxy_config else None
-            Actor.log.info(f"Using proxy: {proxy_url}")
+            ) if actor_input.get('residentialProxy', True) else None
+
+            # Block images, fonts, media, ads and trackers before they hit the proxy
+            request_filter = RequestFilter.from_input(actor_input)
+
+            # Several contexts, each on its own sticky proxy session (one IP per context)
+            proxy_sessions = max(1, min(actor_input.get('proxySessions', 5), max_concurrency))
+            sessions = await SessionPool(
+                browser,
+                proxy_config,
+                size=proxy_sessions,
+                pages_per_session=math.ceil(max_concurrency / proxy_sessions),
+                context_options={
+                    'viewport': {'width': 1920, 'height': 1080},
+                    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                },
+                request_filter=request_filter,
+                page_max_uses=actor_input.get('pageMaxUses', 50),
+            ).start()
+            Actor.log.info(f"Using {proxy_sessions} proxy sessions")
+
+            def run_stats(session_stats=None):
+                # Sessions are closed before the final save, so their stats are taken first
+                session_stats = session_stats or sessions.stats()
+                return {
+                    'network': request_filter.stats(),
+                    'pagePool': session_stats['pagePool'],
+                    'proxySessions': session_stats,
+                    'concurrency': limiter.stats(),
+                    'rateLimit': rate_limiter.stats(),
+                    **runner.stats(),
+                }
 
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                proxy={'server': proxy_url} if proxy_url else None
-            )
+            # Per-stage timings and counters, saved to RUN_STATS periodically and at the end
+            run_metrics = RunMetrics.from_input(actor_input).start(run_stats)
 
             try:
-                for location in locations:
-                    for keyword in keywords:
-                        Actor.log.info(f"Processing '{keyword}' in {location}")
-
-                        # Detect pages
-                        total_pages = await scraper.detect_total_pages(context, keyword, location)
-
-                        if total_pages == 0:
-                            Actor.log.info(f"No results for '{keyword}' in {location}")
-                            continue
-
-                        pages_to_scrape = list(range(1, min(total_pages, max_pages) + 1))
-
-                        # Scrape pages
-                        listings = await scraper.scrape_multiple_pages_parallel(
-                            context, keyword, location, pages_to_scrape, timezone, max_concurrency
-                        )
-
-                        # Push results to Apify dataset
-                        if listings:
-                            await Actor.push_data(listings)
-                            Actor.log.info(f"Pushed {len(listings)} listings to dataset")
-
-                        # Shorter delay on Apify (has better anti-ban)
-                        await asyncio.sleep(random.uniform(2, 5))
+                total = await runner.run(
+                    lambda job: scraper.scrape_page(sessions, job, timezone), keywords, locations, limiter
+                )
+                logging.info(f"ALL SEARCHES COMPLETE: {total} total listings")
 
             finally:
-                await context.close()
+                session_stats = sessions.stats()
+                await sessions.close()
                 await browser.close()
+                await runner.close()
+
+                network_stats = request_filter.stats()
+                Actor.log.info(
+                    f"Network: {network_stats['allowedRequests']} requests allowed ({network_stats['allowedBytes']} bytes), "
+                    f"{network_stats['blockedRequests']} blocked (~{network_stats['blockedBytesEstimated']} bytes saved)"
+                )
+                pool_stats = session_stats['pagePool']
+                Actor.log.info(
+                    f"Page pool: {pool_stats['leases']} leases, avg wait {pool_stats['leaseWaitAvgMs']}ms, "
+                    f"{pool_stats['pagesRecycled']} pages recycled"
+                )
+                Actor.log.info(
+                    f"Proxy sessions: {session_stats['sessionsCreated']} created, {session_stats['sessionsRetired']} retired"
+                )
+                await run_metrics.close(run_stats(session_stats))
 
         Actor.log.info("Scraping completed!")
 
-# Run the Actor
-asyncio.run(main())
+# Run the Actor (guarded: parse pool workers re-import this module)
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -5,19 +5,69 @@ Yellow Pages Scraper - Apify Actor using Crawlee (better Cloudflare handling)
 """
 
 from apify import Actor
-from crawlee.playwright_crawler import PlaywrightCrawler, PlaywrightCrawlingContext
+from crawlee import ConcurrencySettings, Request
+from crawlee.crawlers import PlaywrightCrawler, PlaywrightCrawlingContext
 import asyncio
-import random
-from urllib.parse import urlencode
-from datetime import datetime
+import time
+from datetime import timedelta
+
+from yellowpages import metrics
+from yellowpages.checkpoint import CrawlCheckpoint
+from yellowpages.dedup import DedupIndex
+from yellowpages.geo import GeoSharder
+from yellowpages.incremental import ChangeTracker
+from yellowpages.jitter import JitterPolicy
+from yellowpages.metrics import RunMetrics
+from yellowpages.pagination import PaginationTracker
+from yellowpages.parsing import parse_total_pages
+from yellowpages.readiness import wait_until_ready
+from yellowpages.response_cache import ResponseCache
+from yellowpages.retry import DeadLetters, RetryPolicy
+from yellowpages.sharding import RunShard, coordinate, open_output_dataset
+from yellowpages.urls import build_search_url
+from yellowpages.writer import DatasetWriter
+
+def page_request(keyword, location, page_num):
+    url = build_search_url(keyword, location, page_num)
+    return Request.from_url(url, user_data={'keyword': keyword, 'location': location, 'page': page_num})
 
 class YellowPagesCrawler:
     def __init__(self):
-        self.all_results = []
+        self.total_listings = 0
         self.keywords = []
         self.locations = []
         self.timezone = 'PST'
         self.max_pages = 50
+        self.jitter = JitterPolicy()
+        self.pagination = PaginationTracker(self.max_pages)
+        self.sharder = GeoSharder(enabled=False)
+        self.shard = RunShard()
+        self.output = Actor
+        self.checkpoint = CrawlCheckpoint()
+        self.dead_letters = DeadLetters()
+        self.changes = None
+        self.cache = None
+        # URLs whose navigation the pre-navigation hook answered from the cache
+        self._served_from_cache = set()
+
+    async def serve_cached(self, context):
+        """Pre-navigation hook: answer the navigation from the response cache, blocking every other request"""
+        if self.cache is None:
+            return
+        url = context.request.url
+        html = await self.cache.get(url)
+        if html is None:
+            self._served_from_cache.discard(url)
+            return
+
+        async def fulfil(route):
+            if route.request.is_navigation_request():
+                await route.fulfill(status=200, body=html, content_type='text/html; charset=utf-8')
+            else:
+                await route.abort()
+
+        await context.page.route('**/*', fulfil)
+        self._served_from_cache.add(url)
 
     async def handle_page(self, context: PlaywrightCrawlingContext):
         """Handle each page request"""
@@ -26,19 +76,62 @@ class YellowPagesCrawler:
 
         Actor.log.info(f"Processing: {url}")
 
-        # Wait for content
-        await asyncio.sleep(random.uniform(2, 4))
+        keyword = context.request.user_data.get('keyword', '')
+        location = context.request.user_data.get('location', '')
+        page_num = context.request.user_data.get('page', 1)
+        search = (keyword, location)
+
+        async def enqueue(pages):
+            if pages:
+                await context.add_requests([page_request(keyword, location, n) for n in pages])
+
+        # After a migration the request queue resumes but the tracker starts empty - rebuild the
+        # search's window from the checkpointed page count (queued URLs are deduplicated)
+        total_pages = self.checkpoint.total_pages(keyword, location)
+        if page_num > 1 and not self.pagination.tracks(search) and total_pages is not None:
+            await enqueue(self.pagination.start(search, total_pages))
+
+        # Skip pages past the search's real end
+        if not self.pagination.should_fetch(search, page_num):
+            return
+
+        # Wait until listings (or a pagination marker) are in the DOM
+        metrics.count('fetches')
+        with metrics.stage('navigate'):
+            state = await wait_until_ready(page)
+        if state == 'challenge':
+            # Still challenged - retire the session so Crawlee's retry gets a fresh proxy and browser context
+            metrics.count('challenges')
+            metrics.record_block('challenge')
+            if context.session:
+                context.session.retire()
+            raise RuntimeError(f"Cloudflare challenge not cleared: {url}")
+        if state == 'timeout':
+            Actor.log.warning(f"Page not ready ({state}): {url}")
+
+        # Optional human-like pause (off unless configured)
+        with metrics.stage('jitter'):
+            await self.jitter.sleep()
 
         # Check page
         title = await page.title()
         html = await page.content()
         Actor.log.info(f"Title: '{title}', HTML length: {len(html)}")
+        metrics.add_bytes(len(html))
 
         if len(html) < 1000:
-            Actor.log.error(f"Page too small - likely blocked")
-            return
+            metrics.record_block('small_response')
+            if context.session:
+                context.session.retire()
+            raise RuntimeError(f"Page too small ({len(html)} bytes) - likely blocked: {url}")
+
+        if url in self._served_from_cache:
+            self._served_from_cache.discard(url)
+        elif self.cache is not None and state != 'timeout':
+            await self.cache.put(url, html)
 
         # Extract listings
+        extract_started = time.monotonic()
         listings = await page.evaluate("""
             () => {
                 const selectors = ['.result', '[data-testid="organic-listing"]', '.search-results .result'];
@@ -126,25 +219,80 @@ class YellowPagesCrawler:
             }
         """)
 
+        metrics.observe('extract', time.monotonic() - extract_started)
+        metrics.count('pages')
+
+        # Page 1 gives the page count; later pages move the window or end the search early
+        if page_num == 1:
+            total_pages = parse_total_pages(html)
+            Actor.log.info(f"Detected {total_pages} pages for '{keyword}' in {location}")
+            self.checkpoint.record_pages(keyword, location, total_pages)
+            await enqueue(self.pagination.start(search, total_pages, listings))
+
+            # Past YP's page cap: fan out one search per city in the state
+            sub_locations = self.sharder.split(keyword, location, total_pages)
+            if sub_locations:
+                Actor.log.info(f"Splitting '{keyword}' in {location} ({total_pages} pages) into {len(sub_locations)} city searches")
+                await context.add_requests([page_request(keyword, sub_location, 1) for sub_location in sub_locations])
+        else:
+            keep, next_pages = self.pagination.complete(search, page_num, listings)
+            if not keep:
+                Actor.log.info(f"Page {page_num} repeats page {page_num - 1} - end of '{keyword}' in {location}")
+                listings = []
+            await enqueue(next_pages)
+
+        # Incremental runs push only new and changed listings, and stop a search once its pages stop changing
+        if self.changes is not None and listings:
+            listings, unchanged = self.changes.classify(keyword, location, listings)
+            if unchanged and self.pagination.stop(search, page_num):
+                Actor.log.info(f"Nothing changed on recent pages of '{keyword}' in {location} - stopping after page {page_num}")
+                self.changes.stopped(keyword, location)
+
+        # Page 1 is loaded by every shard run as the probe; only its owner pushes it
+        if not self.shard.owns(keyword, location, page_num):
+            self.checkpoint.mark_done(keyword, location, page_num)
+            return
+
+        listings = self.sharder.dedupe(keyword, location, listings or [])
         if listings:
             Actor.log.info(f"Extracted {len(listings)} listings")
             # Add metadata
             for listing in listings:
-                listing['keyword'] = context.request.user_data.get('keyword', '')
-                listing['location'] = context.request.user_data.get('location', '')
+                listing['keyword'] = keyword
+                listing['location'] = location
                 listing['timezone'] = self.timezone
                 listing['status'] = 'Lead'
 
-            await Actor.push_data(listings)
-            self.all_results.extend(listings)
+            await self.output.push_data(listings)
+            self.total_listings += len(listings)
         else:
             Actor.log.warning(f"No listings found on {url}")
+        self.checkpoint.mark_done(keyword, location, page_num)
+
+    async def failed_page(self, context, error):
+        """A page out of retries: dead-letter it and free its pagination window slot"""
+        keyword = context.request.user_data.get('keyword', '')
+        location = context.request.user_data.get('location', '')
+        page_num = context.request.user_data.get('page', 1)
+        attempts = context.request.retry_count + 1
+
+        Actor.log.error(f"Page {page_num} '{keyword}' in {location} failed {attempts} times - dead-lettered: {error}")
+        self.checkpoint.mark_failed(keyword, location, page_num)
+        self.dead_letters.add(keyword, location, page_num, attempts, str(error))
+        if page_num > 1:
+            _, next_pages = self.pagination.complete((keyword, location), page_num, None)
+            if next_pages:
+                await context.add_requests([page_request(keyword, location, n) for n in next_pages])
 
 async def main():
     async with Actor:
         # Get input
         actor_input = await Actor.get_input() or {}
 
+        # Coordinator and merge-only runs don't scrape themselves
+        if await coordinate(actor_input):
+            return
+
         keywords = actor_input.get('keywords', ['Real Estate'])
         locations = actor_input.get('locations', ['CA'])
         timezone = actor_input.get('timezone', 'PST')
@@ -162,34 +310,103 @@ async def main():
         crawler_instance.locations = locations
         crawler_instance.timezone = timezone
         crawler_instance.max_pages = max_pages
+        crawler_instance.jitter = JitterPolicy.from_input(actor_input)
+        crawler_instance.sharder = GeoSharder.from_input(actor_input)
+        crawler_instance.shard = shard = RunShard.from_input(actor_input)
+        # Listings already seen under another keyword, location or page are dropped before the dataset
+        dedup = await DedupIndex.load(actor_input)
+        # Incremental runs compare against the previous run's snapshot (None otherwise)
+        crawler_instance.changes = changes = await ChangeTracker.load(actor_input)
+        # Listings stream to the dataset in batches from a background task
+        crawler_instance.output = output = DatasetWriter.from_input(await open_output_dataset(actor_input), actor_input, dedup).start()
+
+        # Crawlee's request queue survives migrations; the checkpoint keeps page counts and
+        # finished pages so the pagination windows can be rebuilt
+        crawler_instance.checkpoint = checkpoint = await CrawlCheckpoint.load(actor_input.get('checkpointIntervalSecs', 5))
+        checkpoint.writer = output
+        checkpoint.changes = changes
+        checkpoint.dedup = dedup
+        crawler_instance.pagination = PaginationTracker(
+            max_pages, window=actor_input.get('maxConcurrency', 20),
+            skip=lambda search, page_num: shard.skips(search, page_num) or checkpoint.is_done(*search, page_num),
+        )
+
+        # Crawlee retries failed pages itself (blocked pages on a new proxy session); pages
+        # that run out of retries are kept for a later replayDeadLetters run
+        retry_policy = RetryPolicy.from_input(actor_input)
+        crawler_instance.dead_letters = dead_letters = await DeadLetters.load()
+        # Pages fetched by earlier runs are served locally while fresh (None unless responseCache is set)
+        crawler_instance.cache = cache = await ResponseCache.open(actor_input)
 
         # Create Crawlee crawler with better anti-detection
         crawler = PlaywrightCrawler(
             headless=True,
             browser_type='chromium',
             request_handler=crawler_instance.handle_page,
-            max_requests_per_crawl=max_pages * len(keywords) * len(locations),
-            max_request_retries=2,
-            request_handler_timeout_secs=120,
+            # City sub-searches add requests beyond the input searches' page budget
+            max_requests_per_crawl=None if crawler_instance.sharder.enabled else max_pages * len(keywords) * len(locations),
+            max_request_retries=retry_policy.max_attempts - 1,
+            request_handler_timeout=timedelta(seconds=120),
+            # Pace requests to the configured per-host rate instead of fixed sleeps
+            concurrency_settings=ConcurrencySettings(
+                max_tasks_per_minute=actor_input.get('maxRequestsPerMinute', 600) or float('inf'),
+            ),
         )
 
+        def run_stats():
+            return {
+                'pagination': crawler_instance.pagination.stats(),
+                'geoSharding': crawler_instance.sharder.stats(),
+                'shard': shard.stats(),
+                'checkpoint': checkpoint.stats(),
+                'writer': output.stats(),
+                'dedup': dedup.stats(),
+                'incremental': changes.stats() if changes is not None else None,
+                'responseCache': cache.stats() if cache is not None else None,
+            }
+
+        # Per-stage timings and counters, saved to RUN_STATS periodically and at the end
+        run_metrics = RunMetrics.from_input(actor_input).start(run_stats)
+
+        crawler.failed_request_handler(crawler_instance.failed_page)
+        crawler.pre_navigation_hook(crawler_instance.serve_cached)
+
         # Build URLs to scrape
         urls = []
-        for location in locations:
-            for keyword in keywords:
-                # Start with page 1 only for now
-                url = f"https://www.yellowpages.com/search?{urlencode({'search_terms': keyword, 'geo_location_terms': location, 'page': 1})}"
-                urls.append({
-                    'url': url,
-                    'user_data': {'keyword': keyword, 'location': location}
-                })
+        if actor_input.get('replayDeadLetters'):
+            # Replay: only the pages earlier runs gave up on
+            for keyword, location, page_num in dead_letters.jobs():
+                urls.append(page_request(keyword, location, page_num))
+        else:
+            for location in locations:
+                for keyword in keywords:
+                    # Page 1 of each search; the handler fans out the rest
+                    urls.append(page_request(keyword, location, 1))
 
         Actor.log.info(f"Crawling {len(urls)} URLs")
 
         # Run crawler
-        await crawler.run(urls)
-
-        Actor.log.info(f"Scraping completed! Total: {len(crawler_instance.all_results)} listings")
-
-# Run the Actor
-asyncio.run(main())
+        try:
+            await crawler.run(urls)
+        finally:
+            if changes is not None:
+                await output.push_data(changes.finish(checkpoint))
+            await output.close()
+            Actor.log.info(f"Dataset writer: {output.stats()}")
+            await dedup.close()
+            if changes is not None:
+                await changes.close()
+                Actor.log.info(f"Incremental: {changes.stats()}")
+            Actor.log.info(f"Dedup: {dedup.stats()}")
+            if cache is not None:
+                await cache.close()
+                Actor.log.info(f"Response cache: {cache.stats()}")
+            await checkpoint.close()
+            await dead_letters.save(checkpoint)
+            await run_metrics.close()
+
+        Actor.log.info(f"Scraping completed! Total: {crawler_instance.total_listings} listings")
+
+# Run the Actor (guarded: parse pool workers re-import this module)
+if __name__ == '__main__':
+    asyncio.run(main())
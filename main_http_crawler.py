@@ -5,108 +5,185 @@ Yellow Pages Scraper - Using HttpCrawler (like successful Apify actors)
 """
 
 from apify import Actor
-from crawlee.http_crawler import HttpCrawler, HttpCrawlingContext
+from crawlee import ConcurrencySettings, HttpHeaders, Request
+from crawlee.crawlers import HttpCrawler, HttpCrawlingContext
+from crawlee.http_clients import HttpCrawlingResult, ImpitHttpClient
 import asyncio
 import random
-from urllib.parse import quote_plus
-from bs4 import BeautifulSoup
-import re
 
-async def router(context: HttpCrawlingContext):
-    """Handle each page request"""
-    url = context.request.url
-    Actor.log.info(f"Processing: {url}")
+from yellowpages import metrics
+from yellowpages.checkpoint import CrawlCheckpoint
+from yellowpages.dedup import DedupIndex
+from yellowpages.geo import GeoSharder
+from yellowpages.incremental import ChangeTracker
+from yellowpages.metrics import RunMetrics
+from yellowpages.pagination import PaginationTracker
+from yellowpages.parse_pool import ParsePool
+from yellowpages.response_cache import ResponseCache
+from yellowpages.retry import DeadLetters, RetryPolicy
+from yellowpages.sharding import RunShard, coordinate, open_output_dataset
+from yellowpages.urls import build_search_url
+from yellowpages.writer import DatasetWriter
 
-    # Get HTML
-    html = context.http_response.read().decode('utf-8')
+def page_request(keyword, location, timezone, page_num):
+    url = build_search_url(keyword, location, page_num)
+    return Request.from_url(url, user_data={
+        'keyword': keyword,
+        'location': location,
+        'timezone': timezone,
+        'page': page_num,
+    })
 
-    if context.http_response.status_code != 200:
-        Actor.log.error(f"HTTP {context.http_response.status_code} for {url}")
-        return
+class CachedResponse:
+    """A results page served from the response cache, shaped like a Crawlee HttpResponse"""
 
-    if len(html) < 1000:
-        Actor.log.error(f"Response too small: {len(html)} bytes")
-        return
+    http_version = 'HTTP/1.1'
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+        self.headers = HttpHeaders({'content-type': 'text/html; charset=utf-8'})
 
-    # Parse with BeautifulSoup
-    soup = BeautifulSoup(html, 'html.parser')
+    async def read(self):
+        return self.body
 
-    # Find all results
-    results = soup.find_all('div', class_='result')
-    if not results:
-        results = soup.find_all('div', {'class': re.compile(r'.*result.*')})
+    async def read_stream(self):
+        yield self.body
 
-    Actor.log.info(f"Found {len(results)} result divs")
+class CachingHttpClient:
+    """Wraps a Crawlee HTTP client: pages in the response cache never reach the network"""
+
+    def __init__(self, client, cache: ResponseCache):
+        self.client = client
+        self.cache = cache
+
+    async def crawl(self, request, *args, **kwargs):
+        html = await self.cache.get(request.url)
+        if html is None:
+            return await self.client.crawl(request, *args, **kwargs)
+        return HttpCrawlingResult(http_response=CachedResponse(html))
+
+    async def __aenter__(self):
+        await self.client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.__aexit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+async def router(context: HttpCrawlingContext, parse_pool: ParsePool, pagination: PaginationTracker, sharder: GeoSharder,
+                 shard: RunShard, output, checkpoint: CrawlCheckpoint, changes: ChangeTracker = None,
+                 cache: ResponseCache = None):
+    """Handle each page request"""
+    url = context.request.url
+    Actor.log.info(f"Processing: {url}")
 
     # Get metadata from request
     keyword = context.request.user_data.get('keyword', '')
     location = context.request.user_data.get('location', '')
     timezone = context.request.user_data.get('timezone', 'PST')
+    page_num = context.request.user_data.get('page', 1)
+    search = (keyword, location)
 
-    listings = []
-    for result in results[:40]:
-        try:
-            # Name
-            name_elem = result.find('a', class_='business-name') or result.find('h2')
-            name = name_elem.get_text(strip=True) if name_elem else ''
-            if not name:
-                continue
-
-            # Phone
-            phone = ''
-            phone_elem = result.find('div', class_='phones')
-            if phone_elem:
-                phone_text = phone_elem.get_text(strip=True)
-                phone = re.sub(r'\D', '', phone_text)
-
-            # Address
-            address = ''
-            addr_elem = result.find('div', class_='street-address')
-            if addr_elem:
-                address = addr_elem.get_text(strip=True)
-
-            # Website
-            website = ''
-            links = result.find_all('a', href=True)
-            for link in links:
-                href = link['href']
-                if 'http' in href and 'yellowpages.com' not in href:
-                    website = href
-                    break
-
-            # Categories
-            category = ''
-            cat_elem = result.find('div', class_='categories')
-            if cat_elem:
-                category = cat_elem.get_text(strip=True)
-
-            listings.append({
-                'name': name,
-                'phone': phone if len(phone) >= 10 else '',
-                'address': address,
-                'website': website,
-                'category': category,
-                'keyword': keyword,
-                'location': location,
-                'timezone': timezone,
-                'status': 'Lead',
-            })
-
-        except Exception as e:
-            Actor.log.warning(f"Error extracting listing: {e}")
-            continue
+    async def enqueue(pages):
+        if pages:
+            await context.add_requests([page_request(keyword, location, timezone, n) for n in pages])
+
+    # After a migration the request queue resumes but the tracker starts empty - rebuild the
+    # search's window from the checkpointed page count (queued URLs are deduplicated)
+    if page_num > 1 and not pagination.tracks(search) and checkpoint.total_pages(keyword, location) is not None:
+        await enqueue(pagination.start(search, checkpoint.total_pages(keyword, location)))
+
+    # Skip pages past the search's real end
+    if not pagination.should_fetch(search, page_num):
+        return
+
+    # Get raw HTML bytes - decoding and parsing happen in the parse pool
+    html = await context.http_response.read()
+    if not isinstance(context.http_response, CachedResponse):
+        metrics.count('fetches')
+        metrics.add_bytes(len(html))
+
+    if context.http_response.status_code != 200 or len(html) < 1000:
+        # Looks blocked - retire the session so Crawlee's retry goes out on a fresh proxy session
+        status = context.http_response.status_code
+        metrics.record_block(f"http_{status}" if status != 200 else 'small_response')
+        if context.session:
+            context.session.retire()
+        raise RuntimeError(f"HTTP {context.http_response.status_code}, {len(html)} bytes for {url}")
+
+    if cache is not None and not isinstance(context.http_response, CachedResponse):
+        await cache.put(url, html)
+
+    with metrics.stage('parse'):
+        listings, total_pages = await parse_pool.parse(html, keyword, location, timezone, with_total_pages=(page_num == 1))
+    metrics.count('pages')
 
+    # Page 1 gives the page count; later pages move the window or end the search early
+    if page_num == 1:
+        Actor.log.info(f"Detected {total_pages} pages for '{keyword}' in {location}")
+        checkpoint.record_pages(keyword, location, total_pages)
+        await enqueue(pagination.start(search, total_pages, listings))
+
+        # Past YP's page cap: fan out one search per city in the state
+        sub_locations = sharder.split(keyword, location, total_pages)
+        if sub_locations:
+            Actor.log.info(f"Splitting '{keyword}' in {location} ({total_pages} pages) into {len(sub_locations)} city searches")
+            await context.add_requests([page_request(keyword, sub_location, timezone, 1) for sub_location in sub_locations])
+    else:
+        keep, next_pages = pagination.complete(search, page_num, listings)
+        if not keep:
+            Actor.log.info(f"Page {page_num} repeats page {page_num - 1} - end of '{keyword}' in {location}")
+            listings = []
+        await enqueue(next_pages)
+
+    # Incremental runs push only new and changed listings, and stop a search once its pages stop changing
+    if changes is not None and listings:
+        listings, unchanged = changes.classify(keyword, location, listings)
+        if unchanged and pagination.stop(search, page_num):
+            Actor.log.info(f"Nothing changed on recent pages of '{keyword}' in {location} - stopping after page {page_num}")
+            changes.stopped(keyword, location)
+
+    # Page 1 is loaded by every shard run as the probe; only its owner pushes it
+    if not shard.owns(keyword, location, page_num):
+        checkpoint.mark_done(keyword, location, page_num)
+        return
+
+    listings = sharder.dedupe(keyword, location, listings)
     if listings:
         Actor.log.info(f"Extracted {len(listings)} listings")
-        await Actor.push_data(listings)
+        await output.push_data(listings)
     else:
         Actor.log.warning(f"No listings found")
+    checkpoint.mark_done(keyword, location, page_num)
+
+async def failed_page(context, error, pagination: PaginationTracker, checkpoint: CrawlCheckpoint, dead_letters: DeadLetters):
+    """A page out of retries: dead-letter it and free its pagination window slot"""
+    keyword = context.request.user_data.get('keyword', '')
+    location = context.request.user_data.get('location', '')
+    timezone = context.request.user_data.get('timezone', 'PST')
+    page_num = context.request.user_data.get('page', 1)
+    attempts = context.request.retry_count + 1
+
+    Actor.log.error(f"Page {page_num} '{keyword}' in {location} failed {attempts} times - dead-lettered: {error}")
+    checkpoint.mark_failed(keyword, location, page_num)
+    dead_letters.add(keyword, location, page_num, attempts, str(error))
+    if page_num > 1:
+        _, next_pages = pagination.complete((keyword, location), page_num, None)
+        if next_pages:
+            await context.add_requests([page_request(keyword, location, timezone, n) for n in next_pages])
 
 async def main():
     async with Actor:
         # Get input
         actor_input = await Actor.get_input() or {}
 
+        # Coordinator and merge-only runs don't scrape themselves
+        if await coordinate(actor_input):
+            return
+
         keywords = actor_input.get('keywords', ['Real Estate'])
         locations = actor_input.get('locations', ['CA'])
         timezone = actor_input.get('timezone', 'PST')
@@ -119,33 +196,109 @@ async def main():
 
         Actor.log.info(f"Starting HttpCrawler: {len(keywords)} keywords, {len(locations)} locations")
 
+        # Parsing runs in worker processes so it doesn't stall the crawler's event loop
+        parse_pool = ParsePool.from_input(actor_input)
+        sharder = GeoSharder.from_input(actor_input)
+        shard = RunShard.from_input(actor_input)
+        # Listings already seen under another keyword, location or page are dropped before the dataset
+        dedup = await DedupIndex.load(actor_input)
+        # Incremental runs compare against the previous run's snapshot (None otherwise)
+        changes = await ChangeTracker.load(actor_input)
+        # Listings stream to the dataset in batches from a background task
+        output = DatasetWriter.from_input(await open_output_dataset(actor_input), actor_input, dedup).start()
+
+        # Crawlee's request queue survives migrations; the checkpoint keeps page counts and
+        # finished pages so the pagination windows can be rebuilt
+        checkpoint = await CrawlCheckpoint.load(actor_input.get('checkpointIntervalSecs', 5))
+        checkpoint.writer = output
+        checkpoint.changes = changes
+        checkpoint.dedup = dedup
+        pagination = PaginationTracker(
+            max_pages, window=actor_input.get('maxConcurrency', 20),
+            skip=lambda search, page_num: shard.skips(search, page_num) or checkpoint.is_done(*search, page_num),
+        )
+
+        # Crawlee retries failed pages itself (blocked pages on a new proxy session); pages
+        # that run out of retries are kept for a later replayDeadLetters run
+        retry_policy = RetryPolicy.from_input(actor_input)
+        dead_letters = await DeadLetters.load()
+
+        # Pages fetched by earlier runs are served locally while fresh (None unless responseCache is set)
+        cache = await ResponseCache.open(actor_input)
+
+        # Pages in the response cache are answered without reaching the network
+        http_client = ImpitHttpClient()
+        if cache is not None:
+            http_client = CachingHttpClient(http_client, cache)
+
         # Create crawler with auto-proxy configuration
         crawler = HttpCrawler(
-            request_handler=router,
-            max_requests_per_crawl=max_pages * len(keywords) * len(locations),
-            max_request_retries=3,
+            http_client=http_client,
+            request_handler=lambda context: router(context, parse_pool, pagination, sharder, shard, output, checkpoint, changes, cache),
+            # City sub-searches add requests beyond the input searches' page budget
+            max_requests_per_crawl=None if sharder.enabled else max_pages * len(keywords) * len(locations),
+            max_request_retries=retry_policy.max_attempts - 1,
+            # Pace requests to the configured per-host rate instead of fixed sleeps
+            concurrency_settings=ConcurrencySettings(
+                max_tasks_per_minute=actor_input.get('maxRequestsPerMinute', 600) or float('inf'),
+            ),
         )
 
-        # Build requests
+        def run_stats():
+            return {
+                'pagination': pagination.stats(),
+                'geoSharding': sharder.stats(),
+                'shard': shard.stats(),
+                'checkpoint': checkpoint.stats(),
+                'writer': output.stats(),
+                'dedup': dedup.stats(),
+                'incremental': changes.stats() if changes is not None else None,
+                'responseCache': cache.stats() if cache is not None else None,
+            }
+
+        # Per-stage timings and counters, saved to RUN_STATS periodically and at the end
+        run_metrics = RunMetrics.from_input(actor_input).start(run_stats)
+
+        crawler.failed_request_handler(
+            lambda context, error: failed_page(context, error, pagination, checkpoint, dead_letters)
+        )
+
+        # Build requests - page 1 of each search; the router fans out the rest
         requests = []
-        for location in locations:
-            for keyword in keywords:
-                url = f"https://www.yellowpages.com/search?search_terms={quote_plus(keyword)}&geo_location_terms={quote_plus(location)}&page=1"
-                requests.append({
-                    'url': url,
-                    'user_data': {
-                        'keyword': keyword,
-                        'location': location,
-                        'timezone': timezone
-                    }
-                })
+        if actor_input.get('replayDeadLetters'):
+            # Replay: only the pages earlier runs gave up on
+            for keyword, location, page_num in dead_letters.jobs():
+                requests.append(page_request(keyword, location, timezone, page_num))
+        else:
+            for location in locations:
+                for keyword in keywords:
+                    requests.append(page_request(keyword, location, timezone, 1))
 
         Actor.log.info(f"Crawling {len(requests)} URLs")
 
         # Run crawler
-        await crawler.run(requests)
+        try:
+            await crawler.run(requests)
+        finally:
+            parse_pool.close()
+            if changes is not None:
+                await output.push_data(changes.finish(checkpoint))
+            await output.close()
+            Actor.log.info(f"Dataset writer: {output.stats()}")
+            await dedup.close()
+            if changes is not None:
+                await changes.close()
+                Actor.log.info(f"Incremental: {changes.stats()}")
+            Actor.log.info(f"Dedup: {dedup.stats()}")
+            if cache is not None:
+                await cache.close()
+                Actor.log.info(f"Response cache: {cache.stats()}")
+            await checkpoint.close()
+            await dead_letters.save(checkpoint)
+            await run_metrics.close()
 
         Actor.log.info("Scraping completed!")
 
-# Run the Actor
-asyncio.run(main())
+# Run the Actor (guarded: parse pool workers re-import this module)
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Yellow Pages Scraper - Hybrid HTTP-first engine with browser fallback
+Pages are fetched over plain HTTP; Chromium is only used when a page is blocked or challenged
+"""
+
+from apify import Actor
+import asyncio
+import logging
+
+from yellowpages import metrics
+from yellowpages.concurrency import AdaptiveConcurrency
+from yellowpages.hybrid import HybridIdentity, LazyBrowser
+from yellowpages.metrics import RunMetrics
+from yellowpages.parse_pool import ParsePool
+from yellowpages.rate_limit import RateLimiter
+from yellowpages.request_filter import RequestFilter
+from yellowpages.runner import SearchRunner
+from yellowpages.sharding import coordinate
+from yellowpages.urls import build_search_url
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class HybridScraper:
+    def __init__(self, identities, parse_pool, timezone='PST', cache=None):
+        self.identities = identities
+        self.parse_pool = parse_pool
+        self.timezone = timezone
+        self.cache = cache
+        self._next_identity = 0
+
+    def pick_identity(self, avoid=None):
+        """Next identity round-robin, skipping the one a retried page last failed on"""
+        identity = self.identities[self._next_identity % len(self.identities)]
+        self._next_identity += 1
+        if identity.name == avoid and len(self.identities) > 1:
+            return self.pick_identity()
+        return identity
+
+    async def fetch_page(self, identity, keyword, place, page_num):
+        """Fetch one results page as raw bytes, from the response cache if it has it (None if blocked everywhere)"""
+        url = build_search_url(keyword, place, page_num)
+        if self.cache is not None:
+            html = await self.cache.get(url)
+            if html is not None:
+                return html
+
+        html = await identity.fetch(url)
+        if html is None:
+            Actor.log.error(f"Page {page_num}: blocked over HTTP and browser for '{keyword}' in {place}")
+        elif self.cache is not None:
+            await self.cache.put(url, html)
+        return html
+
+    async def scrape_page(self, job):
+        """Fetch and parse one page for the runner, on another identity than a retried page failed on"""
+        identity = self.pick_identity(avoid=job.failed_on)
+        job.identity = identity.name
+        html = await self.fetch_page(identity, job.keyword, job.location, job.page_num)
+        if html is None:
+            job.error = 'blocked over HTTP and browser'
+            return None, None
+
+        # Parse in the process pool; the first page also tells us how many pages to fan out
+        with metrics.stage('parse'):
+            listings, total_pages = await self.parse_pool.parse(
+                html, job.keyword, job.location, self.timezone, with_total_pages=(job.page_num == 1)
+            )
+        metrics.count('pages')
+        Actor.log.info(f"Page {job.page_num}: Extracted {len(listings)} listings for '{job.keyword}' in {job.location}")
+        return listings, total_pages
+
+async def main():
+    async with Actor:
+        # Get input
+        actor_input = await Actor.get_input() or {}
+
+        # Coordinator and merge-only runs don't scrape themselves
+        if await coordinate(actor_input):
+            return
+
+        keywords = actor_input.get('keywords', ['Real Estate'])
+        locations = actor_input.get('locations', ['CA'])
+        timezone = actor_input.get('timezone', 'PST')
+        max_pages = actor_input.get('maxPages', 50)
+        max_concurrency = actor_input.get('maxConcurrency', 20)
+
+        if isinstance(keywords, str):
+            keywords = [k.strip() for k in keywords.split(',')]
+        if isinstance(locations, str):
+            locations = [l.strip() for l in locations.split(',')]
+
+        Actor.log.info(f"Starting hybrid scraper: {len(keywords)} keywords, {len(locations)} locations")
+
+        # Residential proxies; each identity keeps its own sticky session so the browser's
+        # clearance cookies stay valid for the HTTP client on the same IP
+        proxy_config = await Actor.create_proxy_configuration(groups=['RESIDENTIAL']) if actor_input.get('residentialProxy', True) else None
+        proxy_sessions = max(1, min(actor_input.get('proxySessions', 5), max_concurrency))
+
+        browser = LazyBrowser()
+        request_filter = RequestFilter.from_input(actor_input)
+        rate_limiter = RateLimiter.from_input(actor_input)
+
+        identities = []
+        for i in range(proxy_sessions):
+            session_id = f"yp_hybrid_{i}"
+            proxy_url = await proxy_config.new_url(session_id=session_id) if proxy_config else None
+            identities.append(await HybridIdentity(session_id, proxy_url, browser, rate_limiter, request_filter).start())
+
+        # maxConcurrency is the ceiling; the limiter finds the operating point
+        limiter = AdaptiveConcurrency(max_concurrency)
+        parse_pool = ParsePool.from_input(actor_input)
+        # Planner, pagination, checkpoint, retries and the dataset writer
+        runner = await SearchRunner.load(actor_input, max_pages, max_concurrency)
+        scraper = HybridScraper(identities, parse_pool, timezone, runner.cache)
+
+        def run_stats():
+            return {
+                'hybrid': [identity.stats() for identity in identities],
+                'network': request_filter.stats(),
+                'concurrency': limiter.stats(),
+                'rateLimit': rate_limiter.stats(),
+                **runner.stats(),
+            }
+
+        # Per-stage timings and counters, saved to RUN_STATS periodically and at the end
+        run_metrics = RunMetrics.from_input(actor_input).start(run_stats)
+
+        try:
+            total = await runner.run(scraper.scrape_page, keywords, locations, limiter)
+            Actor.log.info(f"Scraped {total} listings")
+        finally:
+            identity_stats = [identity.stats() for identity in identities]
+            for identity in identities:
+                await identity.close()
+            await browser.close()
+            parse_pool.close()
+            await runner.close()
+
+            http_pages = sum(s['httpPages'] for s in identity_stats)
+            browser_pages = sum(s['browserPages'] for s in identity_stats)
+            Actor.log.info(f"Pages over HTTP: {http_pages}, via browser fallback: {browser_pages}")
+            await run_metrics.close()
+
+        Actor.log.info("Scraping completed!")
+
+# Run the Actor (guarded: parse pool workers re-import this module)
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -2,127 +2,117 @@
 # -*- coding: utf-8 -*-
 """
 Yellow Pages Scraper - Simple requests library (most reliable)
+Pages are fetched concurrently by a thread pool with keep-alive sessions per proxy
 """
 
 from apify import Actor
 import asyncio
+import contextvars
 import requests
-import random
-from urllib.parse import quote_plus
-from bs4 import BeautifulSoup
-import re
-import time
-
-def scrape_page(keyword, location, page_num, timezone, proxy_url=None):
-    """Scrape a single page using requests"""
-    url = f"https://www.yellowpages.com/search?search_terms={quote_plus(keyword)}&geo_location_terms={quote_plus(location)}&page={page_num}"
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Connection': 'keep-alive',
-    }
-
-    proxies = None
-    if proxy_url:
-        proxies = {
-            'http': proxy_url,
-            'https': proxy_url
-        }
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from yellowpages import metrics
+from yellowpages.concurrency import AdaptiveConcurrency, report_overload
+from yellowpages.metrics import RunMetrics
+from yellowpages.parsing import parse_listings, parse_total_pages
+from yellowpages.rate_limit import RateLimiter
+from yellowpages.runner import SearchRunner
+from yellowpages.sharding import coordinate
+from yellowpages.urls import build_search_url
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+}
+
+# One requests.Session per (worker thread, proxy): Sessions aren't thread-safe, but each
+# one keeps its connections to yellowpages.com alive across pages
+_thread_sessions = threading.local()
+
+def get_session(proxy_url):
+    sessions = getattr(_thread_sessions, 'by_proxy', None)
+    if sessions is None:
+        sessions = _thread_sessions.by_proxy = {}
+
+    session = sessions.get(proxy_url)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        if proxy_url:
+            session.proxies = {'http': proxy_url, 'https': proxy_url}
+        sessions[proxy_url] = session
+    return session
+
+def scrape_page(keyword, location, page_num, timezone, proxy_url=None, rate_limiter=None, html=None, on_fetched=None):
+    """Scrape a single page using requests.
+
+    html is a cached copy of the page to parse instead of fetching it; on_fetched(url, html)
+    is called with every page that was fetched.
+    Returns (listings, total_pages); total_pages only for page 1, listings None if the fetch failed.
+    """
+    url = build_search_url(keyword, location, page_num)
 
     try:
-        response = requests.get(url, headers=headers, proxies=proxies, timeout=30)
-
-        if response.status_code != 200:
-            print(f"Page {page_num}: HTTP {response.status_code}")
-            return []
-
-        html = response.text
-
-        if len(html) < 1000:
-            print(f"Page {page_num}: Response too small ({len(html)} bytes)")
-            return []
-
-        # Parse with BeautifulSoup
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # Find all results
-        results = soup.find_all('div', class_='result')
-        if not results:
-            results = soup.find_all('div', {'class': re.compile(r'.*result.*')})
-
-        print(f"Page {page_num}: Found {len(results)} result divs")
-
-        listings = []
-        for result in results[:40]:
-            try:
-                # Name
-                name_elem = result.find('a', class_='business-name') or result.find('h2')
-                name = name_elem.get_text(strip=True) if name_elem else ''
-                if not name:
-                    continue
-
-                # Phone
-                phone = ''
-                phone_elem = result.find('div', class_='phones')
-                if phone_elem:
-                    phone_text = phone_elem.get_text(strip=True)
-                    phone = re.sub(r'\D', '', phone_text)
-
-                # Address
-                address = ''
-                addr_elem = result.find('div', class_='street-address')
-                if addr_elem:
-                    address = addr_elem.get_text(strip=True)
-
-                # Website
-                website = ''
-                links = result.find_all('a', href=True)
-                for link in links:
-                    href = link['href']
-                    if 'http' in href and 'yellowpages.com' not in href:
-                        website = href
-                        break
-
-                # Categories
-                category = ''
-                cat_elem = result.find('div', class_='categories')
-                if cat_elem:
-                    category = cat_elem.get_text(strip=True)
-
-                listings.append({
-                    'name': name,
-                    'phone': phone if len(phone) >= 10 else '',
-                    'address': address,
-                    'website': website,
-                    'category': category,
-                    'keyword': keyword,
-                    'location': location,
-                    'timezone': timezone,
-                    'status': 'Lead',
-                })
-
-            except Exception as e:
-                print(f"Error extracting listing: {e}")
-                continue
+        if html is None:
+            if rate_limiter:
+                with metrics.stage('rateLimit'):
+                    # Sticky session URLs get the per-proxy limit; a direct connection (None) only the host limit
+                    rate_limiter.wait_blocking(url, proxy_url)
+
+            metrics.count('fetches')
+            with metrics.stage('fetch'):
+                response = get_session(proxy_url).get(url, timeout=30)
+            metrics.add_bytes(len(response.content))
+
+            if response.status_code != 200:
+                print(f"Page {page_num}: HTTP {response.status_code}")
+                if response.status_code in (403, 429, 503):
+                    report_overload(f"http_{response.status_code}")
+                return None, None
+
+            html = response.text
+
+            if len(html) < 1000:
+                print(f"Page {page_num}: Response too small ({len(html)} bytes)")
+                metrics.record_block('small_response')
+                return None, None
+
+            if on_fetched:
+                on_fetched(url, html)
+
+        with metrics.stage('parse'):
+            listings = parse_listings(html, keyword, location, timezone)
+            total_pages = parse_total_pages(html) if page_num == 1 else None
+        metrics.count('pages')
 
         print(f"Page {page_num}: Extracted {len(listings)} listings")
-        return listings
+        return listings, total_pages
 
+    except requests.Timeout:
+        print(f"Page {page_num}: Timeout")
+        report_overload('timeout')
+        return None, None
     except Exception as e:
         print(f"Page {page_num}: Error - {e}")
-        return []
+        return None, None
 
 async def main():
     async with Actor:
         # Get input
         actor_input = await Actor.get_input() or {}
 
+        # Coordinator and merge-only runs don't scrape themselves
+        if await coordinate(actor_input):
+            return
+
         keywords = actor_input.get('keywords', ['Real Estate'])
         locations = actor_input.get('locations', ['CA'])
         timezone = actor_input.get('timezone', 'PST')
         max_pages = actor_input.get('maxPages', 10)
+        max_concurrency = actor_input.get('maxConcurrency', 20)
 
         if isinstance(keywords, str):
             keywords = [k.strip() for k in keywords.split(',')]
@@ -138,39 +128,86 @@ async def main():
         proxy_urls = proxy_configuration.get('proxyUrls', [])
 
         if proxy_urls:
-            # User provided their own proxies (e.g., Webshare)
+            # User provided their own proxies (e.g., Webshare) - pages are spread across all of them
             Actor.log.info(f"Using {len(proxy_urls)} custom proxies")
-            # Use random proxy from the list
-            proxy_url = random.choice(proxy_urls)
-            Actor.log.info(f"Selected proxy: {proxy_url.split('@')[0]}@...")
         elif proxy_configuration.get('useApifyProxy'):
-            # User enabled Apify proxy in input
+            # User enabled Apify proxy in input - one sticky session per proxySessions
             proxy_config = await Actor.create_proxy_configuration()
             if proxy_config:
-                proxy_url = await proxy_config.new_url()
-                Actor.log.info(f"Using Apify proxy: {proxy_url}")
+                proxy_sessions = max(1, min(actor_input.get('proxySessions', 5), max_concurrency))
+                proxy_urls = [await proxy_config.new_url(session_id=f"yp_req_{i}") for i in range(proxy_sessions)]
+                Actor.log.info(f"Using Apify proxy with {len(proxy_urls)} sessions")
             else:
-                proxy_url = None
                 Actor.log.warning("Proxy requested but not available")
         else:
             # No proxy configured
-            proxy_url = None
             Actor.log.info("Running without proxy (may get blocked)")
 
-        for location in locations:
-            for keyword in keywords:
-                Actor.log.info(f"Scraping '{keyword}' in {location}")
-
-                # Scrape page 1
-                listings = scrape_page(keyword, location, 1, timezone, proxy_url)
-
-                if listings:
-                    await Actor.push_data(listings)
-                    Actor.log.info(f"Pushed {len(listings)} listings")
-
-                time.sleep(random.uniform(2, 5))
-
-        Actor.log.info("Scraping completed!")
-
-# Run the Actor
-asyncio.run(main())
+        if not proxy_urls:
+            proxy_urls = [None]
+
+        rate_limiter = RateLimiter.from_input(actor_input)
+        limiter = AdaptiveConcurrency(max_concurrency)
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='yp-requests')
+        loop = asyncio.get_running_loop()
+        # Planner, pagination, checkpoint, retries and the dataset writer
+        runner = await SearchRunner.load(actor_input, max_pages, max_concurrency)
+        cache = runner.cache
+
+        cache_writes = set()
+
+        def cache_page(url, html):
+            # Called from the worker threads: hand the page to the cache on the event loop
+            future = asyncio.run_coroutine_threadsafe(cache.put(url, html), loop)
+            cache_writes.add(future)
+            future.add_done_callback(cache_writes.discard)
+
+        def run_stats():
+            return {
+                'proxies': len(proxy_urls),
+                'concurrency': limiter.stats(),
+                'rateLimit': rate_limiter.stats(),
+                **runner.stats(),
+            }
+
+        # Per-stage timings and counters, saved to RUN_STATS periodically and at the end
+        run_metrics = RunMetrics.from_input(actor_input).start(run_stats)
+
+        jobs_started = 0
+
+        async def fetch(job):
+            nonlocal jobs_started
+            proxy_url = proxy_urls[jobs_started % len(proxy_urls)]
+            jobs_started += 1
+            # A retried page never goes back out on the proxy it failed on
+            if proxy_url == job.failed_on and len(proxy_urls) > 1:
+                proxy_url = proxy_urls[jobs_started % len(proxy_urls)]
+                jobs_started += 1
+            job.identity = proxy_url
+
+            # Decoded like a live response, so lxml never has to guess the charset
+            cached = await cache.get_text(job.url) if cache else None
+
+            # Copy the context so report_overload() in the thread reaches this slot
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                executor, context.run, scrape_page,
+                job.keyword, job.location, job.page_num, timezone, proxy_url, rate_limiter,
+                cached, cache_page if cache else None,
+            )
+
+        try:
+            total_listings = await runner.run(fetch, keywords, locations, limiter)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if cache is not None:
+                # Pages the worker threads fetched last are still on their way into the cache
+                await asyncio.gather(*(asyncio.wrap_future(f) for f in list(cache_writes)), return_exceptions=True)
+            await runner.close()
+            await run_metrics.close()
+
+        Actor.log.info(f"Scraping completed! Total: {total_listings} listings")
+
+# Run the Actor (guarded: parse pool workers re-import this module)
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -8,13 +8,22 @@ from apify import Actor
 import asyncio
 import aiohttp
 import random
-from urllib.parse import urlencode, quote_plus
-from bs4 import BeautifulSoup
-import re
 
-async def scrape_page(session, keyword, location, page_num, timezone, proxy_url=None):
-    """Scrape a single page using simple HTTP"""
-    url = f"https://www.yellowpages.com/search?search_terms={quote_plus(keyword)}&geo_location_terms={quote_plus(location)}&page={page_num}"
+from yellowpages import metrics
+from yellowpages.concurrency import AdaptiveConcurrency, report_overload
+from yellowpages.metrics import RunMetrics
+from yellowpages.parse_pool import ParsePool
+from yellowpages.rate_limit import RateLimiter
+from yellowpages.runner import SearchRunner
+from yellowpages.sharding import coordinate
+from yellowpages.urls import build_search_url
+
+async def scrape_page(session, parse_pool, keyword, location, page_num, timezone, proxy_url=None, rate_limiter=None, cache=None):
+    """Scrape a single page using simple HTTP.
+
+    Returns (listings, total_pages); total_pages only for page 1, listings None if the fetch failed.
+    """
+    url = build_search_url(keyword, location, page_num)
 
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -26,103 +35,68 @@ async def scrape_page(session, keyword, location, page_num, timezone, proxy_url=
     }
 
     try:
-        request_kwargs = {'headers': headers, 'timeout': 30}
-        if proxy_url:
-            request_kwargs['proxy'] = proxy_url
-
-        async with session.get(url, **request_kwargs) as response:
-            if response.status != 200:
-                Actor.log.error(f"Page {page_num}: HTTP {response.status}")
-                return []
-
-            html = await response.text()
+        # A cached copy saves the proxy round trip entirely
+        html = await cache.get(url) if cache else None
+        if html is None:
+            request_kwargs = {'headers': headers, 'timeout': 30}
+            if proxy_url:
+                request_kwargs['proxy'] = proxy_url
+
+            if rate_limiter:
+                # Host limit only: the proxy URL rotates the IP per request (retries get a one-off session)
+                with metrics.stage('rateLimit'):
+                    await rate_limiter.wait(url)
+
+            metrics.count('fetches')
+            with metrics.stage('fetch'):
+                async with session.get(url, **request_kwargs) as response:
+                    if response.status != 200:
+                        Actor.log.error(f"Page {page_num}: HTTP {response.status}")
+                        if response.status in (403, 429, 503):
+                            report_overload(f"http_{response.status}")
+                        return None, None
+
+                    html = await response.read()
+            metrics.add_bytes(len(html))
 
             if len(html) < 1000:
                 Actor.log.error(f"Page {page_num}: Response too small ({len(html)} bytes)")
-                return []
-
-            # Parse with BeautifulSoup
-            soup = BeautifulSoup(html, 'html.parser')
-
-            # Find all results
-            results = soup.find_all('div', class_='result')
-            if not results:
-                results = soup.find_all('div', {'class': re.compile(r'.*result.*')})
-
-            Actor.log.info(f"Page {page_num}: Found {len(results)} result divs")
-
-            listings = []
-            for result in results[:40]:
-                try:
-                    # Name
-                    name_elem = result.find('a', class_='business-name') or result.find('h2')
-                    name = name_elem.get_text(strip=True) if name_elem else ''
-                    if not name:
-                        continue
-
-                    # Phone
-                    phone = ''
-                    phone_elem = result.find('div', class_='phones')
-                    if phone_elem:
-                        phone_text = phone_elem.get_text(strip=True)
-                        phone = re.sub(r'\D', '', phone_text)
-
-                    # Address
-                    address = ''
-                    addr_elem = result.find('div', class_='street-address')
-                    if addr_elem:
-                        address = addr_elem.get_text(strip=True)
-
-                    # Website
-                    website = ''
-                    links = result.find_all('a', href=True)
-                    for link in links:
-                        href = link['href']
-                        if 'http' in href and 'yellowpages.com' not in href:
-                            website = href
-                            break
-
-                    # Categories
-                    category = ''
-                    cat_elem = result.find('div', class_='categories')
-                    if cat_elem:
-                        category = cat_elem.get_text(strip=True)
-
-                    listings.append({
-                        'name': name,
-                        'phone': phone if len(phone) >= 10 else '',
-                        'address': address,
-                        'website': website,
-                        'category': category,
-                        'keyword': keyword,
-                        'location': location,
-                        'timezone': timezone,
-                        'status': 'Lead',
-                    })
-
-                except Exception as e:
-                    Actor.log.warning(f"Error extracting listing: {e}")
-                    continue
-
-            Actor.log.info(f"Page {page_num}: Extracted {len(listings)} listings")
-            return listings
+                metrics.record_block('small_response')
+                return None, None
+
+            if cache:
+                await cache.put(url, html)
+
+        # Parse off the event loop - only the raw bytes go to the worker
+        with metrics.stage('parse'):
+            listings, total_pages = await parse_pool.parse(html, keyword, location, timezone, with_total_pages=(page_num == 1))
+        metrics.count('pages')
+
+        Actor.log.info(f"Page {page_num}: Extracted {len(listings)} listings")
+        return listings, total_pages
 
     except asyncio.TimeoutError:
         Actor.log.error(f"Page {page_num}: Timeout")
-        return []
+        report_overload('timeout')
+        return None, None
     except Exception as e:
         Actor.log.error(f"Page {page_num}: Error - {e}")
-        return []
+        return None, None
 
 async def main():
     async with Actor:
         # Get input
         actor_input = await Actor.get_input() or {}
 
+        # Coordinator and merge-only runs don't scrape themselves
+        if await coordinate(actor_input):
+            return
+
         keywords = actor_input.get('keywords', ['Real Estate'])
         locations = actor_input.get('locations', ['CA'])
         timezone = actor_input.get('timezone', 'PST')
         max_pages = actor_input.get('maxPages', 10)
+        max_concurrency = actor_input.get('maxConcurrency', 20)
 
         if isinstance(keywords, str):
             keywords = [k.strip() for k in keywords.split(',')]
@@ -131,11 +105,27 @@ async def main():
 
         Actor.log.info(f"Starting simple HTTP scraper: {len(keywords)} keywords, {len(locations)} locations")
 
-        # Get Apify proxy URL (residential)
-        proxy_config = await Actor.create_proxy_configuration(groups=['RESIDENTIAL'])
+        # Get Apify proxy URL (residential, unless residentialProxy is off)
+        proxy_config = await Actor.create_proxy_configuration(groups=['RESIDENTIAL']) if actor_input.get('residentialProxy', True) else None
         proxy_url = await proxy_config.new_url() if proxy_config else None
         Actor.log.info(f"Using proxy: {proxy_url}")
 
+        rate_limiter = RateLimiter.from_input(actor_input)
+        parse_pool = ParsePool.from_input(actor_input)
+        limiter = AdaptiveConcurrency(max_concurrency)
+        # Planner, pagination, checkpoint, retries and the dataset writer
+        runner = await SearchRunner.load(actor_input, max_pages, max_concurrency)
+
+        def run_stats():
+            return {
+                'concurrency': limiter.stats(),
+                'rateLimit': rate_limiter.stats(),
+                **runner.stats(),
+            }
+
+        # Per-stage timings and counters, saved to RUN_STATS periodically and at the end
+        run_metrics = RunMetrics.from_input(actor_input).start(run_stats)
+
         # Create HTTP session with proxy
         connector = None
         if proxy_url:
@@ -148,24 +138,25 @@ async def main():
             # aiohttp wants proxy as a simple string
             session_kwargs['trust_env'] = True
 
-        async with aiohttp.ClientSession(**session_kwargs) as session:
-            for location in locations:
-                for keyword in keywords:
-                    Actor.log.info(f"Scraping '{keyword}' in {location}")
-
-                    # Scrape first page to detect total pages
-                    first_page_listings = await scrape_page(session, keyword, location, 1, timezone, proxy_url)
-
-                    if first_page_listings:
-                        await Actor.push_data(first_page_listings)
-                        Actor.log.info(f"Pushed {len(first_page_listings)} listings from page 1")
-
-                    # For now just do page 1 to test
-                    # TODO: Add page detection and scrape multiple pages
-
-                    await asyncio.sleep(random.uniform(2, 5))
+        async def fetch(session, job):
+            # A retried page goes out on a fresh sticky proxy session (new IP)
+            job.identity = proxy_url
+            if proxy_config and job.failed_on is not None:
+                job.identity = await proxy_config.new_url(session_id=f"yp_retry_{random.randrange(10**9)}")
+            return await scrape_page(
+                session, parse_pool, job.keyword, job.location, job.page_num, timezone, job.identity, rate_limiter, runner.cache
+            )
+
+        try:
+            async with aiohttp.ClientSession(**session_kwargs) as session:
+                await runner.run(lambda job: fetch(session, job), keywords, locations, limiter)
+        finally:
+            parse_pool.close()
+            await runner.close()
+            await run_metrics.close()
 
         Actor.log.info("Scraping completed!")
 
-# Run the Actor
-asyncio.run(main())
+# Run the Actor (guarded: parse pool workers re-import this module)
+if __name__ == '__main__':
+    asyncio.run(main())
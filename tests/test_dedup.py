@@ -0,0 +1,30 @@
+from yellowpages.dedup import DedupIndex
+
+LISTING = {
+    'name': 'Joe Plumbing', 'phone': '(555) 123-4567', 'address': '1 Main St',
+    'website': 'https://a.example', 'category': 'Plumbers',
+}
+
+
+def test_repeats_of_a_business_are_dropped():
+    index = DedupIndex('hash')
+    assert index.filter([LISTING, {**LISTING, 'phone': '555.123.4567', 'name': 'JOE PLUMBING'}]) == [LISTING]
+
+
+def test_change_records_get_past_the_business_already_seen():
+    index = DedupIndex('hash')
+    index.filter([LISTING])
+
+    changed = {**LISTING, 'website': 'https://b.example', 'change': 'changed'}
+    assert index.filter([changed]) == [changed]
+    # The same update reached through another search is still only pushed once
+    assert index.filter([{**changed, 'keyword': 'Drains'}]) == []
+
+    gone = {'name': LISTING['name'], 'phone': LISTING['phone'], 'address': LISTING['address'], 'change': 'disappeared'}
+    assert index.filter([gone]) == [gone]
+
+
+def test_new_records_are_deduplicated_like_plain_listings():
+    index = DedupIndex('hash')
+    index.filter([LISTING])
+    assert index.filter([{**LISTING, 'change': 'new'}]) == []
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.bench_extraction import legacy_parse_listings
+from yellowpages.parsing import parse_listings, parse_total_pages
+
+PAGES_DIR = Path(__file__).resolve().parent.parent / 'benchmarks' / 'pages'
+SAVED_PAGES = sorted(PAGES_DIR.glob('*.html'))
+
+
+def test_saved_pages_are_checked_in():
+    assert SAVED_PAGES
+
+
+@pytest.mark.parametrize('path', SAVED_PAGES, ids=lambda path: path.name)
+def test_lxml_parser_matches_legacy_parser_on_saved_page(path):
+    html = path.read_text(encoding='utf-8')
+    expected = legacy_parse_listings(html, 'Plumbers', 'Los Angeles, CA', 'PST')
+
+    assert expected
+    assert parse_listings(html, 'Plumbers', 'Los Angeles, CA', 'PST') == expected
+    # The HTTP engines hand the parse pool raw bytes
+    assert parse_listings(path.read_bytes(), 'Plumbers', 'Los Angeles, CA', 'PST') == expected
+
+
+@pytest.mark.parametrize('path', SAVED_PAGES, ids=lambda path: path.name)
+def test_saved_page_has_a_page_count(path):
+    assert parse_total_pages(path.read_bytes()) > 0
+
+
+def test_saved_listing_fields():
+    listings = parse_listings(
+        (PAGES_DIR / 'plumbers-los-angeles-ca.html').read_bytes(), 'Plumbers', 'Los Angeles, CA', 'PST',
+    )
+    by_name = {listing['name']: listing for listing in listings}
+
+    assert len(listings) == 6
+    assert by_name['Mr. Rooter Plumbing of Los Angeles']['phone'] == '2134234977'
+    assert by_name['Mr. Rooter Plumbing of Los Angeles']['website'] == 'http://www.mrrooter.com/los-angeles/'
+    assert by_name['B & B Plumbing']['address'] == ''
+    assert by_name['Ace Drain & Rooter']['phone'] == ''
+    assert any(listing['address'] == '4827 E César E Chávez Ave' for listing in listings)
@@ -0,0 +1,68 @@
+import asyncio
+
+from yellowpages.planner import SearchPlanner
+
+
+def test_join_waits_for_retries_in_backoff():
+    async def run():
+        planner = SearchPlanner(workers=2)
+        planner.put('Plumbers', 'CA', 1, 'first')
+        attempts = []
+
+        async def worker():
+            while True:
+                job = await planner.get()
+                attempts.append(job)
+                if job == 'first':
+                    # Fails: retried after a backoff, from inside the job like RetryQueue does
+                    planner.put_later(0.05, 'Plumbers', 'CA', 1, 'retry')
+                planner.task_done('Plumbers', 'CA', 0.01)
+
+        workers = [asyncio.create_task(worker()) for _ in range(2)]
+        await asyncio.wait_for(planner.join(), timeout=5)
+        for task in workers:
+            task.cancel()
+        return attempts
+
+    assert asyncio.run(run()) == ['first', 'retry']
+
+
+def test_join_does_not_return_while_a_released_retry_is_queued():
+    async def run():
+        planner = SearchPlanner(workers=1)
+        planner.put('Plumbers', 'CA', 2, 'first')
+        finished = []
+
+        async def worker():
+            while True:
+                job = await planner.get()
+                if job == 'first':
+                    # Mark the attempt done from a callback queued ahead of the zero-delay
+                    # release: the queue drains, then the release runs before join() resumes
+                    planner.put_later(0, 'Plumbers', 'CA', 2, 'retry')
+                    asyncio.get_running_loop().call_soon(planner.task_done, 'Plumbers', 'CA', 0.01)
+                    finished.append(job)
+                    continue
+                await asyncio.sleep(0.05)
+                finished.append(job)
+                planner.task_done('Plumbers', 'CA', 0.01)
+
+        task = asyncio.create_task(worker())
+        await asyncio.wait_for(planner.join(), timeout=5)
+        task.cancel()
+        return finished
+
+    assert asyncio.run(run()) == ['first', 'retry']
+
+
+def test_probes_run_before_result_pages_and_big_searches_first():
+    async def run():
+        planner = SearchPlanner(workers=1)
+        planner.observe('Small', 'CA', 3)
+        planner.observe('Big', 'CA', 40)
+        planner.put('Small', 'CA', 2, 'small-2')
+        planner.put('Big', 'CA', 2, 'big-2')
+        planner.put('New', 'TX', 1, 'new-1')
+        return [await planner.get() for _ in range(3)]
+
+    assert asyncio.run(run()) == ['new-1', 'big-2', 'small-2']
@@ -0,0 +1,103 @@
+import asyncio
+
+from yellowpages.checkpoint import CrawlCheckpoint
+from yellowpages.concurrency import AdaptiveConcurrency
+from yellowpages.planner import SearchPlanner
+from yellowpages.retry import DeadLetters, RetryPolicy, RetryQueue
+from yellowpages.runner import SearchRunner
+from yellowpages.sharding import RunShard
+
+
+class CollectingOutput:
+    def __init__(self):
+        self.items = []
+
+    async def push_data(self, items):
+        self.items.extend(items)
+
+
+def page_listings(keyword, location, page_num, count=30):
+    return [
+        {'name': f"{keyword} {location} {page_num}-{i}", 'phone': '', 'address': f"{i} Main St"}
+        for i in range(count)
+    ]
+
+
+def make_runner(max_pages=10, shard=None):
+    planner = SearchPlanner(4, max_pages=max_pages)
+    checkpoint = CrawlCheckpoint()
+    dead_letters = DeadLetters()
+    retries = RetryQueue(planner, checkpoint, RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01), dead_letters)
+    return SearchRunner(planner, checkpoint, retries, dead_letters, CollectingOutput(), None, max_pages, 4, shard=shard)
+
+
+def run(runner, fetch, keywords, locations):
+    return asyncio.run(asyncio.wait_for(runner.run(fetch, keywords, locations, AdaptiveConcurrency(4)), timeout=10))
+
+
+def test_every_page_of_every_search_is_fetched_once_and_pushed():
+    runner = make_runner()
+    fetched = []
+
+    async def fetch(job):
+        fetched.append((job.keyword, job.location, job.page_num))
+        total_pages = 3 if job.page_num == 1 else None
+        return page_listings(job.keyword, job.location, job.page_num), total_pages
+
+    total = run(runner, fetch, ['Plumbers', 'Dentists'], ['CA', 'TX'])
+
+    expected = {(k, l, p) for k in ['Plumbers', 'Dentists'] for l in ['CA', 'TX'] for p in (1, 2, 3)}
+    assert sorted(fetched) == sorted(expected)
+    assert total == len(runner.output.items) == 12 * 30
+    assert all(runner.checkpoint.is_done(*page) for page in expected)
+
+
+def test_failed_page_is_retried_on_another_identity():
+    runner = make_runner()
+    attempts = []
+
+    async def fetch(job):
+        attempts.append((job.page_num, job.failed_on))
+        job.identity = f"proxy-{len(attempts)}"
+        if job.page_num == 2 and job.failed_on is None:
+            job.error = 'HTTP 429'
+            return None, None
+        return page_listings(job.keyword, job.location, job.page_num), 2 if job.page_num == 1 else None
+
+    run(runner, fetch, ['Plumbers'], ['CA'])
+
+    retried = [failed_on for page_num, failed_on in attempts if page_num == 2]
+    assert retried[0] is None
+    assert retried[1] is not None and retried[1].startswith('proxy-')
+    assert len(runner.output.items) == 60
+
+
+def test_page_count_reported_early_fans_out_the_search():
+    runner = make_runner()
+    fetched = []
+
+    async def fetch(job):
+        fetched.append(job.page_num)
+        if job.page_num == 1:
+            # Like main.py: fan out before extracting page 1, and return no count
+            job.found_pages(4)
+        return page_listings(job.keyword, job.location, job.page_num), None
+
+    run(runner, fetch, ['Plumbers'], ['CA'])
+
+    assert sorted(fetched) == [1, 2, 3, 4]
+    assert len(runner.output.items) == 4 * 30
+
+
+def test_shard_pushes_only_the_pages_it_owns():
+    pushed = 0
+    for index in range(2):
+        runner = make_runner(shard=RunShard(index, 2))
+
+        async def fetch(job):
+            return page_listings(job.keyword, job.location, job.page_num), 6 if job.page_num == 1 else None
+
+        run(runner, fetch, ['Plumbers'], ['CA'])
+        pushed += len(runner.output.items)
+
+    assert pushed == 6 * 30
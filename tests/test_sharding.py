@@ -0,0 +1,45 @@
+import pytest
+
+from yellowpages.sharding import RunShard
+
+KEYWORDS = ['Plumbers', 'Dentists', 'Real Estate', 'Lawyers', 'Restaurants']
+LOCATIONS = ['CA', 'TX', 'NY', 'FL', 'Chicago, IL']
+PAGES = range(1, 101)
+
+
+@pytest.mark.parametrize('count', [2, 3, 4, 5, 8])
+def test_every_page_has_exactly_one_owner_and_shares_are_even(count):
+    shards = [RunShard(index, count) for index in range(count)]
+    owned = [0] * count
+    for keyword in KEYWORDS:
+        for location in LOCATIONS:
+            for page_num in PAGES:
+                owners = [shard.index for shard in shards if shard.owns(keyword, location, page_num)]
+                assert len(owners) == 1, (keyword, location, page_num, owners)
+                owned[owners[0]] += 1
+
+    expected = len(KEYWORDS) * len(LOCATIONS) * len(PAGES) / count
+    for share in owned:
+        assert abs(share - expected) / expected < 0.1, owned
+
+
+def test_ownership_ignores_case_and_surrounding_spaces():
+    shards = [RunShard(index, 4) for index in range(4)]
+    for page_num in PAGES:
+        assert [s.owns('Plumbers', 'CA', page_num) for s in shards] == [s.owns(' plumbers ', 'ca ', page_num) for s in shards]
+
+
+def test_skips_is_the_complement_of_owns():
+    shard = RunShard(1, 3)
+    for page_num in PAGES:
+        assert shard.skips(('Plumbers', 'CA'), page_num) == (not shard.owns('Plumbers', 'CA', page_num))
+
+
+def test_unsharded_and_coordinator_runs_own_everything():
+    assert all(RunShard().owns('Plumbers', 'CA', page_num) for page_num in PAGES)
+    assert all(RunShard(None, 4).owns('Plumbers', 'CA', page_num) for page_num in PAGES)
+
+
+def test_shard_index_out_of_range():
+    with pytest.raises(ValueError):
+        RunShard(3, 3)
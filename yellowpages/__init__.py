@@ -0,0 +1,3 @@
+"""
+Shared building blocks for the Yellow Pages scraper entry points (main*.py)
+"""
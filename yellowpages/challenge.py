@@ -0,0 +1,95 @@
+"""
+Single-flight Cloudflare challenge handling for one browser context.
+
+When a page hits "Just a moment...", new navigations on the context are paused and only
+that page works on the challenge. Pages in the same context share a cookie jar, so once
+cf_clearance is issued the waiting pages just reload instead of each solving it again.
+"""
+
+import asyncio
+import logging
+import random
+
+# Upper bound on how long a navigation waits for another page's challenge
+MAX_GATE_WAIT_SECS = 45
+
+
+async def solve_cloudflare(page, label):
+    """Wait for Cloudflare's "Just a moment..." page to clear. Returns True once it has"""
+    logging.info(f"{label}: Cloudflare detected, solving for this context...")
+    await page.mouse.move(random.randint(200, 600), random.randint(200, 400))
+
+    try:
+        await page.wait_for_function(
+            "document.title !== 'Just a moment...'",
+            timeout=30000
+        )
+        logging.info(f"{label}: Cloudflare bypassed")
+        return True
+    except Exception:
+        logging.error(f"{label}: Cloudflare timeout")
+        return False
+
+
+class ChallengeGate:
+    def __init__(self):
+        self._clear = asyncio.Event()
+        self._clear.set()
+        self._solving = None
+
+        self.challenges = 0
+        self.solved = 0
+        self.failed = 0
+        self.waiters = 0
+
+    @property
+    def solving(self):
+        return self._solving is not None
+
+    async def wait_clear(self):
+        """Hold a new navigation while a challenge is being solved on this context"""
+        if self._clear.is_set():
+            return
+        try:
+            await asyncio.wait_for(self._clear.wait(), timeout=MAX_GATE_WAIT_SECS)
+        except asyncio.TimeoutError:
+            logging.warning("Challenge gate wait timed out - navigating anyway")
+
+    async def handle(self, solve):
+        """Solve a challenge once per context.
+
+        solve is an async callable returning True when the challenge cleared. Returns
+        (cleared, solved_here); solved_here is False for pages that waited on another
+        page's attempt and should reload to pick up the clearance cookies.
+        """
+        if self._solving is not None:
+            self.waiters += 1
+            return await asyncio.shield(self._solving), False
+
+        self.challenges += 1
+        self._solving = asyncio.get_running_loop().create_future()
+        self._clear.clear()
+
+        cleared = False
+        try:
+            cleared = await solve()
+        except Exception as e:
+            logging.error(f"Challenge solver failed: {e}")
+        finally:
+            if cleared:
+                self.solved += 1
+            else:
+                self.failed += 1
+            self._solving.set_result(cleared)
+            self._solving = None
+            self._clear.set()
+
+        return cleared, True
+
+    def stats(self):
+        return {
+            'challenges': self.challenges,
+            'solved': self.solved,
+            'failed': self.failed,
+            'waiters': self.waiters,
+        }
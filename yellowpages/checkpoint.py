@@ -0,0 +1,168 @@
+"""
+Checkpointed crawl state so a migrated or restarted run resumes where it stopped.
+
+Progress lives in the run's default key-value store under CRAWL_STATE:
+- finished (keyword, location, page) tuples
+- page counts detected on each search's first page
+- pages whose fetch failed, with their attempt counts
+
+State is flushed every few seconds while it changes, and immediately on the
+platform's persistState and migrating events. A restarted run skips finished pages and
+resumes searches whose first page is already done straight from the saved page count.
+At most the last flush interval of work is repeated. When listings go through a
+buffered DatasetWriter (see writer.py), it is flushed before the state is saved, and
+an incremental run's ChangeTracker (see incremental.py) is saved along with it, so
+pages marked done always have their listings in the snapshot being built. The dedup
+index (see dedup.py) is captured together with the state and written once the writer
+has stored the listings behind it, so it never holds keys of listings a crash lost.
+"""
+
+import asyncio
+import logging
+
+from apify import Actor, Event
+
+STATE_KEY = 'CRAWL_STATE'
+
+
+class CrawlCheckpoint:
+    def __init__(self, state=None, flush_secs=5.0, key=STATE_KEY):
+        self.key = key
+        self.flush_secs = flush_secs
+
+        self._searches = {}
+        for entry in (state or {}).get('searches', []):
+            search = self._search(entry['keyword'], entry['location'])
+            search['totalPages'] = entry.get('totalPages')
+            search['done'] = set(entry.get('done', []))
+            search['failed'] = {int(page): attempts for page, attempts in entry.get('failed', {}).items()}
+
+        self.resumed = bool(self._searches)
+        self._dirty = False
+        self._flusher = None
+        self.flushes = 0
+        # Buffered dataset writer to drain before saving, so done pages have their listings stored
+        self.writer = None
+        # Incremental change tracker saved with the state, so done pages are in its snapshot
+        self.changes = None
+        # Dedup index saved with the state, only once its listings are stored
+        self.dedup = None
+
+    @classmethod
+    async def load(cls, flush_secs=5.0, key=STATE_KEY):
+        """Load saved progress (if any) and start flushing changes"""
+        checkpoint = cls(await Actor.get_value(key), flush_secs, key)
+        if checkpoint.resumed:
+            done = sum(len(s['done']) for s in checkpoint._searches.values())
+            logging.info(f"Resuming from checkpoint: {len(checkpoint._searches)} searches, {done} pages already done")
+        checkpoint.start()
+        return checkpoint
+
+    def _search(self, keyword, location):
+        key = (keyword, location)
+        search = self._searches.get(key)
+        if search is None:
+            search = self._searches[key] = {'totalPages': None, 'done': set(), 'failed': {}}
+        return search
+
+    def is_done(self, keyword, location, page_num):
+        search = self._searches.get((keyword, location))
+        return search is not None and page_num in search['done']
+
+    def total_pages(self, keyword, location):
+        """Page count saved from the search's first page, None until it has been loaded"""
+        search = self._searches.get((keyword, location))
+        return search['totalPages'] if search is not None else None
+
+    def can_resume(self, keyword, location):
+        """True when the search's first page is done and its page count is known"""
+        return self.total_pages(keyword, location) is not None and self.is_done(keyword, location, 1)
+
+    def record_pages(self, keyword, location, total_pages):
+        self._search(keyword, location)['totalPages'] = total_pages
+        self._dirty = True
+
+    def mark_done(self, keyword, location, page_num):
+        search = self._search(keyword, location)
+        search['done'].add(page_num)
+        search['failed'].pop(page_num, None)
+        self._dirty = True
+
+    def mark_failed(self, keyword, location, page_num):
+        """Record a failed attempt; returns the page's attempt count so far"""
+        failed = self._search(keyword, location)['failed']
+        failed[page_num] = failed.get(page_num, 0) + 1
+        self._dirty = True
+        return failed[page_num]
+
+    def attempts(self, keyword, location, page_num):
+        search = self._searches.get((keyword, location))
+        return search['failed'].get(page_num, 0) if search is not None else 0
+
+    def failed_searches(self):
+        """(keyword, location) of searches with pages that never loaded"""
+        return [key for key, search in self._searches.items() if search['failed']]
+
+    def snapshot(self):
+        return {
+            'searches': [
+                {
+                    'keyword': keyword,
+                    'location': location,
+                    'totalPages': search['totalPages'],
+                    'done': sorted(search['done']),
+                    'failed': {str(page): attempts for page, attempts in search['failed'].items()},
+                }
+                for (keyword, location), search in self._searches.items()
+            ],
+        }
+
+    async def flush(self, event_data=None):
+        """Write the state if it changed (also the persistState/migrating listener)"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        # Snapshot first: every page done by now has already handed its listings to the writer,
+        # and every key in the dedup index belongs to a listing the writer has
+        snapshot = self.snapshot()
+        dedup_index = self.dedup.snapshot() if self.dedup is not None else None
+        if self.writer is not None:
+            await self.writer.flush()
+        if dedup_index is not None:
+            await self.dedup.save(dedup_index)
+        if self.changes is not None:
+            await self.changes.persist()
+        await Actor.set_value(self.key, snapshot)
+        self.flushes += 1
+
+    def start(self):
+        Actor.on(Event.PERSIST_STATE, self.flush)
+        Actor.on(Event.MIGRATING, self.flush)
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_secs)
+            try:
+                await self.flush()
+            except Exception as e:
+                self._dirty = True
+                logging.warning(f"Checkpoint flush failed: {e}")
+
+    async def close(self):
+        """Stop the periodic flush and write the final state"""
+        Actor.off(Event.PERSIST_STATE, self.flush)
+        Actor.off(Event.MIGRATING, self.flush)
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        await self.flush()
+
+    def stats(self):
+        return {
+            'resumed': self.resumed,
+            'searches': len(self._searches),
+            'pagesDone': sum(len(s['done']) for s in self._searches.values()),
+            'pagesFailed': sum(len(s['failed']) for s in self._searches.values()),
+            'flushes': self.flushes,
+        }
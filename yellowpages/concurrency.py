@@ -0,0 +1,121 @@
+"""
+Adaptive (AIMD) concurrency control.
+
+The limit grows by roughly one slot per limit-many healthy pages and is cut
+multiplicatively on timeouts, HTTP 403/429 and Cloudflare pages. maxConcurrency is the
+ceiling, not the operating point.
+
+Code running inside a slot signals overload with report_overload(); the current slot is
+tracked in a context variable so fetch code doesn't need the limiter passed down to it.
+"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+
+from yellowpages import metrics
+
+_current_slot = contextvars.ContextVar('concurrency_slot', default=None)
+
+
+def report_overload(reason):
+    """Mark the running job as a sign of overload (timeout, 403/429, challenge...)"""
+    metrics.record_block(reason)
+    slot = _current_slot.get()
+    if slot is not None and slot.overload is None:
+        slot.overload = reason
+
+
+class _Slot:
+    __slots__ = ('overload',)
+
+    def __init__(self):
+        self.overload = None
+
+
+class AdaptiveConcurrency:
+    def __init__(self, max_concurrency, min_concurrency=1, initial=None, backoff_factor=0.5,
+                 latency_tolerance=2.0, cooldown_secs=5.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        if initial is None:
+            initial = math.ceil(self.max_concurrency / 4)
+        self.limit = float(max(self.min_concurrency, min(initial, self.max_concurrency)))
+        self.backoff_factor = backoff_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown_secs = cooldown_secs
+
+        self.in_flight = 0
+        self.baseline_latency = None
+        self._cond = asyncio.Condition()
+        self._last_decrease = 0.0
+
+        self.successes = 0
+        self.overloads = {}
+        self.decreases = 0
+        self.peak_limit = int(self.limit)
+        self.low_limit = int(self.limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot for the duration of a job"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+        slot = _Slot()
+        token = _current_slot.set(slot)
+        started = time.monotonic()
+        try:
+            yield slot
+        except (asyncio.TimeoutError, TimeoutError):
+            report_overload('timeout')
+            raise
+        finally:
+            _current_slot.reset(token)
+            self._adjust(slot, time.monotonic() - started)
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def _adjust(self, slot, latency):
+        if slot.overload is not None:
+            self.overloads[slot.overload] = self.overloads.get(slot.overload, 0) + 1
+            now = time.monotonic()
+            # One cut per burst: jobs that were already in flight fail together
+            if now - self._last_decrease >= self.cooldown_secs:
+                old = int(self.limit)
+                self.limit = max(self.min_concurrency, self.limit * self.backoff_factor)
+                self._last_decrease = now
+                self.decreases += 1
+                self.low_limit = min(self.low_limit, int(self.limit))
+                logging.info(f"Concurrency {old} -> {int(self.limit)} ({slot.overload})")
+            return
+
+        self.successes += 1
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+        healthy = latency <= self.baseline_latency * self.latency_tolerance
+        self.baseline_latency = 0.95 * self.baseline_latency + 0.05 * latency
+
+        if healthy and self.limit < self.max_concurrency:
+            old = int(self.limit)
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            if int(self.limit) > old:
+                self.peak_limit = max(self.peak_limit, int(self.limit))
+                logging.debug(f"Concurrency {old} -> {int(self.limit)}")
+
+    def stats(self):
+        return {
+            'limit': int(self.limit),
+            'max': self.max_concurrency,
+            'peakLimit': self.peak_limit,
+            'lowLimit': self.low_limit,
+            'successes': self.successes,
+            'overloads': dict(self.overloads),
+            'decreases': self.decreases,
+            'baselineLatencySecs': round(self.baseline_latency, 3) if self.baseline_latency else None,
+        }
@@ -0,0 +1,196 @@
+"""
+Cross-search listing deduplication.
+
+One business turns up under several keywords, under overlapping locations and on
+repeated last pages. Every listing is keyed on its normalised phone, name and address,
+hashed to 64 bits, and dropped before it reaches the dataset if the key was seen before
+- across every search in the run, and optionally across runs.
+
+Incremental runs push change records (see incremental.py) for businesses that are
+already in the index, from earlier searches or earlier runs. 'changed' and
+'disappeared' records are therefore keyed on their change and content as well, so an
+update gets through once instead of being dropped as a repeat of the business.
+
+Two index modes:
+- hash: an exact set of 64-bit digests (a few dozen bytes per listing)
+- bloom: a fixed-size Bloom filter for very large runs (about 1.8 MB per million
+  listings at the default 0.1% false-positive rate; a false positive drops a listing
+  that wasn't really a duplicate)
+
+The index is saved to the key-value store with the crawl state (CrawlCheckpoint saves it
+in each flush, once the dataset writer has stored every listing the saved index holds),
+so a resumed run keeps it and never drops a listing that didn't reach the dataset. With
+dedupeAcrossRuns it lives in a named store and later runs skip listings earlier
+runs already delivered.
+"""
+
+import array
+import hashlib
+import logging
+import math
+import re
+import struct
+
+from apify import Actor
+
+from yellowpages.incremental import listing_fingerprint
+
+INDEX_KEY = 'DEDUP_INDEX'
+SHARED_STORE = 'yellowpages-dedup'
+
+_NON_DIGIT_RE = re.compile(r'\D')
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+
+def dedup_key(listing):
+    """Normalised (phone, name, address): digits-only phone, case and punctuation folded text"""
+    phone = _NON_DIGIT_RE.sub('', listing.get('phone') or '')[-10:]
+    name, address = (
+        ' '.join(_NON_WORD_RE.sub(' ', (listing.get(field) or '').casefold()).split())
+        for field in ('name', 'address')
+    )
+    return phone, name, address
+
+
+def digest(listing):
+    """64-bit hash of a listing's dedup key (plus change and content for change records)"""
+    parts = dedup_key(listing)
+    if listing.get('change') in ('changed', 'disappeared'):
+        parts += (listing['change'], listing_fingerprint(listing))
+    key = '\0'.join(parts).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001, bits=None, hashes=None):
+        self.size = bits or max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing on the two 32-bit halves of the digest
+        low, high = value & 0xFFFFFFFF, value >> 32
+        return ((low + i * high) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        """Set value's bits. Returns False if they were all set already (probably seen)"""
+        new = False
+        for position in self._positions(value):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+
+class DedupIndex:
+    def __init__(self, mode='hash', capacity=1_000_000, error_rate=0.001, store=None):
+        self.mode = mode
+        self.store = store
+        self._digests = set()
+        self._bloom = BloomFilter(capacity, error_rate) if mode == 'bloom' else None
+
+        self.entries = 0
+        self.duplicates = 0
+        self.loaded = 0
+        self._dirty = False
+
+    @classmethod
+    async def load(cls, actor_input):
+        """Build the index from the Actor input and load saved entries (mode 'off' keeps everything)"""
+        mode = actor_input.get('dedupe', 'hash')
+        if mode == 'off':
+            return cls('off')
+
+        if actor_input.get('dedupeAcrossRuns'):
+            store = await Actor.open_key_value_store(name=SHARED_STORE)
+        else:
+            store = await Actor.open_key_value_store()
+        index = cls(mode, actor_input.get('dedupeBloomCapacity', 1_000_000), store=store)
+
+        data = await store.get_value(INDEX_KEY)
+        if data:
+            index.restore(data)
+            seen = f"{index.loaded} listings" if index.loaded is not None else "saved Bloom filter"
+            logging.info(f"Dedup index restored: {seen} already seen")
+        return index
+
+    def add(self, listing):
+        """True the first time a listing's key is seen"""
+        value = digest(listing)
+        if self._bloom is not None:
+            new = self._bloom.add(value)
+        else:
+            new = value not in self._digests
+            self._digests.add(value)
+        if new:
+            self.entries += 1
+            self._dirty = True
+        else:
+            self.duplicates += 1
+        return new
+
+    def filter(self, listings):
+        """Listings whose keys haven't been seen yet"""
+        if self.mode == 'off':
+            return listings
+        return [listing for listing in listings if self.add(listing)]
+
+    def dump(self):
+        if self._bloom is not None:
+            return b'B' + struct.pack('<QI', self._bloom.size, self._bloom.hashes) + bytes(self._bloom.bits)
+        return b'H' + array.array('Q', self._digests).tobytes()
+
+    def restore(self, data):
+        kind, body = data[:1], data[1:]
+        if kind == b'H':
+            digests = array.array('Q')
+            digests.frombytes(body)
+            for value in digests:
+                if self._bloom is not None:
+                    self._bloom.add(value)
+                else:
+                    self._digests.add(value)
+            self.loaded = len(digests)
+        elif kind == b'B' and self._bloom is not None:
+            bits, hashes = struct.unpack('<QI', body[:12])
+            self._bloom = BloomFilter(1, bits=bits, hashes=hashes)
+            self._bloom.bits[:] = body[12:]
+            # A Bloom filter doesn't know how many listings it holds
+            self.loaded = None
+        else:
+            logging.warning("Saved dedup index is a Bloom filter, which can't be loaded in hash mode - starting empty")
+
+    def snapshot(self):
+        """The index as it is now, for a later save(), or None if nothing was added since the last one"""
+        if self.store is None or not self._dirty:
+            return None
+        self._dirty = False
+        return self.dump()
+
+    async def save(self, data=None):
+        """Write a snapshot() taken earlier, or the index as it is now (called from CrawlCheckpoint.flush)"""
+        if self.store is None:
+            return
+        if data is None:
+            self._dirty = False
+            data = self.dump()
+        try:
+            await self.store.set_value(INDEX_KEY, data, content_type='application/octet-stream')
+        except BaseException:
+            # The checkpoint retries the flush; make sure it saves the index again
+            self._dirty = True
+            raise
+
+    async def close(self):
+        """Write the final index (call once the writer has stored every listing)"""
+        await self.save()
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'entries': self.entries,
+            'loaded': self.loaded,
+            'duplicatesDropped': self.duplicates,
+            'indexBytes': len(self._bloom.bits) if self._bloom is not None else len(self._digests) * 8,
+        }
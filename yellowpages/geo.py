@@ -0,0 +1,122 @@
+"""
+Geographic sharding for searches that outgrow YP's 100-page cap.
+
+A state-level search like "Plumber in CA" can report tens of thousands of results but
+only ever serves 100 pages (3,000 listings). When page 1 reports more than that, the
+search is split into one sub-search per city from the bundled gazetteer
+(data/us_cities.json, largest cities first), and the sub-searches run alongside the
+original. YP's city results overlap (nearby towns, service areas), so every listing in
+a sharded search family is deduplicated against the rest of the family before push.
+"""
+
+import json
+from pathlib import Path
+
+from yellowpages.pagination import MAX_PAGES_PER_SEARCH
+
+GAZETTEER_PATH = Path(__file__).parent / 'data' / 'us_cities.json'
+
+STATE_NAMES = {
+    'ALABAMA': 'AL', 'ALASKA': 'AK', 'ARIZONA': 'AZ', 'ARKANSAS': 'AR', 'CALIFORNIA': 'CA',
+    'COLORADO': 'CO', 'CONNECTICUT': 'CT', 'DELAWARE': 'DE', 'DISTRICT OF COLUMBIA': 'DC',
+    'FLORIDA': 'FL', 'GEORGIA': 'GA', 'HAWAII': 'HI', 'IDAHO': 'ID', 'ILLINOIS': 'IL',
+    'INDIANA': 'IN', 'IOWA': 'IA', 'KANSAS': 'KS', 'KENTUCKY': 'KY', 'LOUISIANA': 'LA',
+    'MAINE': 'ME', 'MARYLAND': 'MD', 'MASSACHUSETTS': 'MA', 'MICHIGAN': 'MI', 'MINNESOTA': 'MN',
+    'MISSISSIPPI': 'MS', 'MISSOURI': 'MO', 'MONTANA': 'MT', 'NEBRASKA': 'NE', 'NEVADA': 'NV',
+    'NEW HAMPSHIRE': 'NH', 'NEW JERSEY': 'NJ', 'NEW MEXICO': 'NM', 'NEW YORK': 'NY',
+    'NORTH CAROLINA': 'NC', 'NORTH DAKOTA': 'ND', 'OHIO': 'OH', 'OKLAHOMA': 'OK', 'OREGON': 'OR',
+    'PENNSYLVANIA': 'PA', 'RHODE ISLAND': 'RI', 'SOUTH CAROLINA': 'SC', 'SOUTH DAKOTA': 'SD',
+    'TENNESSEE': 'TN', 'TEXAS': 'TX', 'UTAH': 'UT', 'VERMONT': 'VT', 'VIRGINIA': 'VA',
+    'WASHINGTON': 'WA', 'WEST VIRGINIA': 'WV', 'WISCONSIN': 'WI', 'WYOMING': 'WY',
+}
+
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    """Load the state -> cities index (cities ordered by population)"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def listing_key(listing):
+    return tuple(' '.join((listing.get(field) or '').split()).casefold() for field in ('name', 'phone', 'address'))
+
+
+class GeoSharder:
+    def __init__(self, gazetteer=None, enabled=True, max_shards=0, page_cap=MAX_PAGES_PER_SEARCH):
+        self.gazetteer = gazetteer if gazetteer is not None else (load_gazetteer() if enabled else {})
+        self.enabled = enabled
+        self.max_shards = max_shards
+        self.page_cap = page_cap
+
+        self._roots = {}
+        self._seen = {}
+
+        self.sharded_searches = 0
+        self.sub_searches = 0
+        self.duplicates = 0
+
+    @classmethod
+    def from_input(cls, actor_input):
+        """Build a sharder from the Actor input (maxShardsPerSearch: 0 = every city in the state)"""
+        return cls(
+            enabled=actor_input.get('geoSharding', True),
+            max_shards=actor_input.get('maxShardsPerSearch', 0),
+        )
+
+    def state_of(self, location):
+        """Two-letter code for a state-level location, None for cities and unknown places"""
+        name = ' '.join(location.split()).upper()
+        code = STATE_NAMES.get(name, name)
+        return code if code in self.gazetteer else None
+
+    def split(self, keyword, location, total_pages):
+        """Sub-locations to search when a search reports more pages than YP will serve (else [])"""
+        if not self.enabled or total_pages <= self.page_cap or (keyword, location) in self._roots:
+            return []
+
+        state = self.state_of(location)
+        if state is None:
+            return []
+
+        cities = self.gazetteer[state]
+        if self.max_shards:
+            cities = cities[:self.max_shards]
+
+        root = (keyword, location)
+        self._roots[root] = root
+        self._seen[root] = set()
+        sub_locations = []
+        for city in cities:
+            sub_location = f"{city}, {state}"
+            if (keyword, sub_location) not in self._roots:
+                self._roots[(keyword, sub_location)] = root
+                sub_locations.append(sub_location)
+
+        if sub_locations:
+            self.sharded_searches += 1
+            self.sub_searches += len(sub_locations)
+        return sub_locations
+
+    def dedupe(self, keyword, location, listings):
+        """Drop listings already pushed by another search in the same sharded family"""
+        root = self._roots.get((keyword, location))
+        if root is None:
+            return listings
+
+        seen = self._seen[root]
+        unique = []
+        for listing in listings:
+            key = listing_key(listing)
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            unique.append(listing)
+        return unique
+
+    def stats(self):
+        return {
+            'shardedSearches': self.sharded_searches,
+            'subSearches': self.sub_searches,
+            'duplicatesDropped': self.duplicates,
+        }
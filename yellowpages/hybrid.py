@@ -0,0 +1,225 @@
+"""
+Hybrid HTTP-first fetching with a browser fallback.
+
+Each HybridIdentity is one proxy IP + user agent + cookie jar. Results pages are fetched
+over plain HTTP; when a response looks blocked or challenged, the identity escalates to a
+Playwright context on the same proxy IP, lets the browser clear the challenge, and hands
+the browser's cookies (cf_clearance included) and user agent back to the HTTP client.
+"""
+
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+
+import aiohttp
+from playwright.async_api import async_playwright
+from yarl import URL
+
+from yellowpages import metrics
+from yellowpages.challenge import ChallengeGate, solve_cloudflare
+from yellowpages.concurrency import report_overload
+from yellowpages.page_pool import STEALTH_SCRIPT
+from yellowpages.parsing import looks_blocked
+from yellowpages.readiness import wait_until_ready
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+HTTP_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+class LazyBrowser:
+    """Chromium launched on the first escalation only - pure-HTTP runs never start it"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self.browser = None
+
+    async def get(self):
+        async with self._lock:
+            if self.browser is None:
+                logging.info("Launching browser for challenge fallback")
+                self._playwright = await async_playwright().start()
+                self.browser = await self._playwright.chromium.launch(
+                    headless=True,
+                    args=[
+                        '--no-first-run',
+                        '--disable-blink-features=AutomationControlled',
+                    ]
+                )
+            return self.browser
+
+    async def close(self):
+        if self.browser:
+            await self.browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+
+
+class HybridIdentity:
+    def __init__(self, name, proxy_url, browser, rate_limiter, request_filter=None, user_agent=DEFAULT_USER_AGENT):
+        self.name = name
+        self.proxy_url = proxy_url
+        self.browser = browser
+        self.rate_limiter = rate_limiter
+        self.request_filter = request_filter
+        self.user_agent = user_agent
+
+        self.http = None
+        self.context = None
+        self.challenge_gate = ChallengeGate()
+        self._escalation_lock = asyncio.Lock()
+        self._cookie_generation = 0
+
+        self.http_pages = 0
+        self.http_blocks = 0
+        self.browser_pages = 0
+        self.browser_failures = 0
+
+    @property
+    def rate_key(self):
+        """Per-proxy rate limit key: the sticky session, or None on a direct connection"""
+        return self.name if self.proxy_url else None
+
+    async def start(self):
+        self.http = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(), headers=HTTP_HEADERS)
+        return self
+
+    async def close(self):
+        if self.http:
+            await self.http.close()
+        if self.context:
+            await self.context.close()
+
+    async def _http_get(self, url):
+        request_kwargs = {'headers': {'User-Agent': self.user_agent}, 'timeout': aiohttp.ClientTimeout(total=30)}
+        if self.proxy_url:
+            request_kwargs['proxy'] = self.proxy_url
+
+        with metrics.stage('rateLimit'):
+            await self.rate_limiter.wait(url, self.rate_key)
+        metrics.count('fetches')
+        with metrics.stage('fetch'):
+            async with self.http.get(url, **request_kwargs) as response:
+                body = await response.read()
+        metrics.add_bytes(len(body))
+        return response.status, body
+
+    async def fetch(self, url):
+        """Return the raw page HTML bytes, over HTTP if possible and through the browser if not. None if both failed"""
+        generation = self._cookie_generation
+        try:
+            status, html = await self._http_get(url)
+            if not looks_blocked(status, html):
+                self.http_pages += 1
+                return html
+            logging.info(f"[{self.name}] HTTP {status} looks blocked for {url}")
+            if status == 200:
+                metrics.count('challenges')
+            report_overload(f"http_{status}" if status != 200 else 'challenge')
+        except asyncio.TimeoutError:
+            logging.warning(f"[{self.name}] HTTP timeout for {url}")
+            report_overload('timeout')
+        except Exception as e:
+            logging.warning(f"[{self.name}] HTTP error for {url}: {e}")
+
+        self.http_blocks += 1
+        return await self._escalate(url, generation)
+
+    async def _escalate(self, url, generation):
+        # One browser escalation at a time per identity: the cookies it produces unblock everyone
+        async with self._escalation_lock:
+            if self._cookie_generation != generation:
+                # Another page already refreshed the cookies while we waited - retry over HTTP
+                try:
+                    status, html = await self._http_get(url)
+                    if not looks_blocked(status, html):
+                        self.http_pages += 1
+                        return html
+                except Exception as e:
+                    logging.warning(f"[{self.name}] HTTP retry error for {url}: {e}")
+
+            html = await self._browser_fetch(url)
+            self._cookie_generation += 1
+            return html
+
+    async def _browser_fetch(self, url):
+        page = None
+        try:
+            if self.context is None:
+                browser = await self.browser.get()
+                self.context = await browser.new_context(
+                    viewport={'width': 1920, 'height': 1080},
+                    user_agent=self.user_agent,
+                    proxy={'server': self.proxy_url} if self.proxy_url else None,
+                )
+                if self.request_filter:
+                    await self.request_filter.attach(self.context)
+
+            page = await self.context.new_page()
+            await page.add_init_script(STEALTH_SCRIPT)
+            with metrics.stage('rateLimit'):
+                await self.rate_limiter.wait(url, self.rate_key)
+            metrics.count('browserFetches')
+            with metrics.stage('navigate'):
+                await page.goto(url, wait_until='domcontentloaded', timeout=60000)
+                state = await wait_until_ready(page)
+
+            if state == 'challenge':
+                metrics.count('challenges')
+                with metrics.stage('challenge'):
+                    cleared, _ = await self.challenge_gate.handle(lambda: solve_cloudflare(page, f"[{self.name}]"))
+                if not cleared:
+                    self.browser_failures += 1
+                    return None
+                state = await wait_until_ready(page)
+
+            html = await page.content()
+            await self._hand_off_cookies(page)
+
+            if looks_blocked(200, html):
+                self.browser_failures += 1
+                return None
+
+            self.browser_pages += 1
+            return html.encode('utf-8')
+
+        except Exception as e:
+            logging.error(f"[{self.name}] Browser fallback failed for {url}: {e}")
+            self.browser_failures += 1
+            return None
+        finally:
+            if page:
+                await page.close()
+
+    async def _hand_off_cookies(self, page):
+        """Copy the browser's cookies and user agent into the HTTP client"""
+        self.user_agent = await page.evaluate('navigator.userAgent')
+
+        for cookie in await self.context.cookies():
+            jar = SimpleCookie()
+            jar[cookie['name']] = cookie['value']
+            morsel = jar[cookie['name']]
+            morsel['domain'] = cookie['domain']
+            morsel['path'] = cookie.get('path', '/')
+            if cookie.get('secure'):
+                morsel['secure'] = True
+            self.http.cookie_jar.update_cookies(jar, response_url=URL(f"https://{cookie['domain'].lstrip('.')}/"))
+
+        logging.info(f"[{self.name}] Browser cookies handed to HTTP client")
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'httpPages': self.http_pages,
+            'httpBlocks': self.http_blocks,
+            'browserPages': self.browser_pages,
+            'browserFailures': self.browser_failures,
+            'challenges': self.challenge_gate.stats(),
+        }
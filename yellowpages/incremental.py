@@ -0,0 +1,247 @@
+"""
+Incremental runs: emit only what changed since the previous run of the same searches.
+
+Each run keeps a snapshot of every search's listings in a named key-value store: per
+listing an identity (its phone, or name + address without one) and a fingerprint of
+its content (name, phone, address, website, category). With incremental set, a listing
+is pushed only if it is new or its fingerprint changed, tagged with change: 'new' or
+'changed'. Once a search returns unchangedPagesToStop pages in a row with nothing new
+or changed, its pagination walk stops early - YP orders results stably, so the rest of
+the search is most likely unchanged too.
+
+A search walked to its end without failed pages also reports the listings that are
+gone since the last snapshot (change: 'disappeared'). Searches that stopped early or
+lost pages can't tell a missing listing from an unvisited one; their unvisited
+listings are carried over to the next snapshot instead.
+
+The snapshot being built is saved with the crawl state (CrawlCheckpoint persists the
+tracker in each flush), so a migrated or restarted run keeps it for every page it
+skips as done.
+
+Shards of a sharded run each see only their own pages of a search, so none of them can
+write the snapshot alone. Each saves its part under its own key instead, and the
+coordinator (or a mergeDataset run) merges the parts into the next snapshot once every
+shard has finished.
+"""
+
+import hashlib
+import logging
+import re
+
+from apify import Actor
+
+SNAPSHOT_STORE = 'yellowpages-snapshots'
+SNAPSHOT_KEY = 'LISTINGS'
+SHARD_KEY = 'LISTINGS_SHARD_{}'
+STATE_KEY = 'INCREMENTAL_STATE'
+
+_NON_DIGIT_RE = re.compile(r'\D')
+
+
+def _norm(value):
+    return ' '.join(str(value or '').casefold().split())
+
+
+def _hash(*parts):
+    return hashlib.blake2b('\0'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def listing_identity(listing):
+    """Stable id for a business: its phone number, or name + address when it has none"""
+    phone = _NON_DIGIT_RE.sub('', listing.get('phone') or '')[-10:]
+    if len(phone) == 10:
+        return _hash('phone', phone)
+    return _hash('name', _norm(listing.get('name')), _norm(listing.get('address')))
+
+
+def listing_fingerprint(listing):
+    return _hash(*(_norm(listing.get(field)) for field in ('name', 'phone', 'address', 'website', 'category')))
+
+
+def search_key(keyword, location):
+    return f"{_norm(keyword)}|{_norm(location)}"
+
+
+class ChangeTracker:
+    def __init__(self, previous=None, state=None, stop_after=2, report_disappeared=True, store=None, shard_index=None):
+        self.previous = previous or {}
+        self.stop_after = stop_after
+        self.report_disappeared = report_disappeared
+        self.store = store
+        # Shards save their part of the snapshot for the coordinator to merge
+        self.shard_index = shard_index
+
+        state = state or {}
+        # search key -> {identity: [fingerprint, name, phone, address]} seen this run
+        self._current = state.get('current', {})
+        self._labels = state.get('labels', {})
+        self._truncated = set(state.get('truncated', []))
+        self._streaks = {}
+        self._dirty = False
+
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'disappeared': 0}
+        self.stopped_early = 0
+
+    @classmethod
+    async def load(cls, actor_input):
+        """The tracker for an incremental run (None unless incremental is set)"""
+        if not actor_input.get('incremental'):
+            return None
+
+        store = await Actor.open_key_value_store(name=SNAPSHOT_STORE)
+        previous = await store.get_value(SNAPSHOT_KEY) or {}
+        sharded = actor_input.get('shardCount', 1) > 1
+        if sharded:
+            logging.warning("Incremental mode in a sharded run: disappeared listings are not reported")
+
+        tracker = cls(
+            previous, await Actor.get_value(STATE_KEY), actor_input.get('unchangedPagesToStop', 2),
+            not sharded, store, actor_input.get('shardIndex') if sharded else None,
+        )
+        logging.info(f"Incremental run against a snapshot of {len(previous)} searches")
+        return tracker
+
+    def classify(self, keyword, location, listings):
+        """Tag new and changed listings and drop unchanged ones.
+
+        Returns (listings, stop): stop is True once the search has had stop_after pages
+        in a row with nothing new or changed.
+        """
+        key = search_key(keyword, location)
+        previous = self.previous.get(key, {})
+        current = self._current.setdefault(key, {})
+        self._labels[key] = [keyword, location]
+        self._dirty = True
+
+        changed = []
+        for listing in listings:
+            identity = listing_identity(listing)
+            fingerprint = listing_fingerprint(listing)
+            current[identity] = [fingerprint, listing.get('name', ''), listing.get('phone', ''), listing.get('address', '')]
+            before = previous.get(identity)
+            if before is None:
+                changed.append({**listing, 'change': 'new'})
+                self.counts['new'] += 1
+            elif before[0] != fingerprint:
+                changed.append({**listing, 'change': 'changed'})
+                self.counts['changed'] += 1
+            else:
+                self.counts['unchanged'] += 1
+
+        if changed or not listings:
+            self._streaks[key] = 0
+            return changed, False
+
+        self._streaks[key] = self._streaks.get(key, 0) + 1
+        return changed, self.stop_after > 0 and self._streaks[key] >= self.stop_after
+
+    def stopped(self, keyword, location):
+        """Record that a search's walk was cut short - its unvisited listings are kept, not reported gone"""
+        key = search_key(keyword, location)
+        if key not in self._truncated:
+            self._truncated.add(key)
+            self._dirty = True
+            self.stopped_early += 1
+
+    def finish(self, checkpoint=None):
+        """Listings gone from searches that were walked completely, as change: 'disappeared' items"""
+        if checkpoint is not None:
+            for keyword, location in checkpoint.failed_searches():
+                self._truncated.add(search_key(keyword, location))
+
+        disappeared = []
+        for key, current in self._current.items():
+            if key in self._truncated or not self.report_disappeared:
+                continue
+            keyword, location = self._labels.get(key) or key.split('|', 1)
+            for identity, (_, name, phone, address) in self.previous.get(key, {}).items():
+                if identity not in current:
+                    disappeared.append({
+                        'name': name, 'phone': phone, 'address': address,
+                        'keyword': keyword, 'location': location, 'change': 'disappeared',
+                    })
+        self.counts['disappeared'] = len(disappeared)
+        return disappeared
+
+    def snapshot(self):
+        """Next run's snapshot: this run's searches, plus unvisited listings of cut-short ones"""
+        snapshot = dict(self.previous)
+        for key, current in self._current.items():
+            if key in self._truncated:
+                snapshot[key] = {**self.previous.get(key, {}), **current}
+            else:
+                snapshot[key] = current
+        return snapshot
+
+    async def persist(self):
+        """Save the in-progress state if it changed (called from CrawlCheckpoint.flush)"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            await Actor.set_value(STATE_KEY, {
+                'current': self._current, 'labels': self._labels, 'truncated': sorted(self._truncated),
+            })
+        except BaseException:
+            # The checkpoint retries the flush; keep the state for it
+            self._dirty = True
+            raise
+
+    async def close(self):
+        """Write the new snapshot for the next run (a shard writes its part for the merge)"""
+        await self.persist()
+        if self.shard_index is not None:
+            await self.store.set_value(SHARD_KEY.format(self.shard_index), {
+                'current': self._current, 'truncated': sorted(self._truncated),
+            })
+        else:
+            await self.store.set_value(SNAPSHOT_KEY, self.snapshot())
+
+    def stats(self):
+        return {**self.counts, 'searchesStoppedEarly': self.stopped_early}
+
+
+def merge_snapshots(previous, parts):
+    """The next snapshot from the shards' parts (None for a shard whose part is missing).
+
+    A search's listings are the union of what the shards saw. Where a shard cut the
+    search short or saved no part at all, the previous snapshot's unseen listings are
+    carried over, as for a cut-short search in an unsharded run.
+    """
+    complete = all(part is not None for part in parts)
+    combined = {}
+    truncated = set()
+    for part in parts:
+        if part is None:
+            continue
+        truncated.update(part['truncated'])
+        for key, current in part['current'].items():
+            combined.setdefault(key, {}).update(current)
+
+    snapshot = dict(previous)
+    for key, current in combined.items():
+        if key in truncated or not complete:
+            snapshot[key] = {**previous.get(key, {}), **current}
+        else:
+            snapshot[key] = current
+    return snapshot
+
+
+async def merge_shard_snapshots(shard_count):
+    """Merge the shards' snapshot parts into the next run's snapshot and drop the parts"""
+    store = await Actor.open_key_value_store(name=SNAPSHOT_STORE)
+    parts = [await store.get_value(SHARD_KEY.format(index)) for index in range(shard_count)]
+    missing = [index for index, part in enumerate(parts) if part is None]
+    if len(missing) == shard_count:
+        logging.warning("No shard saved an incremental snapshot - keeping the previous one")
+        return {'shardsMerged': 0, 'shardsMissing': missing}
+    if missing:
+        logging.warning(f"Shards {missing} saved no incremental snapshot - their listings are carried over")
+
+    snapshot = merge_snapshots(await store.get_value(SNAPSHOT_KEY) or {}, parts)
+    await store.set_value(SNAPSHOT_KEY, snapshot)
+    for index in range(shard_count):
+        if parts[index] is not None:
+            await store.set_value(SHARD_KEY.format(index), None)
+    logging.info(f"Merged {shard_count - len(missing)} shard snapshots: {len(snapshot)} searches")
+    return {'shardsMerged': shard_count - len(missing), 'shardsMissing': missing, 'searches': len(snapshot)}
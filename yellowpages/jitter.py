@@ -0,0 +1,31 @@
+"""
+Optional human-like delay between page actions.
+
+Kept separate from readiness detection so it is an explicit, tunable policy rather than a
+latency floor on every page. Disabled by default.
+"""
+
+import asyncio
+import random
+
+
+class JitterPolicy:
+    def __init__(self, min_delay=0.0, max_delay=0.0):
+        self.min_delay = max(0.0, min_delay)
+        self.max_delay = max(self.min_delay, max_delay)
+
+    @classmethod
+    def from_input(cls, actor_input):
+        """Build a policy from the Actor input (humanDelayMinSecs, humanDelayMaxSecs)"""
+        return cls(
+            min_delay=float(actor_input.get('humanDelayMinSecs', 0)),
+            max_delay=float(actor_input.get('humanDelayMaxSecs', 0)),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_delay > 0
+
+    async def sleep(self):
+        if self.enabled:
+            await asyncio.sleep(random.uniform(self.min_delay, self.max_delay))
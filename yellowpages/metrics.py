@@ -0,0 +1,221 @@
+"""
+Per-stage timings and counters for a run, saved as the RUN_STATS record.
+
+Every engine times the same stages, so runs can be compared and concurrency tuned from
+data rather than from log lines:
+- rateLimit: waiting for the per-host/per-proxy rate limiter
+- fetch: an HTTP request including its body (HTTP engines)
+- navigate: page.goto plus the readiness wait (Playwright)
+- challenge: Cloudflare interstitial handling
+- jitter: configured human-like pauses
+- extract: in-page listing extraction (page.evaluate)
+- parse: lxml parsing of a fetched page
+- push: handing a page's listings to the dataset writer, backpressure included
+- datasetBatch: one batched push_data call to the platform
+
+Counters cover fetches, pages loaded, cache hits, blocks by reason (every
+report_overload() lands here too) and Cloudflare challenges, plus the bytes of results
+pages received. Latencies go into fixed log-spaced histograms, so memory stays constant
+however long the run.
+
+Code records through the module-level functions (count, observe, stage, add_bytes,
+record_block), which go to the run's RunMetrics once it is started - the same way
+report_overload() reaches the concurrency slot without the limiter being passed down.
+They are thread-safe, so the requests engine's worker threads can use them too.
+RUN_STATS is rewritten every metricsIntervalSecs while the run goes and once more at the
+end, with final set.
+"""
+
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from apify import Actor
+
+STATS_KEY = 'RUN_STATS'
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000, 120000)
+
+_active = None
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, secs):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, secs * 1000)] += 1
+        self.count += 1
+        self.total += secs
+        self.max = max(self.max, secs)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, in ms (capped at the max seen)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, bucket in zip(BUCKET_BOUNDS_MS + (None,), self.counts):
+            seen += bucket
+            if seen >= rank:
+                break
+        max_ms = self.max * 1000
+        return round(min(bound, max_ms) if bound is not None else max_ms, 1)
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'totalSecs': round(self.total, 3),
+            'meanMs': round(self.total / self.count * 1000, 1) if self.count else None,
+            'p50Ms': self.percentile(0.50),
+            'p95Ms': self.percentile(0.95),
+            'p99Ms': self.percentile(0.99),
+            'maxMs': round(self.max * 1000, 1),
+        }
+
+
+class RunMetrics:
+    def __init__(self, interval_secs=60):
+        self.interval_secs = interval_secs
+        self.counters = {}
+        self.stages = {}
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.snapshots = 0
+
+        self._lock = threading.Lock()
+        self._stats = None
+        self._task = None
+
+    @classmethod
+    def from_input(cls, actor_input):
+        """Build the metrics from the Actor input (metricsIntervalSecs 0 saves only the final record)"""
+        return cls(interval_secs=actor_input.get('metricsIntervalSecs', 60))
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, stage, secs):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = LatencyHistogram()
+            histogram.observe(secs)
+
+    def add_bytes(self, n):
+        with self._lock:
+            self.bytes += n
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            counters = dict(self.counters)
+            stages = {name: histogram.snapshot() for name, histogram in sorted(self.stages.items())}
+            received = self.bytes
+
+        fetches = counters.get('fetches', 0)
+        return {
+            'elapsedSecs': round(elapsed, 1),
+            'counters': counters,
+            'stages': stages,
+            'bytesReceived': received,
+            'rates': {
+                'pagesPerMin': round(counters.get('pages', 0) / elapsed * 60, 1) if elapsed else 0.0,
+                'mbPerMin': round(received / 1024 / 1024 / elapsed * 60, 2) if elapsed else 0.0,
+                'blockRate': round(counters.get('blocked', 0) / fetches, 4) if fetches else None,
+                'challengeRate': round(counters.get('challenges', 0) / fetches, 4) if fetches else None,
+            },
+        }
+
+    def start(self, stats=None):
+        """Make this the run's metrics and save RUN_STATS periodically.
+
+        stats is an optional callable returning the other components' stats() to save
+        alongside the metrics.
+        """
+        global _active
+        _active = self
+        self._stats = stats
+        if self.interval_secs:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_secs)
+            try:
+                await self.save(self._stats() if self._stats else None)
+            except Exception as e:
+                logging.warning(f"Saving {STATS_KEY} failed: {e}")
+
+    async def save(self, stats=None, final=False):
+        self.snapshots += 1
+        await Actor.set_value(STATS_KEY, {
+            **(stats or {}),
+            'metrics': self.snapshot(),
+            'final': final,
+            'updatedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        })
+
+    async def close(self, stats=None):
+        """Stop the periodic saves and write the final record (stats defaults to the start() callable)"""
+        global _active
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if stats is None and self._stats is not None:
+            stats = self._stats()
+        await self.save(stats, final=True)
+        self.log_summary()
+        if _active is self:
+            _active = None
+
+    def log_summary(self):
+        snapshot = self.snapshot()
+        for name, stage in snapshot['stages'].items():
+            logging.info(
+                f"Stage {name}: {stage['count']} x, {stage['totalSecs']}s total, "
+                f"p50 {stage['p50Ms']}ms, p95 {stage['p95Ms']}ms, max {stage['maxMs']}ms"
+            )
+        logging.info(f"Counters: {snapshot['counters']}, rates: {snapshot['rates']}")
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
+
+
+def observe(stage_name, secs):
+    if _active is not None:
+        _active.observe(stage_name, secs)
+
+
+def add_bytes(n):
+    if _active is not None:
+        _active.add_bytes(n)
+
+
+def record_block(reason):
+    """Count a blocked or failed fetch, overall and by reason"""
+    if _active is not None:
+        _active.count('blocked')
+        _active.count(f"blocked.{reason}")
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one observation of a stage (also across awaits)"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - started)
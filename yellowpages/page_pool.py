@@ -0,0 +1,110 @@
+"""
+Warm pool of Playwright pages.
+
+Pages are created and stealth-scripted up front, leased per job and recycled after a
+number of uses, so page creation stays off the hot path.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+STEALTH_SCRIPT = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined});"
+
+
+class PagePool:
+    def __init__(self, context, size, max_uses=50, init_script=STEALTH_SCRIPT):
+        self.context = context
+        self.size = size
+        self.max_uses = max_uses
+        self.init_script = init_script
+
+        self._idle = asyncio.Queue()
+        self._replacements = set()
+        self._closed = False
+
+        self.leases = 0
+        self.lease_wait_total = 0.0
+        self.lease_wait_max = 0.0
+        self.pages_created = 0
+        self.pages_recycled = 0
+
+    async def start(self):
+        """Create all pages up front"""
+        pages = await asyncio.gather(*[self._new_page() for _ in range(self.size)])
+        for page in pages:
+            self._idle.put_nowait((page, 0))
+        logging.info(f"Page pool ready: {self.size} pages (recycled every {self.max_uses} uses)")
+        return self
+
+    async def _new_page(self):
+        page = await self.context.new_page()
+        if self.init_script:
+            await page.add_init_script(self.init_script)
+        self.pages_created += 1
+        return page
+
+    @asynccontextmanager
+    async def lease(self):
+        """Borrow a page for one job. Pages that raised or hit max_uses are replaced."""
+        started = time.monotonic()
+        page, uses = await self._idle.get()
+        waited = time.monotonic() - started
+        self.leases += 1
+        self.lease_wait_total += waited
+        self.lease_wait_max = max(self.lease_wait_max, waited)
+
+        healthy = False
+        try:
+            yield page
+            healthy = True
+        finally:
+            uses += 1
+            if healthy and uses < self.max_uses and not page.is_closed():
+                self._idle.put_nowait((page, uses))
+            else:
+                self._recycle(page)
+
+    def _recycle(self, page):
+        """Close a worn-out page and create its replacement in the background"""
+        self.pages_recycled += 1
+
+        async def replace():
+            try:
+                await page.close()
+            except Exception:
+                pass
+            # Keep trying so the pool never shrinks for good
+            while not self._closed:
+                try:
+                    self._idle.put_nowait((await self._new_page(), 0))
+                    return
+                except Exception as e:
+                    logging.error(f"Page pool: could not create replacement page: {e}")
+                    await asyncio.sleep(1)
+
+        task = asyncio.create_task(replace())
+        self._replacements.add(task)
+        task.add_done_callback(self._replacements.discard)
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._replacements):
+            task.cancel()
+        while not self._idle.empty():
+            page, _ = self._idle.get_nowait()
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'leases': self.leases,
+            'leaseWaitAvgMs': round(1000 * self.lease_wait_total / self.leases, 1) if self.leases else 0,
+            'leaseWaitMaxMs': round(1000 * self.lease_wait_max, 1),
+            'pagesCreated': self.pages_created,
+            'pagesRecycled': self.pages_recycled,
+        }
@@ -0,0 +1,121 @@
+"""
+Pagination planning with early termination.
+
+The first page's "Showing X-Y of N" count gives an upper bound on pages; the real end
+is often earlier. Pages are dispatched in a sliding window per search, and the window
+stops moving once a page comes back short (fewer than 30 listings), empty, or identical
+to its neighbour - so at most a window's worth of requests goes past the real end.
+
+Pages another run owns or that were finished before a restart are skipped with the
+optional skip(key, page_num) predicate; they count as done without taking a window slot.
+"""
+
+from yellowpages.parsing import RESULTS_PER_PAGE
+
+MAX_PAGES_PER_SEARCH = 100
+
+
+def page_fingerprint(listings):
+    return frozenset((listing['name'], listing['phone'], listing['address']) for listing in listings)
+
+
+class _Search:
+    __slots__ = ('last', 'end', 'frontier', 'fingerprints')
+
+    def __init__(self, last):
+        self.last = last
+        self.end = last
+        self.frontier = 1
+        self.fingerprints = {}
+
+
+class PaginationTracker:
+    def __init__(self, max_pages, window=10, skip=None):
+        self.max_pages = min(max_pages, MAX_PAGES_PER_SEARCH)
+        self.window = max(1, window)
+        self.skip = skip
+        self._searches = {}
+
+        self.stopped_early = 0
+        self.duplicate_pages = 0
+
+    def start(self, key, total_pages, first_page_listings=None):
+        """Register a search after its first page. Returns the first batch of pages to dispatch"""
+        search = self._searches[key] = _Search(min(total_pages, self.max_pages))
+        if first_page_listings is not None:
+            search.fingerprints[1] = page_fingerprint(first_page_listings)
+        return self._advance(key, search, self.window)
+
+    def tracks(self, key):
+        return key in self._searches
+
+    def should_fetch(self, key, page_num):
+        """False once the search is known to end before page_num"""
+        search = self._searches.get(key)
+        return search is None or page_num <= search.end
+
+    def complete(self, key, page_num, listings):
+        """Record a finished page. listings is None when the fetch failed.
+
+        Returns (keep, next_pages): keep is False when the page repeats its neighbour and
+        its listings should be dropped; next_pages are the pages to dispatch next.
+        """
+        search = self._searches.get(key)
+        if search is None:
+            return True, []
+
+        keep = True
+        if listings is not None:
+            fingerprint = page_fingerprint(listings)
+            search.fingerprints[page_num] = fingerprint
+            old_end = search.end
+
+            if not listings:
+                search.end = min(search.end, page_num - 1)
+            elif fingerprint == search.fingerprints.get(page_num - 1):
+                # Past the real end YP keeps serving the last page again
+                search.end = min(search.end, page_num - 1)
+                self.duplicate_pages += 1
+                keep = False
+            else:
+                if fingerprint == search.fingerprints.get(page_num + 1):
+                    search.end = min(search.end, page_num)
+                    self.duplicate_pages += 1
+                if len(listings) < RESULTS_PER_PAGE:
+                    search.end = min(search.end, page_num)
+
+            if search.end < old_end and old_end == search.last:
+                self.stopped_early += 1
+
+        return keep, self._advance(key, search, 1)
+
+    def stop(self, key, page_num):
+        """End a search after page_num (e.g. nothing has changed since the last run).
+
+        Returns True if that cut the search short; pages already dispatched past it are
+        skipped by should_fetch.
+        """
+        search = self._searches.get(key)
+        if search is None or page_num >= search.end:
+            return False
+        if search.end == search.last:
+            self.stopped_early += 1
+        search.end = page_num
+        return True
+
+    def _advance(self, key, search, count):
+        pages = []
+        while count > 0 and search.frontier < search.end:
+            search.frontier += 1
+            if self.skip is not None and self.skip(key, search.frontier):
+                continue
+            pages.append(search.frontier)
+            count -= 1
+        return pages
+
+    def stats(self):
+        return {
+            'searches': len(self._searches),
+            'stoppedEarly': self.stopped_early,
+            'duplicatePages': self.duplicate_pages,
+        }
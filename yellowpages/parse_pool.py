@@ -0,0 +1,95 @@
+"""
+Process-pool stage for HTML parsing.
+
+Parsing a 300-500KB results page blocks the event loop, so the async engines hand raw
+response bytes to a bounded pool of worker processes and get compact listing tuples back.
+Listing dicts are rebuilt in the parent, where the search metadata lives.
+
+Workers are started by a forkserver (spawn where there is none), never forked from the
+engine itself: by the time the pool starts, the engine has a running event loop and
+threads, and a fork copies their locks in whatever state they are in. The pool is sized
+to the CPUs this process may actually use, not the host's.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from yellowpages.parsing import listing_from_row, parse_listing_rows, parse_total_pages
+
+
+def _parse_in_worker(html, with_total_pages):
+    # Results pages are UTF-8; decode here so lxml doesn't have to guess from the bytes
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', 'replace')
+    rows = parse_listing_rows(html)
+    total_pages = parse_total_pages(html) if with_total_pages else None
+    return rows, total_pages
+
+
+# Default worker count ceiling: past a few workers, parsing stops being the bottleneck
+MAX_DEFAULT_WORKERS = 4
+
+
+def available_cpus():
+    """CPUs this process may use: its affinity mask, further limited by a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def _worker_context():
+    # The entry points only start the Actor under __main__, so re-importing them is safe
+    try:
+        context = multiprocessing.get_context('forkserver')
+    except ValueError:
+        return multiprocessing.get_context('spawn')
+    # Workers fork from a server that already has lxml and the parsers loaded
+    context.set_forkserver_preload(['yellowpages.parsing'])
+    return context
+
+
+class ParsePool:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = min(available_cpus(), MAX_DEFAULT_WORKERS) if workers is None else workers
+        self._executor = None
+        if self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_worker_context())
+
+        # Bound in-flight pages so fetchers feel backpressure when parsing falls behind
+        self._slots = asyncio.Semaphore(max_pending or max(1, self.workers) * 2)
+
+        self.pages = 0
+
+    @classmethod
+    def from_input(cls, actor_input):
+        """Build a pool from the Actor input (parseWorkers: unset = one per usable CPU up to 4, 0 = parse inline)"""
+        return cls(workers=actor_input.get('parseWorkers'))
+
+    async def parse(self, html, keyword, location, timezone, with_total_pages=False):
+        """Parse raw page bytes. Returns (listings, total_pages); total_pages is None unless requested"""
+        async with self._slots:
+            if self._executor is None:
+                rows, total_pages = _parse_in_worker(html, with_total_pages)
+            else:
+                loop = asyncio.get_running_loop()
+                rows, total_pages = await loop.run_in_executor(self._executor, _parse_in_worker, html, with_total_pages)
+
+        self.pages += 1
+        return [listing_from_row(row, keyword, location, timezone) for row in rows], total_pages
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            logging.info(f"Parse pool closed after {self.pages} pages")
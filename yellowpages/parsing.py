@@ -0,0 +1,155 @@
+"""
+HTML parsing for the HTTP-based scrapers: listing extraction, page counting and block detection.
+
+Extraction uses lxml (libxml2) with precompiled XPath expressions and returns the same
+listing dicts as the old BeautifulSoup html.parser loop.
+"""
+
+import logging
+import math
+import re
+
+import lxml.html
+from lxml import etree
+
+RESULTS_PER_PAGE = 30
+MAX_LISTINGS_PER_PAGE = 40
+
+SHOWING_COUNT_RE = re.compile(r'Showing\s+\d+\s*-\s*\d+\s+of\s+([\d,]+)', re.I)
+DATA_PAGE_RE = re.compile(r'data-page="(\d+)"')
+NON_DIGIT_RE = re.compile(r'\D')
+CHALLENGE_MARKERS = ('<title>just a moment', 'cf-chl-', 'challenge-platform', 'cf_chl_opt')
+
+
+def _has_class(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+# Listing containers: div.result, falling back to any div whose class mentions "result"
+RESULTS_XP = etree.XPath(f'//div[{_has_class("result")}]')
+RESULTS_FALLBACK_XP = etree.XPath('//div[contains(@class, "result")]')
+
+# Fields, relative to one listing (first match wins)
+NAME_XP = etree.XPath(f'(.//a[{_has_class("business-name")}])[1]')
+NAME_FALLBACK_XP = etree.XPath('(.//h2)[1]')
+PHONE_XP = etree.XPath(f'(.//div[{_has_class("phones")}])[1]')
+ADDRESS_XP = etree.XPath(f'(.//div[{_has_class("street-address")}])[1]')
+CATEGORIES_XP = etree.XPath(f'(.//div[{_has_class("categories")}])[1]')
+HREFS_XP = etree.XPath('.//a/@href')
+
+
+def _text(element):
+    """Text of an element with each piece stripped and joined, like get_text(strip=True)"""
+    if element is None:
+        return ''
+    return ''.join(piece.strip() for piece in element.itertext())
+
+
+def _first(xpath, element):
+    found = xpath(element)
+    return found[0] if found else None
+
+
+def _is_empty(element):
+    return element is None or (not element.text and len(element) == 0)
+
+
+def parse_listing_rows(html):
+    """Extract compact (name, phone, address, website, category) tuples from a results page (str or bytes)"""
+    try:
+        root = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError) as e:
+        logging.warning(f"Could not parse results page: {e}")
+        return []
+
+    results = RESULTS_XP(root) or RESULTS_FALLBACK_XP(root)
+
+    rows = []
+    for result in results[:MAX_LISTINGS_PER_PAGE]:
+        try:
+            # Name
+            name_elem = _first(NAME_XP, result)
+            if _is_empty(name_elem):
+                name_elem = _first(NAME_FALLBACK_XP, result)
+            name = _text(name_elem)
+            if not name:
+                continue
+
+            # Phone
+            phone = NON_DIGIT_RE.sub('', _text(_first(PHONE_XP, result)))
+
+            # Website - first external link
+            website = ''
+            for href in HREFS_XP(result):
+                if 'http' in href and 'yellowpages.com' not in href:
+                    website = href
+                    break
+
+            rows.append((
+                name,
+                phone if len(phone) >= 10 else '',
+                _text(_first(ADDRESS_XP, result)),
+                website,
+                _text(_first(CATEGORIES_XP, result)),
+            ))
+
+        except Exception as e:
+            logging.warning(f"Error extracting listing: {e}")
+            continue
+
+    return rows
+
+
+def listing_from_row(row, keyword, location, timezone):
+    name, phone, address, website, category = row
+    return {
+        'name': name,
+        'phone': phone,
+        'address': address,
+        'website': website,
+        'category': category,
+        'keyword': keyword,
+        'location': location,
+        'timezone': timezone,
+        'status': 'Lead',
+    }
+
+
+def parse_listings(html, keyword, location, timezone):
+    """Extract listing dicts from a results page (str or bytes)"""
+    return [listing_from_row(row, keyword, location, timezone) for row in parse_listing_rows(html)]
+
+
+def _as_text(html):
+    return html.decode('utf-8', 'replace') if isinstance(html, bytes) else html
+
+
+def parse_total_pages(html):
+    """Work out how many results pages a search has from its first page (0 = no results)"""
+    html = _as_text(html)
+
+    # "Showing 1-30 of 103"
+    match = SHOWING_COUNT_RE.search(html)
+    if match:
+        total_results = int(match.group(1).replace(',', ''))
+        return math.ceil(total_results / RESULTS_PER_PAGE)
+
+    # Highest page number in the pagination links
+    page_numbers = [int(n) for n in DATA_PAGE_RE.findall(html)]
+    if page_numbers:
+        return max(page_numbers)
+
+    # Single page or no results at all
+    if 'class="result' in html or 'organic-listing' in html:
+        return 1
+    return 0
+
+
+def looks_blocked(status, html):
+    """True when a response is a block, rate limit or Cloudflare interstitial rather than a results page"""
+    if status in (403, 429, 503):
+        return True
+    if status != 200 or len(html) < 1000:
+        return True
+    head = _as_text(html[:5000]).lower()
+    return any(marker in head for marker in CHALLENGE_MARKERS)
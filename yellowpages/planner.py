@@ -0,0 +1,200 @@
+"""
+Cost-aware search scheduling (largest searches first).
+
+Run time with many keyword x location combos is set by the few huge searches; if they
+start late, the pool sits mostly idle while they finish. The planner orders the shared
+work queue longest-processing-time first:
+
+- page-1 jobs are cheap probes and always run before result pages; among them, searches
+  with the biggest known page counts go first (unknown searches count as biggest)
+- result pages are ordered by their search's page count, biggest first
+
+Page counts come from the probes and from a cache of earlier runs' counts kept in a
+named key-value store, along with the mean page time used to predict durations. At the
+end the plan is logged with predicted versus actual work per search.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import time
+
+CACHE_STORE = 'yellowpages-planner'
+CACHE_KEY = 'PAGE_COUNTS'
+DEFAULT_PAGE_SECS = 3.0
+
+
+class _Search:
+    __slots__ = ('cached_pages', 'predicted_pages', 'pages', 'started', 'finished', 'done', 'busy_secs')
+
+    def __init__(self, cached_pages, max_pages):
+        self.cached_pages = cached_pages
+        self.predicted_pages = min(cached_pages, max_pages) if cached_pages is not None else None
+        self.pages = cached_pages
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.busy_secs = 0.0
+
+
+class SearchPlanner:
+    def __init__(self, workers, cache=None, max_pages=100):
+        self.workers = max(1, workers)
+        self.max_pages = max_pages
+        cache = cache or {}
+        self.cached_counts = cache.get('counts', {})
+        self.page_secs = cache.get('pageSecs') or DEFAULT_PAGE_SECS
+
+        self._queue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._searches = {}
+        self._started = None
+
+        # Retries waiting out their backoff: their failed attempt's task_done() is held back
+        # until the retry is queued, so the queue's join() keeps counting them
+        self._deferred = 0
+
+    @staticmethod
+    def cache_key(keyword, location):
+        return f"{keyword.strip().lower()}|{location.strip().lower()}"
+
+    @classmethod
+    async def load(cls, store, workers, max_pages=100):
+        """Build a planner seeded with page counts cached by earlier runs (store may be None)"""
+        cache = await store.get_value(CACHE_KEY) if store is not None else None
+        return cls(workers, cache, max_pages)
+
+    async def save(self, store):
+        """Write this run's page counts and mean page time back to the cache"""
+        counts = dict(self.cached_counts)
+        for (keyword, location), search in self._searches.items():
+            if search.pages is not None:
+                counts[self.cache_key(keyword, location)] = search.pages
+
+        busy = sum(s.busy_secs for s in self._searches.values())
+        done = sum(s.done for s in self._searches.values())
+        await store.set_value(CACHE_KEY, {
+            'counts': counts,
+            'pageSecs': busy / done if done else self.page_secs,
+        })
+
+    def _search(self, keyword, location):
+        key = (keyword, location)
+        search = self._searches.get(key)
+        if search is None:
+            search = self._searches[key] = _Search(self.cached_counts.get(self.cache_key(keyword, location)), self.max_pages)
+        return search
+
+    def observe(self, keyword, location, total_pages):
+        """Record a search's real page count from its first page"""
+        search = self._search(keyword, location)
+        search.pages = total_pages
+        if search.predicted_pages is None:
+            search.predicted_pages = min(total_pages, self.max_pages)
+
+    def put(self, keyword, location, page_num, job):
+        """Queue a job; the planner decides when it runs"""
+        search = self._search(keyword, location)
+        pages = math.inf if search.pages is None else min(search.pages, self.max_pages)
+        phase = 0 if page_num == 1 else 1
+        self._queue.put_nowait(((phase, -pages, page_num), next(self._order), job))
+
+    def put_later(self, delay, keyword, location, page_num, job):
+        """Queue a job after delay seconds (a retry backing off)"""
+        self._deferred += 1
+        asyncio.get_running_loop().call_later(delay, self._release, keyword, location, page_num, job)
+
+    def _release(self, keyword, location, page_num, job):
+        self.put(keyword, location, page_num, job)
+        # The retry is queued - now the failed attempt may count as done
+        self._queue.task_done()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    async def get(self):
+        _, _, job = await self._queue.get()
+        if self._started is None:
+            self._started = time.monotonic()
+        return job
+
+    def task_done(self, keyword, location, elapsed):
+        """Mark a job finished; elapsed is the job's run time in seconds (0 for skipped jobs)"""
+        if self._deferred:
+            # Held back for a retry in backoff; _release() calls it once the retry is queued
+            self._deferred -= 1
+        else:
+            self._queue.task_done()
+        if not elapsed:
+            return
+
+        search = self._search(keyword, location)
+        now = time.monotonic()
+        if search.started is None:
+            search.started = now - elapsed
+        search.finished = now
+        search.done += 1
+        search.busy_secs += elapsed
+
+    async def join(self):
+        """Wait until every job, retries in backoff included, is done"""
+        await self._queue.join()
+
+    def log_plan(self):
+        """Log the planned order before the run (known page counts only)"""
+        known = sorted(
+            ((s.pages, key) for key, s in self._searches.items() if s.pages is not None),
+            key=lambda item: -item[0],
+        )
+        unknown = len(self._searches) - len(known)
+        logging.info(
+            f"Plan: {len(self._searches)} searches ({len(known)} with cached page counts, {unknown} to probe), "
+            f"~{self.page_secs:.1f}s per page across {self.workers} workers"
+        )
+        for pages, (keyword, location) in known[:10]:
+            logging.info(f"Plan: '{keyword}' in {location} - {pages} pages, ~{min(pages, self.max_pages) * self.page_secs:.0f}s of work")
+
+    def report(self):
+        """Predicted vs actual work per search, biggest first"""
+        rows = []
+        for (keyword, location), search in self._searches.items():
+            predicted_pages = search.predicted_pages
+            rows.append({
+                'keyword': keyword,
+                'location': location,
+                'countSource': 'cache' if search.cached_pages is not None else 'probe',
+                'predictedPages': predicted_pages,
+                'predictedSecs': round(predicted_pages * self.page_secs, 1) if predicted_pages is not None else None,
+                'pages': search.done,
+                'workSecs': round(search.busy_secs, 1),
+                'wallSecs': round(search.finished - search.started, 1) if search.started is not None else 0.0,
+            })
+        rows.sort(key=lambda row: -row['workSecs'])
+
+        total_work = sum(row['workSecs'] for row in rows)
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        summary = {
+            'searches': len(rows),
+            'cachedCounts': sum(1 for row in rows if row['countSource'] == 'cache'),
+            'predictedMakespanSecs': round(sum(row['predictedSecs'] or 0 for row in rows) / self.workers, 1),
+            'lowerBoundSecs': round(total_work / self.workers, 1),
+            'actualSecs': round(elapsed, 1),
+            'searchesByWork': rows,
+        }
+        return summary
+
+    def log_report(self):
+        summary = self.report()
+        logging.info(
+            f"Plan vs actual: {summary['actualSecs']}s elapsed, "
+            f"predicted {summary['predictedMakespanSecs']}s, "
+            f"{summary['lowerBoundSecs']}s ideal for the work done"
+        )
+        for row in summary['searchesByWork'][:10]:
+            predicted = f"{row['predictedPages']} pages / {row['predictedSecs']}s ({row['countSource']})" if row['predictedPages'] is not None else "unknown"
+            logging.info(
+                f"  '{row['keyword']}' in {row['location']}: predicted {predicted}, "
+                f"actual {row['pages']} pages / {row['workSecs']}s work / {row['wallSecs']}s wall"
+            )
+        return summary
@@ -0,0 +1,107 @@
+"""
+Token-bucket rate limiting per target host and per proxy identity.
+
+Every fetch path calls wait() (async) or wait_blocking() (threads) before a request.
+Buckets hand out reservations, so a caller only sleeps for as long as the configured
+rate actually requires - no fixed pauses when there is budget left.
+
+The per-proxy limit is for sticky proxy sessions, where one identity is one IP. Callers
+pass no proxy for rotating proxy URLs and direct connections: every request there
+leaves from a different IP (or from ours), and one shared bucket would cap the whole
+engine at the per-proxy rate.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Take one token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    def __init__(self, host_per_minute=600, host_burst=20, proxy_per_minute=120, proxy_burst=4, jitter_secs=0.0):
+        self.host_rate = host_per_minute / 60 if host_per_minute else None
+        self.host_burst = host_burst
+        self.proxy_rate = proxy_per_minute / 60 if proxy_per_minute else None
+        self.proxy_burst = proxy_burst
+        self.jitter_secs = jitter_secs
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.delayed = 0
+        self.total_delay = 0.0
+
+    @classmethod
+    def from_input(cls, actor_input):
+        """Build a limiter from the Actor input (0 disables a limit)"""
+        return cls(
+            host_per_minute=actor_input.get('maxRequestsPerMinute', 600),
+            host_burst=actor_input.get('requestBurst', 20),
+            proxy_per_minute=actor_input.get('maxRequestsPerMinutePerProxy', 120),
+            proxy_burst=actor_input.get('proxyRequestBurst', 4),
+            jitter_secs=actor_input.get('requestJitterMs', 0) / 1000,
+        )
+
+    def _bucket(self, key, rate, burst):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def reserve(self, url, proxy=None):
+        """Reserve one request against the host bucket and, for a sticky proxy session, its bucket.
+
+        Returns the delay in seconds.
+        """
+        host = urlsplit(url).hostname or ''
+        delay = 0.0
+        with self._lock:
+            if self.host_rate:
+                delay = self._bucket(('host', host), self.host_rate, self.host_burst).reserve()
+            if self.proxy_rate and proxy is not None:
+                proxy_delay = self._bucket(('proxy', proxy), self.proxy_rate, self.proxy_burst).reserve()
+                delay = max(delay, proxy_delay)
+
+            if self.jitter_secs:
+                delay += random.uniform(0, self.jitter_secs)
+
+            self.requests += 1
+            if delay > 0:
+                self.delayed += 1
+                self.total_delay += delay
+        return delay
+
+    async def wait(self, url, proxy=None):
+        delay = self.reserve(url, proxy)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait_blocking(self, url, proxy=None):
+        delay = self.reserve(url, proxy)
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'delayed': self.delayed,
+            'totalDelaySecs': round(self.total_delay, 1),
+        }
@@ -0,0 +1,44 @@
+"""
+Page readiness detection for the Playwright scrapers.
+
+Instead of waiting for networkidle plus a fixed sleep, navigate with domcontentloaded and
+return as soon as the DOM has something we can act on: listing nodes, a pagination marker,
+a "no results" message or a Cloudflare interstitial.
+"""
+
+import logging
+
+LISTING_SELECTOR = '.result, [data-testid="organic-listing"]'
+PAGINATION_SELECTOR = '.pagination'
+NO_RESULTS_SELECTOR = '.no-results, #no-results-main'
+
+DEFAULT_READY_TIMEOUT = 15000
+
+# Resolves with the first readiness state found in the DOM, polled every animation frame
+READY_STATE_JS = """
+    (selectors) => {
+        if (document.title.toLowerCase().includes('just a moment')) return 'challenge';
+        if (document.querySelector(selectors.listings)) return 'listings';
+        if (document.querySelector(selectors.noResults)) return 'empty';
+        if (document.querySelector(selectors.pagination)) return 'pagination';
+        return false;
+    }
+"""
+
+
+async def wait_until_ready(page, timeout=DEFAULT_READY_TIMEOUT):
+    """Wait until the results page is usable.
+
+    Returns 'listings', 'pagination', 'empty', 'challenge', or 'timeout' if none showed up.
+    """
+    selectors = {
+        'listings': LISTING_SELECTOR,
+        'pagination': PAGINATION_SELECTOR,
+        'noResults': NO_RESULTS_SELECTOR,
+    }
+    try:
+        handle = await page.wait_for_function(READY_STATE_JS, arg=selectors, timeout=timeout)
+        return await handle.json_value()
+    except Exception as e:
+        logging.debug(f"Readiness wait ended without a match: {e}")
+        return 'timeout'
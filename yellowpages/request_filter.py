@@ -0,0 +1,133 @@
+"""
+Request interception for the Playwright scrapers.
+
+Aborts requests for resources we never read (images, fonts, media, ads, trackers) so they
+don't go through the residential proxy, and keeps count of what was blocked and allowed.
+"""
+
+import logging
+from urllib.parse import urlsplit
+
+DEFAULT_BLOCKED_RESOURCE_TYPES = ['image', 'font', 'media']
+
+# Ad, analytics and tracking hosts seen on yellowpages.com results pages
+DEFAULT_BLOCKED_DOMAINS = [
+    'doubleclick.net',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'google-analytics.com',
+    'googletagmanager.com',
+    'googletagservices.com',
+    'adnxs.com',
+    'amazon-adsystem.com',
+    'criteo.com',
+    'criteo.net',
+    'pubmatic.com',
+    'rubiconproject.com',
+    'casalemedia.com',
+    'moatads.com',
+    'scorecardresearch.com',
+    'quantserve.com',
+    'demdex.net',
+    'omtrdc.net',
+    'krxd.net',
+    'facebook.net',
+    'facebook.com',
+    'bat.bing.com',
+    'hotjar.com',
+    'nr-data.net',
+    'taboola.com',
+    'outbrain.com',
+]
+
+# Never blocked - Cloudflare needs these to issue clearance cookies
+DEFAULT_ALLOWED_DOMAINS = [
+    'challenges.cloudflare.com',
+]
+
+# Typical transfer size per resource type, used to estimate what blocking saved
+ESTIMATED_BYTES_BY_TYPE = {
+    'image': 25_000,
+    'font': 40_000,
+    'media': 250_000,
+    'stylesheet': 30_000,
+    'script': 60_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+
+def _matches_domain(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class RequestFilter:
+    def __init__(self, blocked_resource_types=None, blocked_domains=None, allowed_domains=None, enabled=True):
+        self.enabled = enabled
+        self.blocked_resource_types = set(
+            DEFAULT_BLOCKED_RESOURCE_TYPES if blocked_resource_types is None else blocked_resource_types
+        )
+        self.blocked_domains = [d.lower() for d in (DEFAULT_BLOCKED_DOMAINS if blocked_domains is None else blocked_domains)]
+        self.allowed_domains = [d.lower() for d in DEFAULT_ALLOWED_DOMAINS + list(allowed_domains or [])]
+
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+        self.blocked_requests = 0
+        self.blocked_bytes_estimated = 0
+        self.blocked_by_type = {}
+
+    @classmethod
+    def from_input(cls, actor_input):
+        """Build a filter from the Actor input (blockResources, blockedResourceTypes, blockedDomains, allowedDomains)"""
+        return cls(
+            blocked_resource_types=actor_input.get('blockedResourceTypes'),
+            blocked_domains=DEFAULT_BLOCKED_DOMAINS + list(actor_input.get('blockedDomains', [])),
+            allowed_domains=actor_input.get('allowedDomains', []),
+            enabled=actor_input.get('blockResources', True),
+        )
+
+    def should_block(self, url, resource_type):
+        """Decide whether a request should be aborted. Allowed domains always win."""
+        host = (urlsplit(url).hostname or '').lower()
+        if _matches_domain(host, self.allowed_domains):
+            return False
+        if resource_type in self.blocked_resource_types:
+            return True
+        return _matches_domain(host, self.blocked_domains)
+
+    async def attach(self, target):
+        """Install the filter on a Playwright BrowserContext (or Page)"""
+        if not self.enabled:
+            return
+
+        await target.route('**/*', self._handle_route)
+        target.on('requestfinished', self._on_request_finished)
+
+    async def _handle_route(self, route, request):
+        resource_type = request.resource_type
+        if self.should_block(request.url, resource_type):
+            self.blocked_requests += 1
+            self.blocked_bytes_estimated += ESTIMATED_BYTES_BY_TYPE.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+            self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+            await route.abort('blockedbyclient')
+        else:
+            await route.continue_()
+
+    async def _on_request_finished(self, request):
+        self.allowed_requests += 1
+        try:
+            sizes = await request.sizes()
+            self.allowed_bytes += sizes['responseBodySize'] + sizes['responseHeadersSize']
+        except Exception as e:
+            logging.debug(f"Could not read request sizes for {request.url}: {e}")
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'allowedRequests': self.allowed_requests,
+            'allowedBytes': self.allowed_bytes,
+            'blockedRequests': self.blocked_requests,
+            'blockedBytesEstimated': self.blocked_bytes_estimated,
+            'blockedByType': dict(self.blocked_by_type),
+        }
@@ -0,0 +1,279 @@
+"""
+Local cache of fetched results pages.
+
+Reruns and debugging sessions otherwise pay residential proxies for the same pages again.
+With responseCache set, every page that loads cleanly is stored zlib-compressed, and
+later fetches of the same search page are served from the cache while it is younger
+than responseCacheTtlHours. Re-parsing after an extractor fix then runs locally at CPU
+speed, without a proxy or a browser navigation.
+
+Pages are keyed on their normalised search URL (host, path and sorted query, search
+terms case and whitespace folded) and stored content-addressed by the hash of their
+HTML, so identical pages - say the same empty last page reached by several URLs - are
+stored once. The cache holds at most responseCacheMaxMb of compressed HTML; the least
+recently used pages are evicted past that.
+
+It lives in a local directory when responseCacheDir is set, otherwise in a named
+key-value store shared by all runs.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from apify import Actor, Event
+
+from yellowpages import metrics
+from yellowpages.parsing import looks_blocked
+
+CACHE_STORE = 'yellowpages-response-cache'
+INDEX_KEY = 'INDEX'
+
+# Query parameters whose case and spacing don't change the results
+_TEXT_PARAMS = ('search_terms', 'geo_location_terms')
+
+
+def cache_key(url):
+    """Normalised form of a search URL, hashed into a store-safe key"""
+    parts = urlsplit(url)
+    query = []
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        if name in _TEXT_PARAMS:
+            value = ' '.join(value.casefold().split())
+        query.append((name, value))
+    if not any(name == 'page' for name, _ in query):
+        query.append(('page', '1'))
+    normalised = f"{parts.netloc.lower()}{parts.path.rstrip('/')}?{urlencode(sorted(query))}"
+    return hashlib.blake2b(normalised.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class DirectoryBackend:
+    """Blobs as files in a local directory (blocking I/O runs in a thread)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    async def read(self, name):
+        return await asyncio.to_thread(self._read, self.path / name)
+
+    async def write(self, name, data):
+        await asyncio.to_thread(self._write, self.path / name, data)
+
+    async def delete(self, name):
+        await asyncio.to_thread((self.path / name).unlink, missing_ok=True)
+
+    @staticmethod
+    def _read(path):
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write(path, data):
+        # Write-then-rename, so a crash never leaves a half-written blob under the real name
+        partial = path.with_name(path.name + '.partial')
+        partial.write_bytes(data)
+        partial.replace(path)
+
+    def __str__(self):
+        return str(self.path)
+
+
+class KeyValueBackend:
+    """Blobs as records in a key-value store"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def read(self, name):
+        return await self.store.get_value(name)
+
+    async def write(self, name, data):
+        await self.store.set_value(name, data, content_type='application/octet-stream')
+
+    async def delete(self, name):
+        await self.store.set_value(name, None)
+
+    def __str__(self):
+        return f"key-value store '{CACHE_STORE}'"
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl_secs=24 * 3600, max_bytes=500 * 1024 * 1024):
+        self.backend = backend
+        self.ttl_secs = ttl_secs
+        self.max_bytes = max_bytes
+
+        # cache key -> {'blob', 'size', 'storedAt', 'encoding'}, least recently used first
+        self._index = OrderedDict()
+        # blob -> [number of index entries pointing at it, compressed size]
+        self._blobs = {}
+        self._bytes = 0
+        self._dirty = False
+        self._listening = False
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @classmethod
+    async def open(cls, actor_input):
+        """The cache for this run (None unless responseCache is set)"""
+        if not actor_input.get('responseCache'):
+            return None
+
+        if actor_input.get('responseCacheDir'):
+            backend = DirectoryBackend(actor_input['responseCacheDir'])
+        else:
+            backend = KeyValueBackend(await Actor.open_key_value_store(name=CACHE_STORE))
+        cache = cls(
+            backend,
+            ttl_secs=actor_input.get('responseCacheTtlHours', 24) * 3600,
+            max_bytes=actor_input.get('responseCacheMaxMb', 500) * 1024 * 1024,
+        )
+        await cache.load()
+        logging.info(f"Response cache in {backend}: {len(cache._index)} pages, {cache._bytes / 1024 / 1024:.1f} MB")
+        cache.start()
+        return cache
+
+    async def load(self):
+        data = await self.backend.read(INDEX_KEY)
+        if not data:
+            return
+        try:
+            entries = json.loads(zlib.decompress(data))
+        except Exception as e:
+            logging.warning(f"Response cache index unreadable, starting empty: {e}")
+            return
+        for key, entry in entries:
+            self._add_entry(key, entry)
+        await self._evict()
+
+    def _add_entry(self, key, entry):
+        self._index[key] = entry
+        blob = self._blobs.setdefault(entry['blob'], [0, entry['size']])
+        blob[0] += 1
+        if blob[0] == 1:
+            self._bytes += entry['size']
+
+    async def _drop_entry(self, key):
+        entry = self._index.pop(key)
+        self._dirty = True
+        blob = self._blobs[entry['blob']]
+        blob[0] -= 1
+        if blob[0] == 0:
+            del self._blobs[entry['blob']]
+            self._bytes -= entry['size']
+            await self.backend.delete(entry['blob'])
+
+    async def get(self, url):
+        """The cached HTML for url as bytes, or None if it isn't cached or has expired"""
+        key = cache_key(url)
+        entry = self._index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry['storedAt'] > self.ttl_secs:
+            self.expired += 1
+            self.misses += 1
+            await self._drop_entry(key)
+            return None
+
+        blob = await self.backend.read(entry['blob'])
+        if blob is None:
+            # Evicted by a concurrent put, or removed from outside
+            self.misses += 1
+            if self._index.get(key) is entry:
+                await self._drop_entry(key)
+            return None
+        self._index.move_to_end(key)
+        self.hits += 1
+        metrics.count('cacheHits')
+        return zlib.decompress(blob)
+
+    async def get_text(self, url):
+        """The cached page decoded with the encoding it was stored with (UTF-8 if unknown), or None"""
+        entry = self._index.get(cache_key(url))
+        html = await self.get(url)
+        if html is None:
+            return None
+        return html.decode(entry.get('encoding') or 'utf-8', 'replace')
+
+    async def put(self, url, html, encoding=None):
+        """Store a page that loaded cleanly (interstitials and truncated bodies are never cached).
+
+        html is the body as bytes, with its response encoding if known, or decoded text.
+        """
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+            encoding = 'utf-8'
+        if looks_blocked(200, html):
+            return
+        key = cache_key(url)
+        blob = hashlib.blake2b(html, digest_size=16).hexdigest()
+        if key in self._index:
+            if self._index[key]['blob'] == blob:
+                self._index[key]['storedAt'] = time.time()
+                self._index[key]['encoding'] = encoding
+                self._index.move_to_end(key)
+                self._dirty = True
+                return
+            await self._drop_entry(key)
+
+        if blob in self._blobs:
+            # Same page under another URL: share the stored blob
+            size = self._blobs[blob][1]
+        else:
+            data = zlib.compress(html, 6)
+            await self.backend.write(blob, data)
+            size = len(data)
+        self._add_entry(key, {'blob': blob, 'size': size, 'storedAt': time.time(), 'encoding': encoding})
+        self._dirty = True
+        self.stores += 1
+        await self._evict()
+
+    async def _evict(self):
+        while self._bytes > self.max_bytes and self._index:
+            await self._drop_entry(next(iter(self._index)))
+            self.evictions += 1
+
+    async def save(self, event_data=None):
+        """Write the index (also the persistState/migrating listener)"""
+        if not self._dirty:
+            return
+        self._dirty = False
+        data = zlib.compress(json.dumps(list(self._index.items())).encode('utf-8'))
+        await self.backend.write(INDEX_KEY, data)
+
+    def start(self):
+        Actor.on(Event.PERSIST_STATE, self.save)
+        Actor.on(Event.MIGRATING, self.save)
+        self._listening = True
+
+    async def close(self):
+        if self._listening:
+            Actor.off(Event.PERSIST_STATE, self.save)
+            Actor.off(Event.MIGRATING, self.save)
+            self._listening = False
+        await self.save()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'stored': self.stores,
+            'evicted': self.evictions,
+            'pages': len(self._index),
+            'megabytes': round(self._bytes / 1024 / 1024, 2),
+        }
@@ -0,0 +1,147 @@
+"""
+Retries with backoff for failed pages, and a dead-letter record for the ones that never load.
+
+A page that fails - Cloudflare not cleared, results selector timeout, HTTP error, a
+truncated response, an exception - goes back on the planner after an exponential backoff
+with jitter, and the engine retries it on a different proxy session or browser context
+than the one it failed on. Attempts are counted in the crawl checkpoint, so the budget
+survives migrations.
+
+Pages that use up their attempts are written to a dead-letter record in a named
+key-value store shared by all runs. A later run with replayDeadLetters set scrapes just
+those pages; entries are removed once a run finishes them.
+"""
+
+import logging
+import random
+import time
+
+from apify import Actor
+
+DEAD_LETTER_STORE = 'yellowpages-dead-letters'
+DEAD_LETTER_KEY = 'DEAD_LETTERS'
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=4, base_delay=2.0, max_delay=60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_input(cls, actor_input):
+        """Build a policy from the Actor input (maxRetries counts retries after the first attempt)"""
+        return cls(
+            max_attempts=actor_input.get('maxRetries', 3) + 1,
+            base_delay=actor_input.get('retryBackoffSecs', 2.0),
+            max_delay=actor_input.get('retryBackoffMaxSecs', 60.0),
+        )
+
+    def delay(self, attempts):
+        """Backoff before the next attempt after `attempts` failures: doubling, capped, with equal jitter"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+class DeadLetters:
+    def __init__(self, entries=None, store=None):
+        self.store = store
+        self._entries = {}
+        for entry in entries or []:
+            self._entries[(entry['keyword'], entry['location'], entry['page'])] = entry
+        self.loaded = len(self._entries)
+        self.added = 0
+
+    @classmethod
+    async def load(cls, store=None):
+        """Read the shared dead-letter record (store defaults to the named dead-letter store)"""
+        store = store or await Actor.open_key_value_store(name=DEAD_LETTER_STORE)
+        return cls(await store.get_value(DEAD_LETTER_KEY), store)
+
+    def add(self, keyword, location, page_num, attempts, error=''):
+        self._entries[(keyword, location, page_num)] = {
+            'keyword': keyword,
+            'location': location,
+            'page': page_num,
+            'attempts': attempts,
+            'error': error,
+            'failedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }
+        self.added += 1
+
+    def jobs(self):
+        """(keyword, location, page) of every dead-lettered page, page 1s first"""
+        return sorted(self._entries, key=lambda key: (key[2] != 1, key))
+
+    async def save(self, checkpoint=None):
+        """Write the record back, without pages the checkpoint shows as finished.
+
+        The record is re-read first so dead letters from shard runs saving in parallel
+        are kept.
+        """
+        current = await self.store.get_value(DEAD_LETTER_KEY) or []
+        entries = {(entry['keyword'], entry['location'], entry['page']): entry for entry in current}
+        entries.update(self._entries)
+        if checkpoint is not None:
+            entries = {key: entry for key, entry in entries.items() if not checkpoint.is_done(*key)}
+
+        self._entries = entries
+        await self.store.set_value(DEAD_LETTER_KEY, list(entries.values()))
+
+    def stats(self):
+        return {'loaded': self.loaded, 'added': self.added, 'pending': len(self._entries)}
+
+
+class RetryQueue:
+    def __init__(self, planner, checkpoint, policy=None, dead_letters=None):
+        self.planner = planner
+        self.checkpoint = checkpoint
+        self.policy = policy or RetryPolicy()
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetters()
+        self._failed_on = {}
+
+        self.retries = 0
+        self.exhausted = 0
+
+    def failed(self, keyword, location, page_num, job, error='', identity=None):
+        """Record a failed attempt and schedule a retry after the backoff.
+
+        identity is whatever the page was fetched with (proxy URL, session id); the retry
+        should avoid it, see failed_on(). Returns False when the attempt budget is used up
+        and the page went to the dead letters instead.
+        """
+        key = (keyword, location, page_num)
+        attempts = self.checkpoint.mark_failed(keyword, location, page_num)
+        if identity is not None:
+            self._failed_on[key] = identity
+
+        if attempts < self.policy.max_attempts:
+            delay = self.policy.delay(attempts)
+            logging.warning(
+                f"Page {page_num} '{keyword}' in {location} failed ({error or 'fetch failed'}), "
+                f"retry {attempts}/{self.policy.max_attempts - 1} in {delay:.1f}s"
+            )
+            self.planner.put_later(delay, keyword, location, page_num, job)
+            self.retries += 1
+            return True
+
+        logging.error(f"Page {page_num} '{keyword}' in {location} failed {attempts} times - dead-lettered")
+        self._failed_on.pop(key, None)
+        self.dead_letters.add(keyword, location, page_num, attempts, error)
+        self.exhausted += 1
+        return False
+
+    def failed_on(self, keyword, location, page_num):
+        """Identity the page's last attempt failed on (None if it hasn't failed)"""
+        return self._failed_on.get((keyword, location, page_num))
+
+    def succeeded(self, keyword, location, page_num):
+        self._failed_on.pop((keyword, location, page_num), None)
+
+    def stats(self):
+        return {
+            'maxAttempts': self.policy.max_attempts,
+            'retries': self.retries,
+            'deadLettered': self.exhausted,
+            'deadLetters': self.dead_letters.stats(),
+        }
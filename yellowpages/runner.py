@@ -0,0 +1,296 @@
+"""
+The search and page lifecycle shared by the planner-driven engines (main.py, main_simple.py,
+main_requests.py, main_hybrid.py).
+
+A run's searches start as page-1 probes on the planner. Once a probe gives the page count
+the search's pages are fanned out through the pagination window (past YP's page cap, as
+one sub-search per city), and each finished page moves the window on. A page goes through
+incremental classification, shard ownership and the geo sharder's dedupe before it is
+pushed, and is then marked done in the checkpoint. Failed pages are retried after a
+backoff on another identity, or dead-lettered.
+
+Only fetching differs between the engines. Each hands the runner a fetch(job) coroutine
+that loads one PageJob and returns (listings, total_pages): total_pages only for page 1,
+listings None if the page failed. The fetch records the identity (proxy URL, session)
+it used on the job, so a retry can avoid it, and may report page 1's count early with
+job.found_pages() to fan out the search before extracting the page.
+"""
+
+import asyncio
+import time
+
+from apify import Actor
+
+from yellowpages.checkpoint import CrawlCheckpoint
+from yellowpages.dedup import DedupIndex
+from yellowpages.geo import GeoSharder
+from yellowpages.incremental import ChangeTracker
+from yellowpages.pagination import PaginationTracker
+from yellowpages.planner import CACHE_STORE, SearchPlanner
+from yellowpages.response_cache import ResponseCache
+from yellowpages.retry import DeadLetters, RetryPolicy, RetryQueue
+from yellowpages.sharding import RunShard, open_output_dataset
+from yellowpages.urls import build_search_url
+from yellowpages.writer import DatasetWriter
+
+
+class PageJob:
+    """One results page for an engine's fetch callable"""
+
+    def __init__(self, runner, keyword, location, page_num, failed_on=None):
+        self.keyword = keyword
+        self.location = location
+        self.page_num = page_num
+        # Identity the page's last attempt failed on (None on a first attempt)
+        self.failed_on = failed_on
+        # Set by the fetch: the identity it used, and why the page failed
+        self.identity = None
+        self.error = ''
+        self._runner = runner
+
+    @property
+    def url(self):
+        return build_search_url(self.keyword, self.location, self.page_num)
+
+    def found_pages(self, total_pages):
+        """Fan out the search from page 1's count before the page itself is extracted"""
+        self._runner.found_pages(self.keyword, self.location, total_pages)
+
+
+class SearchRunner:
+    def __init__(self, planner, checkpoint, retries, dead_letters, output, dedup, max_pages, max_concurrency,
+                 sharder=None, shard=None, changes=None, cache=None, planner_store=None, replay=False):
+        self.planner = planner
+        self.checkpoint = checkpoint
+        self.retries = retries
+        self.dead_letters = dead_letters
+        self.output = output
+        self.dedup = dedup
+        self.max_concurrency = max_concurrency
+        self.sharder = sharder or GeoSharder(enabled=False)
+        self.shard = shard or RunShard()
+        self.changes = changes
+        self.cache = cache
+        self.planner_store = planner_store
+        self.replay = replay
+        # Finished pages (checkpoint) and other shards' pages never enter the window
+        self.pagination = PaginationTracker(
+            max_pages, window=max_concurrency,
+            skip=lambda search, page_num: self.shard.skips(search, page_num) or checkpoint.is_done(*search, page_num),
+        )
+        self.total_listings = 0
+
+    @classmethod
+    async def load(cls, actor_input, max_pages, max_concurrency):
+        """Open everything a run keeps across runs and migrations, from the Actor input"""
+        # Listings already seen under another keyword, location or page are dropped before the dataset
+        dedup = await DedupIndex.load(actor_input)
+        # Incremental runs compare against the previous run's snapshot (None otherwise)
+        changes = await ChangeTracker.load(actor_input)
+        # Listings stream to the dataset in batches from a background task
+        output = DatasetWriter.from_input(await open_output_dataset(actor_input), actor_input, dedup).start()
+
+        # Progress survives migrations and restarts; the checkpoint saves the writer's,
+        # tracker's and dedup index's state with its own
+        checkpoint = await CrawlCheckpoint.load(actor_input.get('checkpointIntervalSecs', 5))
+        checkpoint.writer = output
+        checkpoint.changes = changes
+        checkpoint.dedup = dedup
+
+        # Page counts from earlier runs let the planner start the biggest searches first
+        planner_store = await Actor.open_key_value_store(name=CACHE_STORE) if actor_input.get('usePageCountCache', True) else None
+        planner = await SearchPlanner.load(planner_store, max_concurrency, max_pages)
+
+        # Failed pages go back on the planner after a backoff; pages that run out of
+        # retries are kept for a later replayDeadLetters run
+        dead_letters = await DeadLetters.load()
+        retries = RetryQueue(planner, checkpoint, RetryPolicy.from_input(actor_input), dead_letters)
+
+        return cls(
+            planner, checkpoint, retries, dead_letters, output, dedup, max_pages, max_concurrency,
+            sharder=GeoSharder.from_input(actor_input),
+            shard=RunShard.from_input(actor_input),
+            changes=changes,
+            # Pages fetched by earlier runs are served locally while fresh (None unless responseCache is set)
+            cache=await ResponseCache.open(actor_input),
+            planner_store=planner_store,
+            replay=actor_input.get('replayDeadLetters', False),
+        )
+
+    def queue_page(self, keyword, location, page_num):
+        self.planner.put(keyword, location, page_num, (keyword, location, page_num))
+
+    def queue_search(self, keyword, location):
+        """Start a search at page 1, or straight from its checkpointed page count"""
+        if self.checkpoint.can_resume(keyword, location):
+            self.start_search(keyword, location, self.checkpoint.total_pages(keyword, location))
+        else:
+            self.queue_page(keyword, location, 1)
+
+    def start_search(self, keyword, location, total_pages, first_page_listings=None):
+        """Fan out a search's pages (and city sub-searches) once its page count is known"""
+        self.planner.observe(keyword, location, total_pages)
+        for next_page in self.pagination.start((keyword, location), total_pages, first_page_listings):
+            self.queue_page(keyword, location, next_page)
+
+        # Past YP's page cap: fan out one search per city in the state
+        sub_locations = self.sharder.split(keyword, location, total_pages)
+        if sub_locations:
+            Actor.log.info(f"Splitting '{keyword}' in {location} ({total_pages} pages) into {len(sub_locations)} city searches")
+        for sub_location in sub_locations:
+            self.queue_search(keyword, sub_location)
+
+    def found_pages(self, keyword, location, total_pages, first_page_listings=None):
+        """Record page 1's count and start the search, unless it already started"""
+        if self.pagination.tracks((keyword, location)):
+            return
+        Actor.log.info(f"Detected {total_pages} pages for '{keyword}' in {location}")
+        self.checkpoint.record_pages(keyword, location, total_pages)
+        self.start_search(keyword, location, total_pages, first_page_listings)
+
+    def page_failed(self, keyword, location, page_num, error='', identity=None):
+        """Retry a failed page after a backoff; once it is dead-lettered, free its window slot"""
+        if self.retries.failed(keyword, location, page_num, (keyword, location, page_num), error, identity):
+            return
+        if page_num > 1:
+            _, next_pages = self.pagination.complete((keyword, location), page_num, None)
+            for next_page in next_pages:
+                self.queue_page(keyword, location, next_page)
+
+    async def run(self, fetch, keywords, locations, limiter):
+        """Scrape every keyword/location combo through one pool of workers. Returns the listings pushed
+
+        limiter is the AdaptiveConcurrency that decides how many of the workers fetch at once.
+        """
+        if self.replay:
+            # Replay: only the pages earlier runs gave up on (a lost page 1 reruns its whole search)
+            for keyword, location, page_num in self.dead_letters.jobs():
+                if page_num == 1:
+                    self.queue_search(keyword, location)
+                else:
+                    self.queue_page(keyword, location, page_num)
+        else:
+            # Every search starts with page 1; its count fans out the rest
+            for location in locations:
+                for keyword in keywords:
+                    self.queue_search(keyword, location)
+
+        self.planner.log_plan()
+
+        workers = [asyncio.create_task(self._worker(fetch, limiter)) for _ in range(self.max_concurrency)]
+        try:
+            await self.planner.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            for result in await asyncio.gather(*workers, return_exceptions=True):
+                # Cancellation is expected here; anything else killed a worker
+                if isinstance(result, Exception):
+                    Actor.log.error(f"Worker crashed: {result!r}")
+
+        return self.total_listings
+
+    async def _worker(self, fetch, limiter):
+        while True:
+            keyword, location, page_num = await self.planner.get()
+            elapsed = 0.0
+            try:
+                elapsed = await self._process(fetch, limiter, keyword, location, page_num)
+            except Exception as e:
+                Actor.log.error(f"Page {page_num} '{keyword}' in {location} failed: {e}")
+            finally:
+                self.planner.task_done(keyword, location, elapsed)
+
+    async def _process(self, fetch, limiter, keyword, location, page_num):
+        """Fetch one page and take it through pagination, incremental, sharding and the push.
+
+        Returns the seconds the fetch took.
+        """
+        search = (keyword, location)
+        # Skip pages past a search's real end
+        if not self.pagination.should_fetch(search, page_num):
+            return 0.0
+
+        job = PageJob(self, keyword, location, page_num, self.retries.failed_on(keyword, location, page_num))
+        elapsed = 0.0
+        try:
+            async with limiter.slot():
+                started = time.monotonic()
+                try:
+                    listings, total_pages = await fetch(job)
+                finally:
+                    elapsed = time.monotonic() - started
+        except Exception as e:
+            Actor.log.error(f"Page {page_num} '{keyword}' in {location}: {e}")
+            listings, job.error = None, str(e)
+
+        if listings is None:
+            self.page_failed(keyword, location, page_num, job.error, job.identity)
+            return elapsed
+        self.retries.succeeded(keyword, location, page_num)
+
+        if page_num == 1:
+            if total_pages is not None:
+                self.found_pages(keyword, location, total_pages, listings)
+        else:
+            keep, next_pages = self.pagination.complete(search, page_num, listings)
+            if not keep:
+                Actor.log.info(f"Page {page_num} repeats page {page_num - 1} - end of '{keyword}' in {location}")
+                listings = []
+            for next_page in next_pages:
+                self.queue_page(keyword, location, next_page)
+
+        # Incremental runs push only new and changed listings, and stop a search once its pages stop changing
+        if self.changes is not None and listings:
+            listings, unchanged = self.changes.classify(keyword, location, listings)
+            if unchanged and self.pagination.stop(search, page_num):
+                Actor.log.info(f"Nothing changed on recent pages of '{keyword}' in {location} - stopping after page {page_num}")
+                self.changes.stopped(keyword, location)
+
+        # Page 1 is loaded by every shard run as the probe; only its owner pushes it
+        if not self.shard.owns(keyword, location, page_num):
+            listings = []
+
+        # Minus repeats from overlapping city searches
+        listings = self.sharder.dedupe(keyword, location, listings)
+        if listings:
+            await self.output.push_data(listings)
+            self.total_listings += len(listings)
+            Actor.log.info(f"Pushed {len(listings)} listings ('{keyword}' in {location}, page {page_num})")
+        self.checkpoint.mark_done(keyword, location, page_num)
+        return elapsed
+
+    async def close(self):
+        """Flush the dataset and save the state later runs pick up. Call once the run is over"""
+        if self.changes is not None:
+            await self.output.push_data(self.changes.finish(self.checkpoint))
+        await self.output.close()
+        Actor.log.info(f"Dataset writer: {self.output.stats()}")
+        await self.dedup.close()
+        Actor.log.info(f"Dedup: {self.dedup.stats()}")
+        if self.changes is not None:
+            await self.changes.close()
+            Actor.log.info(f"Incremental: {self.changes.stats()}")
+        if self.cache is not None:
+            await self.cache.close()
+            Actor.log.info(f"Response cache: {self.cache.stats()}")
+        await self.checkpoint.close()
+        await self.dead_letters.save(self.checkpoint)
+        Actor.log.info(f"Retries: {self.retries.stats()}")
+        self.planner.log_report()
+        if self.planner_store is not None:
+            await self.planner.save(self.planner_store)
+
+    def stats(self):
+        return {
+            'pagination': self.pagination.stats(),
+            'geoSharding': self.sharder.stats(),
+            'plan': self.planner.report(),
+            'shard': self.shard.stats(),
+            'checkpoint': self.checkpoint.stats(),
+            'retries': self.retries.stats(),
+            'writer': self.output.stats(),
+            'dedup': self.dedup.stats(),
+            'incremental': self.changes.stats() if self.changes is not None else None,
+            'responseCache': self.cache.stats() if self.cache is not None else None,
+        }
@@ -0,0 +1,189 @@
+"""
+Pool of browser contexts, each bound to its own sticky proxy session.
+
+Jobs are spread across contexts (least busy first). Each context tracks its recent block
+rate, and a context that gets blocked too often is retired and replaced with a fresh
+context on a new proxy session, so throughput scales with the number of IPs.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+
+from yellowpages.challenge import ChallengeGate
+from yellowpages.concurrency import report_overload
+from yellowpages.page_pool import PagePool
+
+
+class BrowserSession:
+    def __init__(self, session_id, context, page_pool, proxy_url=None, window=20):
+        self.session_id = session_id
+        self.context = context
+        self.page_pool = page_pool
+        self.proxy_url = proxy_url
+        self.in_flight = 0
+        self.requests = 0
+        self.blocks = 0
+        self.retired = False
+        self.recent = deque(maxlen=window)
+        self.challenge_gate = ChallengeGate()
+
+    def record(self, blocked):
+        """Record the outcome of one page load on this session"""
+        self.requests += 1
+        self.blocks += int(blocked)
+        self.recent.append(bool(blocked))
+        if blocked:
+            report_overload('blocked')
+
+    @property
+    def block_rate(self):
+        return sum(self.recent) / len(self.recent) if self.recent else 0.0
+
+    async def close(self):
+        await self.page_pool.close()
+        await self.context.close()
+
+
+class SessionPool:
+    def __init__(self, browser, proxy_config, size, pages_per_session, context_options=None,
+                 request_filter=None, page_max_uses=50, retire_block_rate=0.3, min_samples=10):
+        self.browser = browser
+        self.proxy_config = proxy_config
+        self.size = size
+        self.pages_per_session = pages_per_session
+        self.context_options = context_options or {}
+        self.request_filter = request_filter
+        self.page_max_uses = page_max_uses
+        self.retire_block_rate = retire_block_rate
+        self.min_samples = min_samples
+
+        self.sessions = []
+        self._retiring = set()
+        self._background = set()
+        self._closed = False
+
+        self.sessions_created = 0
+        self.sessions_retired = 0
+        self._retired_pool_stats = []
+
+    async def start(self):
+        self.sessions = list(await asyncio.gather(*[self._new_session() for _ in range(self.size)]))
+        logging.info(f"Session pool ready: {self.size} contexts x {self.pages_per_session} pages")
+        return self
+
+    async def _new_session(self):
+        # Apify session ids keep the same proxy IP for every request that uses them
+        session_id = f"yp_{uuid.uuid4().hex[:12]}"
+        proxy_url = await self.proxy_config.new_url(session_id=session_id) if self.proxy_config else None
+
+        context = await self.browser.new_context(
+            **self.context_options,
+            proxy={'server': proxy_url} if proxy_url else None,
+        )
+        if self.request_filter:
+            await self.request_filter.attach(context)
+
+        page_pool = await PagePool(context, self.pages_per_session, max_uses=self.page_max_uses).start()
+        self.sessions_created += 1
+        return BrowserSession(session_id, context, page_pool, proxy_url)
+
+    @asynccontextmanager
+    async def lease(self, avoid=None):
+        """Borrow (session, page) from the least busy live session.
+
+        avoid is a session id not to use if any other session is live (a retry of a page
+        that failed on it). Exceptions raised inside the block count as a block for the
+        session. Callers record explicit outcomes with session.record().
+        """
+        while not self.sessions:
+            # Every session was retired - wait for a replacement
+            await asyncio.sleep(0.5)
+
+        candidates = [s for s in self.sessions if s.session_id != avoid] or self.sessions
+        session = min(candidates, key=lambda s: s.in_flight)
+        session.in_flight += 1
+        try:
+            async with session.page_pool.lease() as page:
+                yield session, page
+        except Exception:
+            session.record(blocked=True)
+            raise
+        finally:
+            session.in_flight -= 1
+            self._check_health(session)
+
+    def _check_health(self, session):
+        if session.retired:
+            if session.in_flight == 0 and session in self._retiring:
+                self._retiring.discard(session)
+                self._retired_pool_stats.append(session.page_pool.stats())
+                self._spawn(session.close())
+            return
+
+        if len(session.recent) >= self.min_samples and session.block_rate >= self.retire_block_rate:
+            logging.warning(
+                f"Retiring session {session.session_id}: block rate {session.block_rate:.0%} "
+                f"over last {len(session.recent)} pages"
+            )
+            session.retired = True
+            self.sessions_retired += 1
+            self.sessions.remove(session)
+            self._retiring.add(session)
+            self._spawn(self._replace())
+            self._check_health(session)
+
+    async def _replace(self):
+        # Keep trying so the pool never shrinks for good
+        while not self._closed:
+            try:
+                session = await self._new_session()
+                self.sessions.append(session)
+                logging.info(f"New session {session.session_id} added to the pool")
+                return
+            except Exception as e:
+                logging.error(f"Could not create replacement session: {e}")
+                await asyncio.sleep(2)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._background):
+            task.cancel()
+        for session in self.sessions + list(self._retiring):
+            try:
+                await session.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        live = self.sessions + list(self._retiring)
+        pool_stats = [s.page_pool.stats() for s in live] + self._retired_pool_stats
+        leases = sum(p['leases'] for p in pool_stats)
+        return {
+            'sessionsCreated': self.sessions_created,
+            'sessionsRetired': self.sessions_retired,
+            'sessions': [
+                {
+                    'id': s.session_id,
+                    'requests': s.requests,
+                    'blocks': s.blocks,
+                    'blockRate': round(s.block_rate, 3),
+                    'challenges': s.challenge_gate.stats(),
+                }
+                for s in self.sessions
+            ],
+            'pagePool': {
+                'leases': leases,
+                'leaseWaitAvgMs': round(sum(p['leaseWaitAvgMs'] * p['leases'] for p in pool_stats) / leases, 1) if leases else 0,
+                'leaseWaitMaxMs': max((p['leaseWaitMaxMs'] for p in pool_stats), default=0),
+                'pagesCreated': sum(p['pagesCreated'] for p in pool_stats),
+                'pagesRecycled': sum(p['pagesRecycled'] for p in pool_stats),
+            },
+        }
@@ -0,0 +1,141 @@
+"""
+Horizontal sharding of one scrape across several Actor runs.
+
+The keyword x location x page job space is split deterministically: a stable hash of
+(keyword, location, page) picks the shard that owns each page. Every shard still loads
+page 1 of every search - it is the probe that tells it how many pages exist - but only
+the owner pushes its listings. Other shards' pages are skipped by the pagination window
+(see PaginationTracker's skip predicate). Shards write to one shared named dataset.
+
+In coordinator mode (shardCount > 1, no shardIndex) the run starts shardCount copies of
+this Actor with shardIndex set, waits for them, and finalises by merging the shared
+dataset into its own with duplicates removed. A merge can also be run on its own with
+mergeDataset, e.g. after starting the shards by hand.
+"""
+
+import asyncio
+import uuid
+import zlib
+
+from apify import Actor
+
+from yellowpages.dedup import dedup_key
+from yellowpages.geo import listing_key
+from yellowpages.incremental import merge_shard_snapshots
+
+MERGE_BATCH = 1000
+
+
+class RunShard:
+    def __init__(self, index=None, count=1):
+        self.count = max(1, count)
+        self.index = index
+        if index is not None and not 0 <= index < self.count:
+            raise ValueError(f"shardIndex must be between 0 and {self.count - 1}, got {index}")
+
+    @classmethod
+    def from_input(cls, actor_input):
+        return cls(index=actor_input.get('shardIndex'), count=actor_input.get('shardCount', 1))
+
+    @property
+    def is_coordinator(self):
+        return self.count > 1 and self.index is None
+
+    def owns(self, keyword, location, page_num):
+        """True when this run is the one that scrapes (and pushes) a page"""
+        if self.count == 1 or self.index is None:
+            return True
+        key = f"{keyword.strip().lower()}\0{location.strip().lower()}\0{page_num}".encode('utf-8')
+        return zlib.crc32(key) % self.count == self.index
+
+    def skips(self, search, page_num):
+        """Pagination skip predicate: pages owned by other shards"""
+        return not self.owns(search[0], search[1], page_num)
+
+    def stats(self):
+        return {'index': self.index, 'count': self.count}
+
+
+async def open_output_dataset(actor_input):
+    """The dataset listings are pushed to: the shared one for shard runs, else the run's own"""
+    name = actor_input.get('outputDataset')
+    return await Actor.open_dataset(name=name) if name else await Actor.open_dataset()
+
+
+async def merge_dataset(source_name, drop_source=False, by_keyword=True):
+    """Copy a shared shard dataset into this run's dataset without duplicate listings.
+
+    by_keyword keeps one copy per keyword; otherwise a listing is kept once overall, matching
+    the scrapers' cross-search dedupe.
+    """
+    source = await Actor.open_dataset(name=source_name)
+    target = await Actor.open_dataset()
+
+    seen = set()
+    batch = []
+    total = duplicates = 0
+    async for item in source.iterate_items():
+        total += 1
+        key = (item.get('keyword', ''),) + listing_key(item) if by_keyword else dedup_key(item)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        batch.append(item)
+        if len(batch) >= MERGE_BATCH:
+            await target.push_data(batch)
+            batch = []
+    if batch:
+        await target.push_data(batch)
+
+    if drop_source:
+        await source.drop()
+
+    Actor.log.info(f"Merged '{source_name}': {total} listings, {duplicates} duplicates removed, {total - duplicates} kept")
+    return {'source': source_name, 'listings': total, 'duplicates': duplicates, 'kept': total - duplicates}
+
+
+async def coordinate(actor_input):
+    """Run the coordinator or merge-only modes. Returns False when this run should scrape itself"""
+    if actor_input.get('mergeDataset'):
+        stats = await merge_dataset(actor_input['mergeDataset'], by_keyword=actor_input.get('dedupe', 'hash') == 'off')
+        run_stats = {'merge': stats}
+        # Hand-started incremental shards leave their snapshot parts for this run to merge
+        if actor_input.get('incremental') and actor_input.get('shardCount', 1) > 1:
+            run_stats['incremental'] = await merge_shard_snapshots(actor_input['shardCount'])
+        await Actor.set_value('RUN_STATS', run_stats)
+        return True
+
+    shard = RunShard.from_input(actor_input)
+    if not shard.is_coordinator:
+        return False
+
+    actor_id = Actor.configuration.actor_id
+    if not actor_id:
+        Actor.log.error("Coordinator mode starts Actor runs on the Apify platform; locally, run each shard with shardIndex set")
+        return True
+
+    # Shards share one named dataset; a generated one is dropped after the merge
+    dataset_name = actor_input.get('outputDataset') or f"yellowpages-shards-{uuid.uuid4().hex[:12]}"
+    Actor.log.info(f"Coordinating {shard.count} shard runs into dataset '{dataset_name}'")
+
+    async def run_shard(index):
+        run = await Actor.call(actor_id, run_input={**actor_input, 'shardIndex': index, 'outputDataset': dataset_name})
+        status = getattr(run.status, 'value', run.status) if run is not None else 'UNKNOWN'
+        Actor.log.info(f"Shard {index}/{shard.count} finished: {status}")
+        return {'index': index, 'runId': run.id if run is not None else None, 'status': status}
+
+    shard_runs = await asyncio.gather(*(run_shard(i) for i in range(shard.count)))
+    failed = [run['index'] for run in shard_runs if run['status'] != 'SUCCEEDED']
+    if failed:
+        Actor.log.warning(f"Shards {failed} did not succeed - the merged dataset is missing their pages")
+
+    merge_stats = await merge_dataset(
+        dataset_name, drop_source=not actor_input.get('outputDataset'), by_keyword=actor_input.get('dedupe', 'hash') == 'off',
+    )
+    run_stats = {'shards': shard_runs, 'merge': merge_stats}
+    # Each shard saved only its part of the incremental snapshot
+    if actor_input.get('incremental'):
+        run_stats['incremental'] = await merge_shard_snapshots(shard.count)
+    await Actor.set_value('RUN_STATS', run_stats)
+    return True
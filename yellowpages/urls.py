@@ -0,0 +1,15 @@
+"""
+Yellow Pages search URLs
+"""
+
+import os
+from urllib.parse import urlencode
+
+# YELLOWPAGES_BASE_URL points every engine at another host, such as the local stand-in
+# server in benchmarks/fake_server.py
+BASE_URL = os.environ.get('YELLOWPAGES_BASE_URL', 'https://www.yellowpages.com').rstrip('/')
+SEARCH_URL = f"{BASE_URL}/search"
+
+
+def build_search_url(keyword, place, page_num):
+    return f"{SEARCH_URL}?{urlencode({'search_terms': keyword, 'geo_location_terms': place, 'page': page_num})}"
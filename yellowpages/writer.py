@@ -0,0 +1,138 @@
+"""
+Streaming, batched dataset writer.
+
+Workers hand over each page's listings as soon as the page is parsed; a background task
+writes them to the dataset in batches, whenever pushBatchSize listings are waiting or
+pushIntervalSecs have passed. One push per batch instead of one per page keeps API calls
+down, and workers never wait on the platform - unless the buffer holds
+maxBufferedListings, in which case push_data() blocks until the writer catches up. That
+backpressure keeps memory flat however large the run gets.
+
+With a DedupIndex (see dedup.py), listings already seen anywhere in the run are dropped
+before they are buffered.
+
+The crawl checkpoint flushes the writer before saving, so a page is never recorded as
+finished while its listings are still only in memory.
+"""
+
+import asyncio
+import logging
+import time
+
+from yellowpages import metrics
+
+
+class DatasetWriter:
+    def __init__(self, dataset, batch_size=500, flush_secs=2.0, max_buffered=5000, dedup=None):
+        self.dataset = dataset
+        self.dedup = dedup
+        self.batch_size = max(1, batch_size)
+        self.flush_secs = flush_secs
+        self.max_buffered = max(self.batch_size, max_buffered)
+
+        self._buffer = []
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._task = None
+        self._closing = False
+
+        self.listings = 0
+        self.batches = 0
+        self.push_secs = 0.0
+        self.peak_buffered = 0
+        self.backpressure_waits = 0
+        self.backpressure_secs = 0.0
+
+    @classmethod
+    def from_input(cls, dataset, actor_input, dedup=None):
+        return cls(
+            dataset,
+            dedup=dedup,
+            batch_size=actor_input.get('pushBatchSize', 500),
+            flush_secs=actor_input.get('pushIntervalSecs', 2),
+            max_buffered=actor_input.get('maxBufferedListings', 5000),
+        )
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def push_data(self, listings):
+        """Queue listings for the dataset; waits only while the buffer is full"""
+        with metrics.stage('push'):
+            await self._push(listings)
+
+    async def _push(self, listings):
+        if self.dedup is not None:
+            listings = self.dedup.filter(listings)
+        if not listings:
+            return
+        if len(self._buffer) >= self.max_buffered:
+            self.backpressure_waits += 1
+            started = time.monotonic()
+            while len(self._buffer) >= self.max_buffered:
+                self._room.clear()
+                self._full.set()
+                await self._room.wait()
+            self.backpressure_secs += time.monotonic() - started
+
+        self._buffer.extend(listings)
+        metrics.count('listings', len(listings))
+        self.peak_buffered = max(self.peak_buffered, len(self._buffer))
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_secs)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # The batch went back into the buffer; try again on the next tick
+                logging.warning(f"Dataset push failed, retrying: {e}")
+                await asyncio.sleep(self.flush_secs)
+
+    async def flush(self):
+        """Write everything buffered so far"""
+        async with self._lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                started = time.monotonic()
+                try:
+                    await self.dataset.push_data(batch)
+                except BaseException:
+                    self._buffer[:0] = batch
+                    raise
+                elapsed = time.monotonic() - started
+                self.push_secs += elapsed
+                metrics.observe('datasetBatch', elapsed)
+                self.batches += 1
+                self.listings += len(batch)
+                if len(self._buffer) < self.max_buffered:
+                    self._room.set()
+
+    async def close(self):
+        """Stop the background task (letting a push in progress finish) and write what is left"""
+        if self._task is not None:
+            self._closing = True
+            self._full.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            'listings': self.listings,
+            'batches': self.batches,
+            'avgBatchMs': round(self.push_secs / self.batches * 1000, 1) if self.batches else 0.0,
+            'peakBuffered': self.peak_buffered,
+            'backpressureWaits': self.backpressure_waits,
+            'backpressureSecs': round(self.backpressure_secs, 2),
+        }